@@ -1,4 +1,4 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 from app.api.endpoints import (
     auth, 
     analysis, 
@@ -11,40 +11,47 @@ from app.api.endpoints import (
     library
 )
 
+from app.services.readiness_service import readiness_manager
+
+# Fast 503 while the schema is still being created/migrated on start-up.
+# A failed init is only logged (as before); requests then go through.
+needs_database = [Depends(readiness_manager.require("database", allow_failed=True))]
+
 api_router = APIRouter()
 
 # --- 1. Authentication ---
 # Handles: /register, /login, /verify-otp, /users/{id}
-api_router.include_router(auth.router, tags=["Authentication"])
+api_router.include_router(auth.router, dependencies=needs_database, tags=["Authentication"])
 
 # --- 2. Disease Analysis ---
 # Handles: /predict, /predict/advanced, /history, /reports, /api/analytics
-api_router.include_router(analysis.router, tags=["Disease Analysis"])
+api_router.include_router(analysis.router, dependencies=needs_database, tags=["Disease Analysis"])
 
 # --- 3. Community Forum ---
 # Handles: /posts, /comments, /vote, /posts/{id}/report
-api_router.include_router(forum.router, tags=["Community Forum"])
+api_router.include_router(forum.router, dependencies=needs_database, tags=["Community Forum"])
 
 # --- 4. Weather & Risk ---
 # Handles: /weather
-api_router.include_router(weather.router, tags=["Weather & Risk"])
+api_router.include_router(weather.router, dependencies=needs_database, tags=["Weather & Risk"])
 
 # --- 5. Administration ---
 # Handles: /api/users, /api/admin/reports, /api/admin/stats
-api_router.include_router(admin.router, tags=["Administration"])
+api_router.include_router(admin.router, dependencies=needs_database, tags=["Administration"])
 
 # --- 6. Notifications ---
 # Handles: /notifications
-api_router.include_router(notifications.router, tags=["Notifications"])
+api_router.include_router(notifications.router, dependencies=needs_database, tags=["Notifications"])
 
 # --- 7. AI Chatbot (RAG) ---
 # Handles: /chat_stream, /upload_book
-api_router.include_router(chatbot.router, tags=["AI Assistant"])
+api_router.include_router(chatbot.router, dependencies=needs_database, tags=["AI Assistant"])
 
 # --- 8. System Health & Logs ---
-# Handles: /api/health, /api/logs, /api/researcher/stats
+# Handles: /api/live, /api/ready, /api/health, /api/logs, /api/researcher/stats
+# (not gated: probes must answer while the app is still starting)
 api_router.include_router(system.router, tags=["System Health"])
 
 # --- 9. Library & Diseases (NEW) ---
 # Handles: /api/diseases, /api/library
-api_router.include_router(library.router, tags=["Library"])
\ No newline at end of file
+api_router.include_router(library.router, dependencies=needs_database, tags=["Library"])
\ No newline at end of file
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, Form
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, or_
+from sqlalchemy import func, or_, case
 from datetime import datetime, timedelta
 from collections import Counter
 import os
@@ -9,12 +9,17 @@ from app.core.database import get_db
 from app.models.sql_models import (
     User, SystemLog, DiseaseInfo, Treatment, DiseaseReport, 
     ExpertRecommendation, KnowledgeBase, PostReport, ForumPost, 
-    ForumComment, Notification
+    ForumComment, Notification, DiseaseDailyRollup
 )
 from app.schemas.dtos import (
     RoleUpdate, StatusUpdate, DiseaseRequest, TriageUpdate, 
-    LibraryStatusUpdate, AnnouncementRequest
+    LibraryStatusUpdate, AnnouncementRequest, ShadowRequest
 )
+from app.core.config import settings
+from app.services.ai_service import ai_manager
+from app.services.model_registry import ModelVersionError
+from app.services.rollup_service import rollup_manager
+from app.services.readiness_service import readiness_manager
 
 router = APIRouter()
 
@@ -107,7 +112,10 @@ def delete_disease_info(id: int, db: Session = Depends(get_db)):
 
 @router.get("/api/admin/reports_triage")
 def get_reports_triage(filter_by: str = "all", db: Session = Depends(get_db)):
-    query = db.query(DiseaseReport).options(joinedload(DiseaseReport.recommendations))
+    query = db.query(DiseaseReport).options(
+        joinedload(DiseaseReport.recommendations),
+        joinedload(DiseaseReport.analysis)  # Stored spectrum & severity for reviewers
+    )
     
     if filter_by == "pending":
         query = query.filter(DiseaseReport.verification_status == "Pending")
@@ -195,18 +203,23 @@ def send_announcement(data: AnnouncementRequest, db: Session = Depends(get_db)):
         title=data.title, 
         message=data.message, 
         type="Announcement", 
-        timestamp=datetime.now().strftime("%Y-%m-%d %H:%M")
+        timestamp=datetime.now()
     )
     db.add(new_notif)
     db.commit()
     return {"message": "Sent"}
 
-@router.get("/api/admin/stats")
+@router.get("/api/admin/stats", dependencies=[Depends(readiness_manager.require("rollup"))])
 def get_admin_stats(time_range: str = "7d", db: Session = Depends(get_db)):
+    # Report figures come from the daily rollup (rollup_service), never from raw reports
+    reports = func.coalesce(func.sum(DiseaseDailyRollup.report_count), 0)
+
     # 1. Global Counts (These ALWAYS stay "All Time" for the top cards)
     total_users = db.query(User).count()
-    total_reports = db.query(DiseaseReport).count()
-    pending_reviews = db.query(DiseaseReport).filter(DiseaseReport.verification_status == "Pending").count()
+    total_reports, pending_reviews = db.query(
+        reports,
+        func.coalesce(func.sum(case((DiseaseDailyRollup.verification_status == "Pending", DiseaseDailyRollup.report_count))), 0)
+    ).one()
 
     role_counts_query = db.query(User.role, func.count(User.user_id)).group_by(User.role).all()
     
@@ -230,50 +243,27 @@ def get_admin_stats(time_range: str = "7d", db: Session = Depends(get_db)):
         cutoff_date = now - timedelta(days=7)
         group_by_format = "%Y-%m-%d"
 
-    # 3. Fetch All & Filter in Python
-    # (Since timestamp is a String, we fetch all and filter in memory)
-    all_reports = db.query(DiseaseReport).all()
-    
-    filtered_dates = []
-    disease_counts = Counter()
-    
-    # Track accuracy ONLY for the filtered period
-    filtered_verified_count = 0
-    filtered_correct_count = 0
-
-    for r in all_reports:
-        try:
-            # Parse timestamp
-            r_date = datetime.strptime(r.timestamp, "%Y-%m-%d %H:%M")
-            
-            # --- APPLY TIME FILTER ---
-            if r_date >= cutoff_date:
-                # A. For Trends
-                date_key = r_date.strftime(group_by_format)
-                filtered_dates.append(date_key)
-                
-                # B. For Distribution
-                disease_counts[r.disease_name] += 1
-                
-                # C. For Accuracy (Only count this report if it's inside the date range)
-                if r.is_correct in ["Yes", "No"]:
-                    filtered_verified_count += 1
-                    if r.is_correct == "Yes":
-                        filtered_correct_count += 1
-
-        except Exception:
-            continue
-
-    # 4. Finalize Trends
-    date_counter = Counter(filtered_dates)
-    sorted_keys = sorted(date_counter.keys())
-    trend_data = [{"date": k, "reports": date_counter[k]} for k in sorted_keys]
-
-    # 5. Finalize Distribution (Top 5 for THIS PERIOD)
-    top_diseases = disease_counts.most_common(5)
+    # 3. Rollup days in the period
+    in_range = DiseaseDailyRollup.day >= cutoff_date.date()
+
+    # A. For Trends: per-day counts, rolled up to months for the long ranges
+    date_counter = Counter()
+    for d, count in db.query(DiseaseDailyRollup.day, reports).filter(in_range).group_by(DiseaseDailyRollup.day).all():
+        date_counter[d.strftime(group_by_format)] += count
+    trend_data = [{"date": k, "reports": date_counter[k]} for k in sorted(date_counter)]
+
+    # B. For Distribution (Top 5 for THIS PERIOD)
+    top_diseases = db.query(DiseaseDailyRollup.disease_name, reports) \
+        .filter(in_range).group_by(DiseaseDailyRollup.disease_name) \
+        .order_by(reports.desc()).limit(5).all()
     dist_data = [{"name": name, "value": count} for name, count in top_diseases]
 
-    # 6. Finalize Accuracy (For THIS PERIOD)
+    # C. For Accuracy (only reports inside the date range that got feedback)
+    filtered_verified_count, filtered_correct_count = db.query(
+        reports,
+        func.coalesce(func.sum(case((DiseaseDailyRollup.is_correct == "Yes", DiseaseDailyRollup.report_count))), 0)
+    ).filter(in_range, DiseaseDailyRollup.is_correct.in_(["Yes", "No"])).one()
+
     accuracy_rate = 0
     if filtered_verified_count > 0:
         accuracy_rate = round((filtered_correct_count / filtered_verified_count) * 100, 1)
@@ -288,3 +278,57 @@ def get_admin_stats(time_range: str = "7d", db: Session = Depends(get_db)):
         "ai_accuracy": accuracy_rate,
         "feedback_count": filtered_verified_count
     }
+
+@router.post("/api/admin/analytics/rollup/rebuild", dependencies=[Depends(readiness_manager.require("database"))])
+def rebuild_rollup(db: Session = Depends(get_db)):
+    """Recounts the daily disease rollup from the reports (repair after manual DB edits)."""
+    rows = rollup_manager.rebuild()
+    log_event(db, "INFO", "Analytics", f"Disease rollup rebuilt ({rows} rows)")
+    return {"message": "Rollup rebuilt", "rows": rows}
+
+# ==========================================
+# 6. MODEL REGISTRY (Path: /api/admin/models)
+# ==========================================
+
+@router.get("/api/admin/models")
+def get_models(db: Session = Depends(get_db)):
+    """Versions on disk, the active/previous/shadow ones, and how many reports each produced."""
+    status = ai_manager.model_status()
+    counts = db.query(DiseaseReport.model_version, func.count(DiseaseReport.report_id)).group_by(DiseaseReport.model_version).all()
+    status["reports_by_version"] = {version or "unversioned": count for version, count in counts}
+    return status
+
+# Plain defs: FastAPI runs them on the threadpool, and loading a model takes a while
+@router.post("/api/admin/models/{version}/activate")
+def activate_model(version: str, db: Session = Depends(get_db)):
+    previous = ai_manager.version
+    try:
+        ai_manager.activate(version)
+    except ModelVersionError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        print(f"Model Activation Error: {e}")
+        raise HTTPException(status_code=500, detail=f"Could not load model {version}")
+    log_event(db, "WARNING", "Models", f"Activated model {version} (was {previous})")
+    return ai_manager.model_status()
+
+@router.post("/api/admin/models/{version}/shadow")
+def shadow_model(version: str, data: ShadowRequest, db: Session = Depends(get_db)):
+    sample_rate = data.sample_rate or settings.SHADOW_SAMPLE_RATE
+    try:
+        ai_manager.start_shadow(version, sample_rate)
+    except ModelVersionError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Shadow Start Error: {e}")
+        raise HTTPException(status_code=500, detail=f"Could not load model {version}")
+    log_event(db, "INFO", "Models", f"Shadowing model {version} on {sample_rate:.0%} of scans")
+    return ai_manager.model_status()
+
+@router.delete("/api/admin/models/shadow")
+def stop_shadow_model(db: Session = Depends(get_db)):
+    ai_manager.stop_shadow()
+    log_event(db, "INFO", "Models", "Stopped shadow inference")
+    return ai_manager.model_status()
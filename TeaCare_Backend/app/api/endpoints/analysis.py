@@ -1,26 +1,37 @@
-from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
-from fastapi.responses import FileResponse, StreamingResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Query, Header
+from fastapi.responses import FileResponse, StreamingResponse, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import func, or_
 from datetime import datetime, timedelta
-import uuid
+import json
+import asyncio
+import anyio
+import zipfile
 import os
-import cv2
-import numpy as np
 import io
 import csv
-import reverse_geocoder as rg
-import pycountry
-from PIL import Image
-import tensorflow as tf
-from skimage.feature import graycomatrix, graycoprops
 import random
 
-from app.core.database import get_db
-from app.models.sql_models import DiseaseReport, DiseaseInfo, Treatment, SystemLog
+from app.core.database import get_db, SessionLocal
+from app.core.config import settings
+from app.models.sql_models import DiseaseReport, DiseaseDailyRollup, ReportAnalysis, DiseaseInfo, Treatment, SystemLog
 from app.schemas.dtos import LocationUpdate, FeedbackRequest
-from app.services.ai_service import ai_manager
+from app.services.ai_service import ai_manager, TTA_POLICIES
+from app.services.compute_service import compute_manager, ComputeBusyError
+from app.services.image_service import image_pipeline
+from app.services.cv_service import cv_manager, disease_mask, encode_mask
+from app.services.quality_service import quality_manager, ImageRejectedError
+from app.services.heatmap_service import heatmap_manager, HEATMAP_FORMATS
+from app.services.cache_service import prediction_cache
+from app.services.job_service import job_manager
+from app.services.storage_service import storage_manager
+from app.services.upload_service import upload_manager, UploadRejectedError, IMAGE_TYPES, ARCHIVE_TYPES
+from app.services.thumbnail_service import thumbnail_manager, with_renditions
 from app.services.pdf_service import pdf_manager
+from app.services.location_service import location_manager
+from app.services.readiness_service import readiness_manager
 from typing import Optional, List
 
 router = APIRouter()
@@ -34,116 +45,355 @@ def log_event(db: Session, level: str, source: str, message: str):
     except Exception as e:
         print(f"Logging failed: {e}")
 
-# --- HELPER: Computer Vision Forensics (Local) ---
-def analyze_lesions_advanced(image_path):
+# --- HELPER: Stored Analysis (report_analyses side table) ---
+CV_METRIC_FIELDS = [
+    "severity", "lesion_count", "avg_spot_area_px", "avg_circularity",
+    "gli_index", "texture_contrast", "texture_homogeneity", "heatmap_url"
+]
+
+def build_analysis(class_probs, cv_metrics=None) -> ReportAnalysis:
+    analysis = ReportAnalysis(
+        probabilities={p["disease"]: round(p["probability"], 2) for p in class_probs}
+    )
+    apply_cv_metrics(analysis, cv_metrics or {})
+    return analysis
+
+def apply_cv_metrics(analysis: ReportAnalysis, cv_metrics: dict):
+    for field in CV_METRIC_FIELDS + ["lesion_mask"]:
+        if field in cv_metrics:
+            setattr(analysis, field, cv_metrics[field])
+
+def link_heatmap(report: DiseaseReport) -> str:
+    """Needs report_id (call after flush): points heatmap_url at the on-demand render endpoint."""
+    analysis = report.analysis
+    if analysis is None or analysis.lesion_mask is None:
+        return ""
+    analysis.heatmap_url = f"api/reports/{report.report_id}/heatmap"
+    return analysis.heatmap_url
+
+def forensics_image(file_location: str):
+    """Full-resolution decode of a saved upload: stored CV metrics are measured in its own pixels."""
+    return image_pipeline.load(storage_manager.local_path(file_location), full_resolution=True)
+
+def analyze_saved(file_location: str, progress=None) -> dict:
+    return cv_manager.analyze_lesions(forensics_image(file_location), progress)
+
+def ensure_lesion_mask(report: DiseaseReport):
+    """
+    Quick scans and legacy reports have no stored mask: derive it from the
+    original image once (caller commits). Returns the PNG bytes or None.
+    """
+    if report.analysis is None:
+        report.analysis = ReportAnalysis()
+    analysis = report.analysis
+    if analysis.lesion_mask is None:
+        if not storage_manager.exists(report.image_url):
+            return None
+        mask, _ = disease_mask(forensics_image(report.image_url))
+        analysis.lesion_mask = encode_mask(mask)
+        link_heatmap(report)
+    return analysis.lesion_mask
+
+def stored_cv_metrics(analysis: ReportAnalysis) -> dict:
+    return {f: getattr(analysis, f) for f in CV_METRIC_FIELDS if getattr(analysis, f) is not None}
+
+def stored_spectrum(analysis: ReportAnalysis, limit: int = 5) -> list:
+    ranked = sorted(analysis.probabilities.items(), key=lambda kv: kv[1], reverse=True)
+    return [{"name": name, "prob": prob} for name, prob in ranked[:limit]]
+
+# --- HELPER: Uploads (streamed to disk, see upload_service) ---
+async def ingest_upload(file: UploadFile, types: dict = IMAGE_TYPES, max_bytes: int = None):
+    """Streams an UploadFile to a temp file off the event loop. Caller must close() it."""
     try:
-        # 1. Load & Preprocess
-        img = cv2.imread(image_path)
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-
-        # 2. VEGETATION INDEX (Green Leaf Index - GLI)
-        # GLI = (2G - R - B) / (2G + R + B)
-        # We calculate the mean GLI for the whole leaf
-        R, G, B = cv2.split(img_rgb)
-        # Avoid division by zero
-        denom = (2.0 * G + R + B) + 0.00001
-        gli_matrix = (2.0 * G - R - B) / denom
-        avg_gli = np.mean(gli_matrix)
-
-        # 3. TEXTURE ANALYSIS (Entropy & Contrast)
-        # Entropy = measure of randomness (high for fungal textures)
-        # Contrast = measure of local intensity variation
-        from skimage.feature import graycomatrix, graycoprops
-        # Calculate GLCM (Gray Level Co-occurrence Matrix)
-        # We downscale slightly for speed if needed, but 224x224 is fast enough
-        glcm = graycomatrix(gray, distances=[1], angles=[0], levels=256, symmetric=True, normed=True)
-        texture_contrast = graycoprops(glcm, 'contrast')[0, 0]
-        texture_homogeneity = graycoprops(glcm, 'homogeneity')[0, 0]
-        
-        # 4. MORPHOLOGY (Lesion Shapes)
-        # Mask for disease (same logic as before)
-        lower_green = np.array([35, 40, 40])
-        upper_green = np.array([85, 255, 255])
-        green_mask = cv2.inRange(hsv, lower_green, upper_green)
-        _, thresh = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY_INV)
-        disease_mask = cv2.bitwise_and(thresh, cv2.bitwise_not(green_mask))
-        
-        # Find contours of spots
-        contours, _ = cv2.findContours(disease_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        lesion_count = len(contours)
-        avg_circularity = 0
-        avg_area = 0
-        
-        valid_spots = 0
-        for cnt in contours:
-            area = cv2.contourArea(cnt)
-            if area > 10: # Ignore tiny noise
-                perimeter = cv2.arcLength(cnt, True)
-                if perimeter > 0:
-                    # Circularity = 4 * pi * Area / (Perimeter^2)
-                    # 1.0 = Perfect Circle, < 0.5 = Irregular/Splotchy
-                    circularity = (4 * np.pi * area) / (perimeter * perimeter)
-                    avg_circularity += circularity
-                    avg_area += area
-                    valid_spots += 1
-        
-        if valid_spots > 0:
-            avg_circularity /= valid_spots
-            avg_area /= valid_spots
-
-        # 5. Generate Heatmap (Same as before)
-        heatmap = img.copy()
-        heatmap[disease_mask > 0] = [0, 0, 255] # Red BGR
-        blended = cv2.addWeighted(img, 0.7, heatmap, 0.3, 0)
-        filename = os.path.basename(image_path)
-        heatmap_path = f"uploads/heatmap_{filename}"
-        cv2.imwrite(heatmap_path, blended)
+        return await run_in_threadpool(upload_manager.ingest, file.file, file.filename, types, max_bytes)
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+# --- HELPER: Blocking Scan Stages (run on the compute pool) ---
+def classify_cached(image, upload, policy: str, early_exit: float):
+    """
+    Classifier scores through the prediction cache. Returns (bundle,
+    file_location, scores), bundle being the model version that produced the
+    scores; storage is content-addressed, so exact re-uploads get the stored
+    file's URL back instead of a second copy.
+    """
+    bundle, results = classify_cached_batch([image], [upload], policy, early_exit)
+    return (bundle, *results[0])
+
+def classify_cached_batch(images: list, uploads: list, policy: str, early_exit: float):
+    """
+    classify_cached for StoredUploads; cache misses are scored as one batch.
+    Returns (bundle, [(file_location, scores)]).
+    """
+    # One version for the whole call, even if an admin swaps models meanwhile
+    bundle = ai_manager.bundle
+    if bundle is None: raise Exception("Model not loaded")
+    # Early exit can change the averaged scores, so it is part of the key (and so is the model)
+    namespace = f"{bundle.version}:{policy}:{early_exit or 0:g}"
+    results = [None] * len(images)
+    misses = []
+
+    for i, (image, upload) in enumerate(zip(images, uploads)):
+        entry, kind = prediction_cache.get(namespace, upload.sha256, image.dhash, image.thumb)
+        if entry is None:
+            misses.append(i)
+        else:
+            results[i] = (upload.keep(), entry["scores"])
 
-        return {
-            "gli_index": round(avg_gli, 3),          # Green Leaf Index (-1 to 1)
-            "texture_contrast": round(texture_contrast, 1), # High = Rough
-            "texture_homogeneity": round(texture_homogeneity, 2), # High = Smooth
-            "lesion_count": lesion_count,
-            "avg_spot_area_px": round(avg_area, 0),
-            "avg_circularity": round(avg_circularity, 2), # 1.0 = Circle
-            "heatmap_url": heatmap_path,
-            "severity": round((cv2.countNonZero(disease_mask)/cv2.countNonZero(thresh))*100, 2) if cv2.countNonZero(thresh) > 0 else 0
+    if misses:
+        batch_scores = ai_manager.predict_scores_batch(
+            [images[i] for i in misses], policy=policy, early_exit=early_exit, bundle=bundle
+        )
+        for i, scores in zip(misses, batch_scores):
+            file_location = uploads[i].keep()
+            prediction_cache.put(namespace, uploads[i].sha256, images[i].dhash, images[i].thumb, scores, file_location)
+            results[i] = (file_location, scores)
+    return bundle, results
+
+def run_basic_scan(upload, policy: str, early_exit: float):
+    """Quality gate, save and TTA classification. Raises ImageRejectedError for unusable photos."""
+    image = image_pipeline.decode(upload.view())
+    quality_manager.check(image)
+
+    bundle, file_location, scores = classify_cached(image, upload, policy, early_exit)
+    disease_name, confidence = bundle.top_class(scores)
+    return file_location, disease_name, confidence, bundle.rank_classes(scores), bundle.version
+
+def run_advanced_scan(upload, policy: str, early_exit: float, progress=None):
+    """Save, classification with full spectrum, then CV forensics."""
+    progress = progress or (lambda stage, percent: None)
+    progress("decoding", 5)
+    image = image_pipeline.decode(upload.view())
+    quality_manager.check(image)  # Bad photos never reach the classifier
+
+    # Classifier view comes from the reduced decode (cached per content)
+    progress("classifying", 15)
+    bundle, file_location, scores = classify_cached(image, upload, policy, early_exit)
+    
+    class_probs = bundle.rank_classes(scores)
+
+    cv_metrics = analyze_saved(file_location, progress)
+    return file_location, class_probs, cv_metrics, bundle.version
+
+# Fallback values if CV fails (from reference code)
+EMPTY_CV_METRICS = {
+    "severity": 0,
+    "lesion_count": 0,
+    "heatmap_url": "",
+    "gli_index": 0,
+    "texture_contrast": 0,
+    "texture_homogeneity": 0,
+    "avg_circularity": 0,
+    "avg_spot_area_px": 0,
+    "lesion_areas_px": [],
+    "lesion_circularities": []
+}
+
+def new_advanced_report(user_id: int, file_location: str, class_probs: list, cv_metrics: dict, model_version: str) -> DiseaseReport:
+    top_result = class_probs[0]
+    initial_status = "Auto-Verified" if top_result['probability'] > 85.0 else "Pending"
+    initial_correctness = "Yes" if initial_status == "Auto-Verified" else "Unknown"
+
+    report = DiseaseReport(
+        user_id=user_id,
+        disease_name=top_result["disease"],
+        confidence=f"{top_result['probability']:.1f}%",
+        confidence_score=round(float(top_result['probability']), 1),
+        model_version=model_version,
+        image_url=file_location,
+        timestamp=datetime.now(),
+        verification_status=initial_status, 
+        is_correct=initial_correctness
+    )
+    report.analysis = build_analysis(class_probs, cv_metrics)
+    return report
+
+def advanced_payload(file_location: str, class_probs: list, cv_metrics: dict, model_version: str) -> dict:
+    """Advanced scan response body (everything except the report id)."""
+    return {
+        "top_diagnosis": class_probs[0],
+        "full_spectrum": class_probs[:5],
+        "image_url": file_location,
+        "model_version": model_version,
+        "telemetry": {k: v for k, v in cv_metrics.items() if k != "lesion_mask"},
+        
+        # Scientific Metrics (Safe Access)
+        "severity_metrics": {
+            "score": cv_metrics.get("severity", 0),
+            "lesion_count": cv_metrics.get("lesion_count", 0),
+            "heatmap_url": cv_metrics.get("heatmap_url", "")
         }
+    }
 
+def resolve_tta(tta: Optional[str], early_exit: Optional[float], default_policy: str):
+    """Per-request TTA overrides, falling back to the endpoint defaults in settings."""
+    policy = tta or default_policy
+    if policy not in TTA_POLICIES:
+        raise HTTPException(status_code=400, detail=f"tta must be one of {list(TTA_POLICIES)}")
+    if early_exit is None:
+        early_exit = settings.TTA_EARLY_EXIT_CONFIDENCE
+    if not 0 <= early_exit <= 100:
+        raise HTTPException(status_code=400, detail="early_exit must be a confidence between 0 and 100")
+    return policy, early_exit
+
+# --- HELPER: Bulk Scans (many files or one zip) ---
+BATCH_IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+def extract_zip_images(archive_upload) -> list:
+    """
+    StoredUploads for every image in a zip; folders and macOS metadata are
+    skipped. Members are streamed out one chunk at a time, never inflated in memory.
+    """
+    max_bytes = settings.BATCH_MAX_UPLOAD_MB * 1024 * 1024
+    images, total = [], 0
+    try:
+        with zipfile.ZipFile(archive_upload.path) as archive:
+            for info in archive.infolist():
+                name = os.path.basename(info.filename)
+                if info.is_dir() or name.startswith(".") or "__MACOSX" in info.filename:
+                    continue
+                if not name.lower().endswith(BATCH_IMAGE_EXTENSIONS):
+                    continue
+                # Check declared sizes before inflating anything (zip bombs)
+                total += info.file_size
+                if total > max_bytes or len(images) >= settings.BATCH_MAX_IMAGES:
+                    raise HTTPException(status_code=413, detail="Archive has too many or too large images")
+                # ingest() still enforces the per-image limit on the real inflated size
+                with archive.open(info) as member:
+                    images.append(upload_manager.ingest(member, name))
+    except BaseException:
+        for image in images:
+            image.close()
+        raise
+    return images
+
+def run_batch_classify(uploads: list, policy: str, early_exit: float) -> list:
+    """
+    Batch stage 1: decode, quality gate and classify all uploads, with every
+    cache miss going through the model as one batch.
+    Returns per upload either (image, file_location, class_probs, model_version)
+    or an error dict ({"error", "reason"}).
+    """
+    results = [None] * len(uploads)
+    decoded = []
+    for i, upload in enumerate(uploads):
+        try:
+            image = image_pipeline.decode(upload.view())
+        except Exception:
+            results[i] = {"error": "Unsupported or corrupt image", "reason": "corrupt"}
+            continue
+        try:
+            quality_manager.check(image)
+        except ImageRejectedError as e:
+            results[i] = {"error": e.message, "reason": e.reason}
+            continue
+        decoded.append((i, image))
+
+    if decoded:
+        bundle, classified = classify_cached_batch(
+            [image for _, image in decoded], [uploads[i] for i, _ in decoded], policy, early_exit
+        )
+        for (i, image), (file_location, scores) in zip(decoded, classified):
+            results[i] = (image, file_location, bundle.rank_classes(scores), bundle.version)
+    return results
+
+def ndjson_line(payload: dict) -> str:
+    return json.dumps(jsonable_encoder(payload)) + "\n"
+
+def save_batch_reports(reports: dict) -> dict:
+    """Inserts all batch reports in one transaction. Returns {index: (report_id, heatmap_url)}."""
+    db = SessionLocal()
+    try:
+        ordered = sorted(reports.items())
+        db.add_all([report for _, report in ordered])
+        db.flush()  # Assigns ids without a refresh per row after commit
+        saved = {i: (report.report_id, link_heatmap(report)) for i, report in ordered}
+        db.commit()
+        for i, report in ordered:
+            thumbnail_manager.schedule(DiseaseReport, saved[i][0], report.image_url)
+        return saved
     except Exception as e:
-        print(f"CV Error: {e}")
+        db.rollback()
+        print(f"Batch insert failed: {e}")
         return {}
+    finally:
+        db.close()
+
+async def stream_batch_results(user_id: int, uploads: list, classified: list):
+    """
+    Batch stage 2: lesion analysis per image on the compute pool, one NDJSON
+    line per image as it finishes, then a summary line with the report ids
+    (and heatmap URLs, which need the id).
+    """
+    # A bulk upload shouldn't take the whole compute queue from single scans
+    lanes = asyncio.Semaphore(settings.COMPUTE_POOL_SIZE)
+
+    async def analyze(i, file_location):
+        """(index, cv_metrics or None, error or None). None metrics = saved without telemetry."""
+        async with lanes:
+            try:
+                return i, await compute_manager.run(analyze_saved, file_location), None
+            except ComputeBusyError:
+                return i, None, None  # Export / heatmap analyse it later, like a quick scan
+            except Exception as e:
+                print(f"Batch CV Error ({uploads[i].filename}): {e}")
+                return i, None, "Lesion analysis failed"
+
+    tasks = []
+    for i, item in enumerate(classified):
+        if isinstance(item, dict):
+            yield ndjson_line({"index": i, "filename": uploads[i].filename, **item})
+        else:
+            tasks.append(analyze(i, item[1]))
+
+    reports = {}
+    try:
+        for finished in asyncio.as_completed(tasks):
+            i, cv_metrics, error = await finished
+            if error:
+                yield ndjson_line({"index": i, "filename": uploads[i].filename, "error": error, "reason": "analysis_failed"})
+                continue
+            _, file_location, class_probs, model_version = classified[i]
+            # No CV row fields on failure, so they are computed later instead of stored as zeros
+            reports[i] = new_advanced_report(user_id, file_location, class_probs, cv_metrics, model_version)
+            yield ndjson_line({"index": i, "filename": uploads[i].filename, **advanced_payload(file_location, class_probs, cv_metrics or {}, model_version)})
+    finally:
+        # Keep whatever finished even if the client dropped mid-stream. Shielded,
+        # since a disconnect cancels this task; the DB writes run off the event loop
+        with anyio.CancelScope(shield=True):
+            saved = await run_in_threadpool(save_batch_reports, reports)
+
+    yield ndjson_line({
+        "summary": True,
+        "images": len(uploads),
+        "saved": len(saved),
+        "failed": len(uploads) - len(saved),
+        "report_ids": {str(i): report_id for i, (report_id, _) in saved.items()},
+        "heatmap_urls": {str(i): url for i, (_, url) in saved.items() if url}
+    })
 
 # ==========================================
 # 1. PREDICTION ENDPOINTS
 # ==========================================
 
-@router.post("/predict")
+@router.post("/predict", dependencies=[Depends(readiness_manager.require("vision"))])
 async def predict_disease(
     user_id: int = Form(...),
     file: UploadFile = File(...), 
+    tta: Optional[str] = Form(None),            # none | flip | full
+    early_exit: Optional[float] = Form(None),   # Confidence % to skip the extra TTA views
     db: Session = Depends(get_db)
 ):
     if not ai_manager.model:
         return {"error": "AI Model offline", "confidence": "0%"}
 
-    try:
-        contents = await file.read()
-        
-        if ai_manager.is_blurry(contents):
-            return {"error": "Image is too blurry", "blur_score": "Low"}
-
-        # Save File
-        ext = os.path.splitext(file.filename)[1]
-        file_location = f"uploads/{uuid.uuid4()}{ext}"
-        with open(file_location, "wb") as buffer:
-            buffer.write(contents)
+    policy, early_exit = resolve_tta(tta, early_exit, settings.TTA_POLICY_PREDICT)
+    upload = await ingest_upload(file)
 
-        # Predict
-        disease_name, confidence = ai_manager.predict_image(contents)
+    try:
+        # Blur check, save & predict on the compute pool (keeps the event loop free)
+        scan = await compute_manager.run(run_basic_scan, upload, policy, early_exit)
+        file_location, disease_name, confidence, class_probs, model_version = scan
         
         # Low Confidence Logic
         symptoms, causes, treatment_list = [], [], []
@@ -171,14 +421,18 @@ async def predict_disease(
             user_id=user_id,
             disease_name=disease_name,
             confidence=f"{confidence:.1f}%",
+            confidence_score=round(float(confidence), 1),
+            model_version=model_version,
             image_url=file_location,
-            timestamp=datetime.now().strftime("%Y-%m-%d %H:%M"),
+            timestamp=datetime.now(),
             verification_status=initial_status,
             is_correct=initial_correctness
         )
+        new_report.analysis = build_analysis(class_probs)
         db.add(new_report)
         db.commit()
         db.refresh(new_report)
+        thumbnail_manager.schedule(DiseaseReport, new_report.report_id, file_location)
 
         return {
             "report_id": new_report.report_id,
@@ -187,116 +441,209 @@ async def predict_disease(
             "symptoms": symptoms,
             "causes": causes,
             "treatments": treatment_list,
-            "image_url": file_location
+            "image_url": file_location,
+            "model_version": model_version
         }
+    except ImageRejectedError as e:
+        rejection = {"error": e.message, "reason": e.reason}
+        if e.reason == "blurry":
+            rejection["blur_score"] = "Low"  # Older app builds look for this
+        return rejection
+    except ComputeBusyError:
+        raise HTTPException(status_code=503, detail="Scanner is busy, please retry shortly")
     except Exception as e:
         print(f"Prediction Error: {e}")
         raise HTTPException(status_code=500, detail="Server Error")
+    finally:
+        upload.close()  # Deletes the temp file unless it was kept
 
-@router.post("/predict/advanced")
+@router.post("/predict/advanced", dependencies=[Depends(readiness_manager.require("vision"))])
 async def predict_advanced(
     user_id: int = Form(...),
     file: UploadFile = File(...), 
+    tta: Optional[str] = Form(None),            # none | flip | full
+    early_exit: Optional[float] = Form(None),   # Confidence % to skip the extra TTA views
     db: Session = Depends(get_db)
 ):
     # Use ai_manager to check model status
     if not ai_manager.model:
         raise HTTPException(status_code=503, detail="AI Model is offline")
 
-    try:
-        # 1. Read & Save Original
-        contents = await file.read()
-        ext = os.path.splitext(file.filename)[1]
-        file_location = f"uploads/{uuid.uuid4()}{ext}"
-        
-        # Ensure uploads directory exists (from reference code)
-        os.makedirs("uploads", exist_ok=True) 
-        
-        with open(file_location, "wb") as buffer:
-            buffer.write(contents)
-
-        # 2. RUN AI MODEL (Classification)
-        # Standardize image processing (from reference code)
-        image = Image.open(io.BytesIO(contents)).convert('RGB')
-        image = image.resize((224, 224))
-        img_array = np.asarray(image)
-        batch = np.array([img_array])
-
-        # Use ai_manager.model for prediction
-        predictions = ai_manager.model.predict(batch)
-        scores = tf.nn.softmax(predictions[0]).numpy()
-        
-        class_probs = []
-        for i, score in enumerate(scores):
-            # Use ai_manager.class_names
-            raw_name = ai_manager.class_names[i]
-            clean_name = raw_name
-            
-            # Logic to clean the name (remove numbering like "3. Gray Blight")
-            if ". " in raw_name and raw_name.split(". ")[0].isdigit():
-                clean_name = raw_name.split(". ", 1)[1]
+    policy, early_exit = resolve_tta(tta, early_exit, settings.TTA_POLICY_ADVANCED)
 
-            class_probs.append({
-                "disease": clean_name, 
-                "probability": float(score) * 100
-            })
-            
-        class_probs.sort(key=lambda x: x["probability"], reverse=True)
-        top_result = class_probs[0]
-
-        # 3. RUN COMPUTER VISION (Quantification)
-        cv_metrics = analyze_lesions_advanced(file_location)
-
-        # Fallback values if CV fails (from reference code)
-        if not cv_metrics:
-            cv_metrics = {
-                "severity": 0,
-                "lesion_count": 0,
-                "heatmap_url": "",
-                "gli_index": 0,
-                "texture_contrast": 0,
-                "texture_homogeneity": 0,
-                "avg_circularity": 0,
-                "avg_spot_area_px": 0
-            }
-
-        initial_status = "Auto-Verified" if top_result['probability'] > 85.0 else "Pending"
-        initial_correctness = "Yes" if initial_status == "Auto-Verified" else "Unknown"
+    # 1. Stream Upload to disk
+    upload = await ingest_upload(file)
 
-        # 4. Save Report
-        new_report = DiseaseReport(
-            user_id=user_id,
-            disease_name=top_result["disease"],
-            confidence=f"{top_result['probability']:.1f}%",
-            image_url=file_location,
-            timestamp=datetime.now().strftime("%Y-%m-%d %H:%M"),
-            verification_status=initial_status, 
-            is_correct=initial_correctness
+    try:
+        # 2. Save, Classify & Quantify on the compute pool
+        file_location, class_probs, cv_metrics, model_version = await compute_manager.run(
+            run_advanced_scan, upload, policy, early_exit
         )
+        cv_metrics = cv_metrics or dict(EMPTY_CV_METRICS)
+
+        # 3. Save Report
+        new_report = new_advanced_report(user_id, file_location, class_probs, cv_metrics, model_version)
         db.add(new_report)
+        db.flush()
+        cv_metrics["heatmap_url"] = link_heatmap(new_report)
         db.commit()
+        thumbnail_manager.schedule(DiseaseReport, new_report.report_id, file_location)
 
-        # 5. Return Advanced Data (Detailed structure from reference code)
-        return {
-            "report_id": new_report.report_id,
-            "top_diagnosis": top_result,
-            "full_spectrum": class_probs[:5],
-            "image_url": file_location,
-            "telemetry": cv_metrics,
-            
-            # Scientific Metrics (Safe Access)
-            "severity_metrics": {
-                "score": cv_metrics.get("severity", 0),
-                "lesion_count": cv_metrics.get("lesion_count", 0),
-                "heatmap_url": cv_metrics.get("heatmap_url", "")
-            }
-        }
+        # 4. Return Advanced Data (Detailed structure from reference code)
+        return {"report_id": new_report.report_id, **advanced_payload(file_location, class_probs, cv_metrics, model_version)}
 
+    except ImageRejectedError as e:
+        raise HTTPException(status_code=422, detail={"reason": e.reason, "message": e.message})
+    except ComputeBusyError:
+        raise HTTPException(status_code=503, detail="Scanner is busy, please retry shortly")
     except Exception as e:
         import traceback
         traceback.print_exc() # Prints real error to terminal for debugging
         print(f"Advanced Scan Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        upload.close()
+
+@router.post("/predict/batch", dependencies=[Depends(readiness_manager.require("vision"))])
+async def predict_batch(
+    user_id: int = Form(...),
+    files: List[UploadFile] = File(...),       # Many images, or a single .zip of them
+    tta: Optional[str] = Form(None),            # none | flip | full
+    early_exit: Optional[float] = Form(None),   # Confidence % to skip the extra TTA views
+):
+    """
+    Bulk advanced scan for field uploads. Streams application/x-ndjson:
+    one line per image ({"index", "filename", ...advanced fields} or
+    {"index", "filename", "error"}), then {"summary": true, "report_ids": {index: id}}.
+    """
+    if not ai_manager.model:
+        raise HTTPException(status_code=503, detail="AI Model is offline")
+
+    policy, early_exit = resolve_tta(tta, early_exit, settings.TTA_POLICY_ADVANCED)
+
+    uploads = []
+    try:
+        for f in files:
+            upload = await ingest_upload(f, IMAGE_TYPES | ARCHIVE_TYPES, settings.BATCH_MAX_UPLOAD_MB * 1024 * 1024)
+            if upload.mime in ARCHIVE_TYPES:
+                with upload:
+                    uploads.extend(await compute_manager.run(extract_zip_images, upload))
+            else:
+                uploads.append(upload)
+                if upload.size > upload_manager.max_bytes:
+                    raise HTTPException(status_code=413, detail=f"{f.filename}: file is larger than {settings.UPLOAD_MAX_IMAGE_MB} MB")
+
+        if not uploads:
+            raise HTTPException(status_code=400, detail="No images found in upload")
+        if len(uploads) > settings.BATCH_MAX_IMAGES:
+            raise HTTPException(status_code=413, detail=f"At most {settings.BATCH_MAX_IMAGES} images per batch")
+
+        classified = await compute_manager.run(run_batch_classify, uploads, policy, early_exit)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Corrupt zip archive")
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except ComputeBusyError:
+        raise HTTPException(status_code=503, detail="Scanner is busy, please retry shortly")
+    finally:
+        # Classified images are decoded and kept in uploads/ by now; drop the rest
+        for upload in uploads:
+            upload.close()
+
+    return StreamingResponse(
+        stream_batch_results(user_id, uploads, classified),
+        media_type="application/x-ndjson"
+    )
+
+# --- Job mode: accept now, analyze in the background (weak mobile links) ---
+def job_links(job_id: str) -> dict:
+    # Relative like image_url; clients prefix the API host
+    return {"status_url": f"jobs/{job_id}", "events_url": f"jobs/{job_id}/events"}
+
+@router.post("/predict/advanced/jobs", status_code=202, dependencies=[Depends(readiness_manager.require("vision"))])
+async def submit_advanced_job(
+    user_id: int = Form(...),
+    file: UploadFile = File(...), 
+    tta: Optional[str] = Form(None),            # none | flip | full
+    early_exit: Optional[float] = Form(None),   # Confidence % to skip the extra TTA views
+):
+    """
+    Same pipeline as /predict/advanced, but returns a job id immediately.
+    Poll GET /jobs/{id} or follow GET /jobs/{id}/events (Server-Sent Events);
+    the finished job's result is the /predict/advanced response body.
+    """
+    if not ai_manager.model:
+        raise HTTPException(status_code=503, detail="AI Model is offline")
+
+    policy, early_exit = resolve_tta(tta, early_exit, settings.TTA_POLICY_ADVANCED)
+    # On disk before we return; the UploadFile is gone once the 202 is sent
+    upload = await ingest_upload(file)
+
+    async def work(job):
+        try:
+            file_location, class_probs, cv_metrics, model_version = await compute_manager.run(
+                run_advanced_scan, upload, policy, early_exit, job_manager.reporter(job)
+            )
+        finally:
+            upload.close()
+        cv_metrics = cv_metrics or dict(EMPTY_CV_METRICS)
+
+        job_manager.update(job, stage="saving", progress=95)
+        db = SessionLocal()
+        try:
+            new_report = new_advanced_report(user_id, file_location, class_probs, cv_metrics, model_version)
+            db.add(new_report)
+            db.flush()
+            report_id = new_report.report_id
+            cv_metrics["heatmap_url"] = link_heatmap(new_report)
+            db.commit()
+            thumbnail_manager.schedule(DiseaseReport, report_id, file_location)
+        finally:
+            db.close()
+        return {"report_id": report_id, **advanced_payload(file_location, class_probs, cv_metrics, model_version)}
+
+    job = job_manager.submit("advanced_scan", work, owner=user_id)
+    return {"job_id": job.job_id, "status": job.status, **job_links(job.job_id)}
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return jsonable_encoder(job.to_dict())
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """
+    Server-Sent Events: a "progress" event on every stage change, then one
+    final "done" or "failed" event carrying the full job (incl. result).
+    Reconnecting simply replays the current state first.
+    """
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+
+    def sse(event: str, payload: dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(jsonable_encoder(payload))}\n\n"
+
+    async def event_generator():
+        seen = -1
+        while True:
+            if job.version != seen:
+                seen = job.version
+                state = job.to_dict()
+                if job.finished:
+                    yield sse(job.status, state)
+                    return
+                yield sse("progress", {k: state[k] for k in ("job_id", "status", "stage", "progress")})
+            elif not await job_manager.wait_for_change(job, seen, timeout=15):
+                yield ": keep-alive\n\n"  # Stops proxies / mobile carriers from idling us out
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # ==========================================
 # 2. REPORT MANAGEMENT
@@ -304,7 +651,12 @@ async def predict_advanced(
 
 @router.get("/history/{user_id}")
 def get_history(user_id: int, db: Session = Depends(get_db)):
-    return db.query(DiseaseReport).filter(DiseaseReport.user_id == user_id).order_by(DiseaseReport.report_id.desc()).all()
+    """image_url is the full photo; thumbnail_url / preview_url are for lists and cards."""
+    reports = db.query(DiseaseReport).filter(DiseaseReport.user_id == user_id).order_by(DiseaseReport.report_id.desc()).all()
+    return [
+        with_renditions({c.name: getattr(r, c.name) for c in DiseaseReport.__table__.columns})
+        for r in reports
+    ]
 
 @router.patch("/history/{report_id}/location")
 def update_location(report_id: int, loc: LocationUpdate, db: Session = Depends(get_db)):
@@ -314,8 +666,15 @@ def update_location(report_id: int, loc: LocationUpdate, db: Session = Depends(g
     
     report.latitude = loc.latitude
     report.longitude = loc.longitude
+    # Resolve the place now so analytics never geocode. While the geocoder is
+    # still loading it stays empty and the start-up backfill fills it in.
+    if readiness_manager.is_ready("geocoder"):
+        try:
+            location_manager.locate(report)
+        except Exception as e:
+            print(f"Place lookup failed for report {report_id}: {e}")
     db.commit()
-    return {"message": "Location saved"}
+    return {"message": "Location saved", "country": report.country, "region": report.region, "city": report.city}
 
 @router.post("/history/{report_id}/feedback")
 def submit_feedback(report_id: int, feedback: FeedbackRequest, db: Session = Depends(get_db)):
@@ -344,28 +703,100 @@ def export_report_pdf(report_id: int, db: Session = Depends(get_db)):
     if not report:
         raise HTTPException(status_code=404, detail="Report not found")
 
-    # Re-run Advanced Analysis for the PDF
-    cv_metrics = analyze_lesions_advanced(report.image_url)
-    
-    # Re-calculate Confusion Spectrum (simplified)
-    # Ideally, we store this in DB, but re-calculating ensures fresh data
-    confusion_spectrum = [{"name": report.disease_name, "prob": float(report.confidence.strip('%'))}]
+    # Telemetry is stored at scan time. Only quick scans and legacy reports
+    # have none yet; those are analysed once here and the result is kept.
+    analysis = report.analysis
+    if analysis is None:
+        analysis = ReportAnalysis()
+        report.analysis = analysis
+
+    if analysis.severity is None:
+        try:
+            cv_metrics = analyze_saved(report.image_url)
+        except Exception as e:
+            print(f"CV Error: {e}")
+            cv_metrics = {}
+        if cv_metrics:
+            apply_cv_metrics(analysis, cv_metrics)
+
+    # Heatmap comes from the render cache (legacy reports get their mask derived once)
+    heatmap_path = None
+    try:
+        lesion_mask = ensure_lesion_mask(report)
+        if lesion_mask is not None:
+            link_heatmap(report)
+            heatmap_path, _ = heatmap_manager.render(report.report_id, report.image_url, lesion_mask, 512, "jpeg")
+    except Exception as e:
+        print(f"Heatmap Error: {e}")
+    db.commit()
+
+    cv_metrics = stored_cv_metrics(analysis)
+
+    # Stored probability vector; legacy rows only have the winning score
+    if analysis.probabilities:
+        confusion_spectrum = stored_spectrum(analysis)
+    else:
+        confusion_spectrum = [{"name": report.disease_name, "prob": report.confidence_score or 0.0}]
     
-    pdf_path = pdf_manager.generate_disease_report(report, cv_metrics, confusion_spectrum)
+    pdf_path = pdf_manager.generate_disease_report(report, cv_metrics, confusion_spectrum, heatmap_path)
     
     return FileResponse(pdf_path, media_type='application/pdf', filename=f"TeaCare_Report_{report_id}.pdf")
 
+@router.get("/api/reports/{report_id}/heatmap")
+async def get_report_heatmap(
+    report_id: int,
+    size: int = Query(settings.HEATMAP_DEFAULT_SIZE, ge=64, le=settings.HEATMAP_MAX_SIZE),
+    fmt: str = Query("webp", alias="format"),   # webp | jpeg
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """Lesion heatmap rendered on demand from the stored mask (disk-cached, ETag/304)."""
+    if fmt not in HEATMAP_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(HEATMAP_FORMATS)}")
+
+    def load_report():
+        # Blocking DB reads (incl. the deferred mask) stay off the event loop
+        report = db.query(DiseaseReport).options(joinedload(DiseaseReport.analysis)).filter(
+            DiseaseReport.report_id == report_id
+        ).first()
+        return report, (report.analysis.lesion_mask if report and report.analysis else None)
+
+    report, lesion_mask = await run_in_threadpool(load_report)
+    if not report:
+        raise HTTPException(status_code=404, detail="Report not found")
+
+    try:
+        if lesion_mask is None:
+            lesion_mask = await compute_manager.run(ensure_lesion_mask, report)
+            if lesion_mask is None:
+                raise HTTPException(status_code=404, detail="Original image not available")
+            await run_in_threadpool(db.commit)
+
+        etag = heatmap_manager.etag(report_id, report.image_url, lesion_mask, size, fmt)
+        headers = {"ETag": f'"{etag}"', "Cache-Control": "public, max-age=86400"}
+        if if_none_match and etag in [t.strip().removeprefix("W/").strip('"') for t in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+
+        path, _ = await compute_manager.run(heatmap_manager.render, report_id, report.image_url, lesion_mask, size, fmt)
+    except ComputeBusyError:
+        raise HTTPException(status_code=503, detail="Scanner is busy, please retry shortly")
+
+    return FileResponse(path, media_type=HEATMAP_FORMATS[fmt][1], headers=headers)
+
 # ==========================================
 # 3. ANALYTICS (TEMPORAL & GEO)
 # ==========================================
 
-def get_country_name(code):
-    try:
-        return pycountry.countries.get(alpha_2=code).name
-    except:
-        return code 
+# --- HELPER: Place Filters (columns filled by location_service) ---
+def filter_place(query, country: Optional[str], region: Optional[str], model=DiseaseReport):
+    """Country / region filters ("All" = no filter) on the stored place columns (reports or rollup)."""
+    if country and country != "All":
+        query = query.filter(model.country == country)
+    if region and region != "All":
+        query = query.filter(model.region == region)
+    return query
 
-@router.get("/api/analytics/temporal")
+@router.get("/api/analytics/temporal", dependencies=[Depends(readiness_manager.require("rollup"))])
 def get_temporal_analytics(
     start_date: Optional[str] = None, 
     end_date: Optional[str] = None,
@@ -378,56 +809,29 @@ def get_temporal_analytics(
     try:
         if start_date and end_date:
             s_dt = datetime.strptime(start_date, "%Y-%m-%d")
-            e_dt = datetime.strptime(end_date, "%Y-%m-%d").replace(hour=23, minute=59, second=59)
+            e_dt = datetime.strptime(end_date, "%Y-%m-%d").replace(hour=23, minute=59, second=59, microsecond=999999)
         else:
             e_dt = datetime.now()
             s_dt = e_dt - timedelta(days=30)
-            
-        # Convert to String for Database Comparison
-        s_str = s_dt.strftime("%Y-%m-%d %H:%M")
-        e_str = e_dt.strftime("%Y-%m-%d %H:%M")
-        
     except ValueError:
         # Fallback
         e_dt = datetime.now()
         s_dt = e_dt - timedelta(days=30)
-        s_str = s_dt.strftime("%Y-%m-%d %H:%M")
-        e_str = e_dt.strftime("%Y-%m-%d %H:%M")
     
-    # --- 2. Query Data ---
-    query = db.query(DiseaseReport).filter(
-        DiseaseReport.timestamp >= s_str,
-        DiseaseReport.timestamp <= e_str
+    # --- 2. Query Data (per-day counts per disease from the rollup, see rollup_service) ---
+    query = db.query(
+        DiseaseDailyRollup.day, DiseaseDailyRollup.disease_name, func.sum(DiseaseDailyRollup.report_count)
+    ).filter(
+        DiseaseDailyRollup.day >= s_dt.date(),
+        DiseaseDailyRollup.day <= e_dt.date()
     )
     
     if disease and disease != "All":
-        query = query.filter(DiseaseReport.disease_name == disease)
+        query = query.filter(DiseaseDailyRollup.disease_name == disease)
 
-    all_reports = query.all()
-    filtered_reports = []
-
-    # --- 3. Dynamic Geo-Filtering ---
-    if (country and country != "All") or (region and region != "All"):
-        valid_reports = []
-        coords_to_check = []
-        for r in all_reports:
-            if r.latitude and r.longitude:
-                try:
-                    coords_to_check.append((float(r.latitude), float(r.longitude)))
-                    valid_reports.append(r)
-                except: continue
-        
-        if coords_to_check:
-            geo_results = rg.search(coords_to_check)
-            for idx, geo in enumerate(geo_results):
-                r_country = get_country_name(geo.get('cc'))
-                r_region = geo.get('admin1')
-                country_match = (country == "All") or (r_country == country)
-                region_match = (region == "All") or (r_region == region)
-                if country_match and region_match:
-                    filtered_reports.append(valid_reports[idx])
-    else:
-        filtered_reports = all_reports
+    # --- 3. Geo-Filtering (stored places, see location_service) ---
+    query = filter_place(query, country, region, model=DiseaseDailyRollup)
+    daily_counts = query.group_by(DiseaseDailyRollup.day, DiseaseDailyRollup.disease_name).all()
 
     # --- 4. Data Aggregation ---
     data_map = {}
@@ -443,24 +847,13 @@ def get_temporal_analytics(
         composition_map[key] = { "date": key }
         current += timedelta(days=1)
 
-    for r in filtered_reports:
-        try:
-            # Handle variable timestamp formats safely
-            ts_str = str(r.timestamp)
-            if "T" in ts_str: dt = datetime.strptime(ts_str.split(".")[0], "%Y-%m-%dT%H:%M:%S")
-            else: dt = datetime.strptime(ts_str[:16], "%Y-%m-%d %H:%M")
-            
-            d_key = dt.strftime("%Y-%m-%d")
-            d_name = r.disease_name
-            
-            if d_key in data_map:
-                data_map[d_key]["disease_count"] += 1
-                composition_map[d_key][d_name] = composition_map[d_key].get(d_name, 0) + 1
-                disease_totals[d_name] = disease_totals.get(d_name, 0) + 1
-                seasonality_map[dt.month] += 1
-        except Exception as e: 
-            # print(f"Skipping row: {e}")
-            continue
+    for d, d_name, count in daily_counts:
+        d_key = d.strftime("%Y-%m-%d")
+        if d_key in data_map:
+            data_map[d_key]["disease_count"] += count
+            composition_map[d_key][d_name] = composition_map[d_key].get(d_name, 0) + count
+            disease_totals[d_name] = disease_totals.get(d_name, 0) + count
+            seasonality_map[d.month] += count
 
     # Fill zeros
     all_diseases = list(disease_totals.keys())
@@ -551,21 +944,17 @@ def get_map_data(
     try:
         if start_date and end_date:
             s_dt = datetime.strptime(start_date, "%Y-%m-%d")
-            e_dt = datetime.strptime(end_date, "%Y-%m-%d").replace(hour=23, minute=59, second=59)
+            e_dt = datetime.strptime(end_date, "%Y-%m-%d").replace(hour=23, minute=59, second=59, microsecond=999999)
         else:
             e_dt = datetime.now()
             s_dt = e_dt - timedelta(days=30)
-        
-        # Convert to String for Database Comparison
-        s_str = s_dt.strftime("%Y-%m-%d %H:%M")
-        e_str = e_dt.strftime("%Y-%m-%d %H:%M")
     except ValueError:
         return []
 
     # 2. Base Query (Only fetch valid coords)
-    query = db.query(DiseaseReport).filter(
-        DiseaseReport.timestamp >= s_str,
-        DiseaseReport.timestamp <= e_str,
+    query = db.query(DiseaseReport).options(joinedload(DiseaseReport.analysis)).filter(
+        DiseaseReport.timestamp >= s_dt,
+        DiseaseReport.timestamp <= e_dt,
         DiseaseReport.latitude.isnot(None),
         DiseaseReport.longitude.isnot(None)
     )
@@ -573,46 +962,25 @@ def get_map_data(
     if disease and disease != "All":
         query = query.filter(DiseaseReport.disease_name == disease)
 
-    reports = query.all()
-    map_points = []
-
-    # 3. Geo-Filtering (Batch Processing)
-    coords_to_check = []
-    valid_reports = []
-    
-    for r in reports:
-        try:
-            coords_to_check.append((float(r.latitude), float(r.longitude)))
-            valid_reports.append(r)
-        except: continue
-
-    if coords_to_check:
-        geo_results = rg.search(coords_to_check)
-        
-        for idx, geo in enumerate(geo_results):
-            r = valid_reports[idx]
-            
-            # Resolve Location
-            r_country = get_country_name(geo.get('cc'))
-            r_region = geo.get('admin1')
-            
-            # Apply Filter
-            country_match = (country == "All") or (r_country == country)
-            region_match = (region == "All") or (r_region == region)
-            
-            if country_match and region_match:
-                map_points.append({
-                    "id": r.report_id,
-                    "lat": float(r.latitude),
-                    "lng": float(r.longitude),
-                    "disease": r.disease_name,
-                    "confidence": r.confidence,
-                    "date": str(r.timestamp).split(" ")[0],
-                    "location": f"{geo.get('name')}, {r_region}",
-                    "image_url": r.image_url 
-                })
-
-    return map_points
+    # 3. Geo-Filtering (stored places)
+    reports = filter_place(query, country, region).all()
+
+    return [
+        with_renditions({
+            "id": r.report_id,
+            "lat": float(r.latitude),
+            "lng": float(r.longitude),
+            "disease": r.disease_name,
+            "confidence": r.confidence,
+            "date": r.timestamp.strftime("%Y-%m-%d"),
+            "location": ", ".join(p for p in (r.city, r.region) if p) or "Unknown",  # Not geocoded yet
+            "image_url": r.image_url,
+            "thumbnail_url": r.thumbnail_url,
+            "preview_url": r.preview_url,
+            "severity": r.analysis.severity if r.analysis else None
+        })
+        for r in reports
+    ]
 
 @router.get("/api/analytics/filters")
 def get_dynamic_filters(db: Session = Depends(get_db)):
@@ -621,24 +989,15 @@ def get_dynamic_filters(db: Session = Depends(get_db)):
         unique_diseases = db.query(DiseaseReport.disease_name).distinct().all()
         diseases = sorted([d[0] for d in unique_diseases if d[0]])
 
-        coords_raw = db.query(DiseaseReport.latitude, DiseaseReport.longitude).filter(
-            DiseaseReport.latitude.isnot(None), 
-            DiseaseReport.longitude.isnot(None)
-        ).all()
+        places = db.query(DiseaseReport.country, DiseaseReport.region).filter(
+            DiseaseReport.country.isnot(None)
+        ).distinct().all()
 
-        unique_coords = list(set([(float(c[0]), float(c[1])) for c in coords_raw if c[0] and c[1]]))
-        locations = {} 
-        
-        if unique_coords:
-            results = rg.search(unique_coords)
-            for res in results:
-                cc = res.get('cc', 'Unknown')
-                country_name = get_country_name(cc)
-                region = res.get('admin1', 'Unknown') 
-                
-                if country_name not in locations:
-                    locations[country_name] = set()
-                locations[country_name].add(region)
+        locations = {}
+        for country, region in places:
+            regions = locations.setdefault(country, set())
+            if region:
+                regions.add(region)
 
         formatted_locations = {k: sorted(list(v)) for k, v in locations.items()}
         return {"diseases": diseases, "locations": formatted_locations}
@@ -660,70 +1019,42 @@ def export_raw_data(
     try:
         if start_date and end_date:
             s_dt = datetime.strptime(start_date, "%Y-%m-%d")
-            e_dt = datetime.strptime(end_date, "%Y-%m-%d").replace(hour=23, minute=59, second=59)
+            e_dt = datetime.strptime(end_date, "%Y-%m-%d").replace(hour=23, minute=59, second=59, microsecond=999999)
         else:
             e_dt = datetime.now()
             s_dt = e_dt - timedelta(days=30)
-        
-        # Convert to string for DB comparison
-        s_str = s_dt.strftime("%Y-%m-%d %H:%M")
-        e_str = e_dt.strftime("%Y-%m-%d %H:%M")
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format")
 
-    # 2. Base Query
+    # 2. Base Query (geo-located reports only)
     query = db.query(DiseaseReport).filter(
-        DiseaseReport.timestamp >= s_str,
-        DiseaseReport.timestamp <= e_str
+        DiseaseReport.timestamp >= s_dt,
+        DiseaseReport.timestamp <= e_dt,
+        DiseaseReport.latitude.isnot(None),
+        DiseaseReport.longitude.isnot(None)
     )
     
     if disease and disease != "All":
         query = query.filter(DiseaseReport.disease_name == disease)
 
-    all_reports = query.all()
-    export_rows = []
-
-    # 3. Geo-Enrichment & Filtering
-    valid_reports = []
-    coords_to_check = []
-    
-    for r in all_reports:
-        if r.latitude and r.longitude:
-            try:
-                coords_to_check.append((float(r.latitude), float(r.longitude)))
-                valid_reports.append(r)
-            except: continue
-    
-    if coords_to_check:
-        geo_results = rg.search(coords_to_check)
-        
-        for idx, geo in enumerate(geo_results):
-            r = valid_reports[idx]
-            
-            # Resolve Names
-            r_country_code = geo.get('cc', 'Unknown')
-            r_country = get_country_name(r_country_code)
-            r_region = geo.get('admin1', 'Unknown')
-            r_city = geo.get('name', 'Unknown')
-
-            # Apply Filter
-            country_match = (country == "All") or (r_country == country)
-            region_match = (region == "All") or (r_region == region)
-            
-            if country_match and region_match:
-                # Add to Export List
-                export_rows.append([
-                    r.report_id,
-                    r.timestamp,
-                    r.disease_name,
-                    r.confidence,
-                    r.latitude,
-                    r.longitude,
-                    r_city,
-                    r_region,
-                    r_country,
-                    r.user_id
-                ])
+    # 3. Geo-Filtering (stored places)
+    query = filter_place(query, country, region).order_by(DiseaseReport.report_id)
+    export_rows = [
+        [
+            r.report_id,
+            r.timestamp,
+            r.disease_name,
+            r.confidence,
+            r.model_version or "",
+            r.latitude,
+            r.longitude,
+            r.city or "Unknown",
+            r.region or "Unknown",
+            r.country or "Unknown",
+            r.user_id
+        ]
+        for r in query
+    ]
 
     # 4. Generate CSV Stream
     output = io.StringIO()
@@ -731,7 +1062,7 @@ def export_raw_data(
     
     # Headers
     writer.writerow([
-        "Report ID", "Timestamp", "Disease", "AI Confidence", 
+        "Report ID", "Timestamp", "Disease", "AI Confidence", "Model Version",
         "Latitude", "Longitude", "Detected City", "Detected Region", "Detected Country", 
         "User ID"
     ])
@@ -117,7 +117,7 @@ def login(request: LoginRequest, db: Session = Depends(get_db)):
         raise HTTPException(status_code=403, detail="Account not verified. Please verify OTP.")
 
     # Update Last Login
-    user.last_login = datetime.now().strftime("%Y-%m-%d %H:%M")
+    user.last_login = datetime.now()
     db.commit()
 
     log_event(db, "SUCCESS", "Auth", f"User logged in: {user.full_name}")
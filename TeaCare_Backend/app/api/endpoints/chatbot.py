@@ -1,15 +1,12 @@
 from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from pypdf import PdfReader
-import chromadb
-from chromadb.api.types import Documents, Embeddings, EmbeddingFunction
-from fastembed import TextEmbedding
-import os
 
 from app.core.database import get_db
 from app.models.sql_models import DiseaseInfo, SystemLog
 from app.services.ai_service import ai_manager
+from app.services.knowledge_service import knowledge_manager
+from app.services.readiness_service import readiness_manager
 
 router = APIRouter()
 
@@ -22,29 +19,10 @@ def log_event(db: Session, level: str, source: str, message: str):
     except Exception as e:
         print(f"Logging failed: {e}")
 
-# --- VECTOR DB SETUP ---
-class MyFastEmbedFunction(EmbeddingFunction):
-    def __init__(self):
-        self.model = TextEmbedding(model_name="BAAI/bge-small-en-v1.5")
-    
-    def __call__(self, input: Documents) -> Embeddings:
-        return list(self.model.embed(input))
-
-# Initialize ChromaDB (Singleton-ish pattern for module level)
-try:
-    chroma_client = chromadb.PersistentClient(path="./tea_vectordb")
-    knowledge_collection = chroma_client.get_or_create_collection(
-        name="tea_knowledge",
-        embedding_function=MyFastEmbedFunction()
-    )
-    print("✅ Vector Database Ready")
-except Exception as e:
-    print(f"❌ Vector DB Init Error: {e}")
-    knowledge_collection = None
-
 # --- RAG RETRIEVAL LOGIC ---
 def retrieve_context(query: str, db: Session):
     try:
+        knowledge_collection = knowledge_manager.collection
         if not knowledge_collection: return "VECTOR_DB_OFFLINE", []
 
         # A. Query Vector DB
@@ -79,12 +57,13 @@ def retrieve_context(query: str, db: Session):
 
 # --- ENDPOINTS ---
 
-@router.post("/upload_book")
+@router.post("/upload_book", dependencies=[Depends(readiness_manager.require("knowledge_base"))])
 async def upload_book(file: UploadFile = File(...), category: str = Form("General"), db: Session = Depends(get_db)):
-    if not knowledge_collection:
+    if not knowledge_manager.collection:
         raise HTTPException(status_code=503, detail="Vector Database is offline")
 
     try:
+        from pypdf import PdfReader
         pdf_reader = PdfReader(file.file)
         full_text = ""
         for page in pdf_reader.pages:
@@ -104,7 +83,7 @@ async def upload_book(file: UploadFile = File(...), category: str = Form("Genera
             documents.append(chunk)
             metadatas.append({"source": file.filename, "category": category})
 
-        knowledge_collection.add(ids=ids, documents=documents, metadatas=metadatas)
+        knowledge_manager.collection.add(ids=ids, documents=documents, metadatas=metadatas)
         
         log_event(db, "SUCCESS", "Knowledge Base", f"Ingested manual: {file.filename}")
         return {"message": f"Successfully learned {len(chunks)} chunks from '{file.filename}'."}
@@ -112,7 +91,11 @@ async def upload_book(file: UploadFile = File(...), category: str = Form("Genera
         log_event(db, "ERROR", "Knowledge Base", f"PDF Ingestion Failed: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to process PDF")
 
-@router.post("/chat_stream")
+# A failed knowledge base is not fatal: retrieve_context falls back to VECTOR_DB_OFFLINE
+@router.post("/chat_stream", dependencies=[
+    Depends(readiness_manager.require("llm")),
+    Depends(readiness_manager.require("knowledge_base", allow_failed=True))
+])
 async def chat_stream(user_query: str = Form(...), db: Session = Depends(get_db)):
     if not ai_manager.llm:
         raise HTTPException(status_code=503, detail="AI LLM Service Unavailable")
@@ -2,13 +2,12 @@ from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
 from datetime import datetime
-import shutil
-import uuid
-import os
 
 from app.core.database import get_db
 from app.models.sql_models import ForumPost, ForumComment, PostVote, PostReport, User, SystemLog
 from app.schemas.dtos import CommentRequest, VoteRequest
+from app.services.upload_service import upload_manager, UploadRejectedError
+from app.services.thumbnail_service import thumbnail_manager, with_renditions
 
 router = APIRouter()
 
@@ -42,11 +41,10 @@ def create_post(
     # 2. Handle Image
     image_path = None
     if file:
-        ext = os.path.splitext(file.filename)[1]
-        file_location = f"uploads/{uuid.uuid4()}{ext}"
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        image_path = file_location
+        try:
+            image_path = upload_manager.save(file.file, file.filename)
+        except UploadRejectedError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
 
     # 3. Save
     new_post = ForumPost(
@@ -57,13 +55,14 @@ def create_post(
         content=content,
         category=category,
         image_url=image_path, 
-        timestamp=datetime.now().strftime("%Y-%m-%d %H:%M"),
+        timestamp=datetime.now(),
         score=0,
         views=0,
         comment_count=0
     )
     db.add(new_post)
     db.commit()
+    thumbnail_manager.schedule(ForumPost, new_post.post_id, image_path)
     
     log_event(db, "SUCCESS", "Forum", f"New {category} post by {author_name}")
     return {"message": "Post created"}
@@ -113,6 +112,7 @@ def get_posts(
         
         post_dict['user_vote'] = user_vote
         post_dict['comment_count'] = real_comment_count
+        with_renditions(post_dict)
         
         if filter_by == "unanswered" and real_comment_count > 0:
             continue
@@ -199,7 +199,7 @@ def create_comment(comment: CommentRequest, db: Session = Depends(get_db)):
         user_id=comment.user_id,
         author_name=comment.author_name,
         content=comment.content,
-        timestamp=datetime.now().strftime("%Y-%m-%d %H:%M")
+        timestamp=datetime.now()
     )
     db.add(new_comment)
     
@@ -230,7 +230,7 @@ def report_post(post_id: int, user_id: int = Form(...), reason: str = Form(...),
         post_id=post_id, 
         user_id=user_id, 
         reason=reason, 
-        timestamp=datetime.now().strftime("%Y-%m-%d %H:%M")
+        timestamp=datetime.now()
     )
     db.add(new_report)
     db.commit()
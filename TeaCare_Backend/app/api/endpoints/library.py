@@ -1,11 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, Form, UploadFile, File
 from sqlalchemy.orm import Session, joinedload
-import shutil
-import os
-import uuid
 
 from app.core.database import get_db
 from app.models.sql_models import DiseaseInfo, KnowledgeBase, Treatment
+from app.services.upload_service import upload_manager, UploadRejectedError
 
 router = APIRouter()
 
@@ -48,15 +46,10 @@ def submit_pathogen(
     """
     file_path = None
     if file:
-        os.makedirs("uploads", exist_ok=True)
-        ext = os.path.splitext(file.filename)[1]
-        filename = f"library_{uuid.uuid4()}{ext}"
-        file_location = f"uploads/{filename}"
-        
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        file_path = file_location
+        try:
+            file_path = upload_manager.save(file.file, file.filename)
+        except UploadRejectedError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
 
     new_entry = KnowledgeBase(
         name=name,
@@ -1,17 +1,47 @@
 from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import text, func, case
 from datetime import datetime
 import time
 import httpx
-from collections import Counter
 import numpy as np
 from app.core.database import get_db
-from app.models.sql_models import DiseaseReport, User, SystemLog
+from app.models.sql_models import DiseaseReport, DiseaseDailyRollup, User, SystemLog
 from app.services.ai_service import ai_manager
+from app.services.location_service import location_manager
+from app.services.rollup_service import rollup_manager
+from app.services.geo_service import geo_manager
+from app.services.compute_service import compute_manager
+from app.services.cache_service import prediction_cache
+from app.services.job_service import job_manager
+from app.services.heatmap_service import heatmap_manager
+from app.services.thumbnail_service import thumbnail_manager
+from app.services.upload_service import upload_manager
+from app.services.storage_service import storage_manager
+from app.services.quality_service import quality_manager
+from app.services.readiness_service import readiness_manager
+from app.core.config import settings
+from starlette.concurrency import run_in_threadpool
 
 router = APIRouter()
 
+# --- PROBES (liveness / readiness) ---
+@router.get("/api/live")
+def liveness():
+    """The process is up and serving; says nothing about models."""
+    return {"status": "alive"}
+
+@router.get("/api/ready")
+def readiness():
+    """200 once the READINESS_REQUIRED components are ready, else 503. Always lists every component."""
+    required = [name.strip() for name in settings.READINESS_REQUIRED.split(",") if name.strip()]
+    ready = readiness_manager.is_ready(*required)
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "required": required, "components": readiness_manager.snapshot()}
+    )
+
 # --- SYSTEM HEALTH CHECK (With AI Latency) ---
 @router.get("/api/health")
 async def health_check(db: Session = Depends(get_db)):
@@ -35,9 +65,9 @@ async def health_check(db: Session = Depends(get_db)):
     if ai_manager.model is not None:
         try:
             # Create a dummy blank image (1, 224, 224, 3)
-            dummy_input = np.zeros((1, 224, 224, 3))
-            # Run prediction (verbose=0 hides logs)
-            ai_manager.model.predict(dummy_input, verbose=0) 
+            dummy_input = np.zeros((1, 224, 224, 3), dtype=np.float32)
+            # Run prediction through the batcher (compiled fast path), off the event loop
+            await run_in_threadpool(ai_manager.infer, dummy_input)
             vision_latency = round((time.time() - vision_start) * 1000)
             vision_status = "online"
         except Exception as e:
@@ -53,7 +83,7 @@ async def health_check(db: Session = Depends(get_db)):
     if ai_manager.llm is not None:
         try:
             # Ask LLM to generate exactly 1 token (very fast)
-            ai_manager.llm("ping", max_tokens=1)
+            await run_in_threadpool(ai_manager.llm, "ping", max_tokens=1)
             llm_latency = round((time.time() - llm_start) * 1000)
             llm_status = "online"
         except Exception as e:
@@ -90,36 +120,51 @@ async def health_check(db: Session = Depends(get_db)):
         "api_latency": f"{total_latency}ms",
         "services": {
             "database": { "status": db_status, "latency": f"{db_latency}ms" },
-            "vision_model": { "status": vision_status, "latency": f"{vision_latency}ms", "model_name": "ConvNeXt Tiny" },
+            "vision_model": {
+                "status": vision_status, "latency": f"{vision_latency}ms", "model_name": "ConvNeXt Tiny",
+                "ready": ai_manager.ready,
+                "version": ai_manager.version,
+                "shadow": ai_manager.shadow_monitor.stats() if ai_manager.shadow_monitor else None,
+                "batching": ai_manager.batcher.stats() if ai_manager.batcher else None,
+                "tta": ai_manager.tta_counts()
+            },
             "llm_model": { "status": llm_status, "latency": f"{llm_latency}ms", "model_name": "Qwen 0.5B" },
             "weather_api": { "status": weather_status, "latency": f"{weather_lat}ms" },
             "geo_api": { "status": geo_status, "latency": f"{geo_lat}ms" },
         },
+        "compute_pool": compute_manager.stats(),
+        "prediction_cache": prediction_cache.stats(),
+        "jobs": job_manager.stats(),
+        "heatmap_cache": heatmap_manager.stats(),
+        "thumbnails": thumbnail_manager.stats(),
+        "uploads": upload_manager.stats(),
+        "storage": storage_manager.stats(),
+        "quality_gate": quality_manager.stats(),
+        "places": location_manager.stats(),
+        "rollup": rollup_manager.stats(),
+        "geocoder": geo_manager.stats(),
+        "startup": readiness_manager.snapshot(),
         "timestamp": datetime.now().isoformat()
     }
 
-@router.get("/api/researcher/stats")
+@router.get("/api/researcher/stats", dependencies=[Depends(readiness_manager.require("rollup"))])
 def get_researcher_stats(db: Session = Depends(get_db)):
-    # 1. Dataset Size
-    total_samples = db.query(DiseaseReport).count()
+    reports = func.coalesce(func.sum(DiseaseDailyRollup.report_count), 0)
 
-    # 2. Pending Workload
-    pending_validations = db.query(DiseaseReport).filter(DiseaseReport.verification_status == "Pending").count()
+    # 1. Dataset Size & 2. Pending Workload (daily rollup, see rollup_service)
+    total_samples, pending_validations = db.query(
+        reports,
+        func.coalesce(func.sum(case((DiseaseDailyRollup.verification_status == "Pending", DiseaseDailyRollup.report_count))), 0)
+    ).one()
 
     # 3. Research Metrics
-    all_reports = db.query(DiseaseReport).all()
-    uncertainty_count = 0
-    disease_counts = Counter()
-
-    for r in all_reports:
-        disease_counts[r.disease_name] += 1
-        try:
-            conf_val = float(r.confidence.replace("%", ""))
-            if conf_val < 75.0:
-                uncertainty_count += 1
-        except: continue
+    dominant = db.query(DiseaseDailyRollup.disease_name).group_by(DiseaseDailyRollup.disease_name) \
+        .order_by(reports.desc()).first()
+    dominant_disease = dominant[0] if dominant else "None"
 
-    dominant_disease = disease_counts.most_common(1)[0][0] if disease_counts else "None"
+    # Indexed numeric confidence, so "uncertain" is a range count
+    uncertainty_count = db.query(func.count(DiseaseReport.report_id)) \
+        .filter(DiseaseReport.confidence_score < 75.0).scalar()
 
     return {
         "total_samples": total_samples,
@@ -1,6 +1,5 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from sqlalchemy import cast, TIMESTAMP
 from datetime import datetime, timedelta
 
 from app.core.database import get_db
@@ -30,7 +29,7 @@ async def get_weather_alert(
     recent_notif = db.query(Notification).filter(
         Notification.user_id == user_id,
         Notification.title.contains("Briefing"),
-        cast(Notification.timestamp, TIMESTAMP) >= cutoff 
+        Notification.timestamp >= cutoff
     ).first()
 
     if not recent_notif:
@@ -50,7 +49,7 @@ async def get_weather_alert(
             message=briefing_msg,
             type=notif_type,
             is_read=False,
-            timestamp=datetime.now().strftime("%Y-%m-%d %H:%M") # Store as string to match your model
+            timestamp=datetime.now()
         )
         db.add(new_notif)
         db.commit()
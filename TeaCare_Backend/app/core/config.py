@@ -10,7 +10,83 @@ class Settings(BaseSettings):
     MAIL_PORT: int = 587
     MAIL_SERVER: str = "smtp.gmail.com"
 
+    # --- Start-up (models load in the background, see /api/ready) ---
+    READINESS_REQUIRED: str = "database,vision"   # Components /api/ready waits for
+
+    # --- Vision Inference ---
+    INFERENCE_BACKEND: str = "keras"       # keras | tflite | onnx
+    INFERENCE_QUANTIZATION: str = "none"   # none | float16 | int8 (tflite/onnx only)
+    INFERENCE_CPU_THREADS: int = 0         # 0 = runtime default
+    INFERENCE_JIT_COMPILE: bool = False    # XLA-compile the Keras fast path
+    INFERENCE_MAX_BATCH_SIZE: int = 16     # Max images per ConvNeXt forward pass
+    INFERENCE_MAX_WAIT_MS: float = 5.0     # How long a batch waits for more requests
+
+    # --- Model Registry (versions live in MODEL_REGISTRY_DIR/<version>/) ---
+    MODEL_REGISTRY_DIR: str = "models/registry"
+    MODEL_VERSION: str = ""                # Pin the version loaded at boot ("" = the registry's ACTIVE pointer)
+    SHADOW_SAMPLE_RATE: float = 0.1        # Default share of scans also scored by a shadow candidate
+    SHADOW_MAX_PENDING: int = 8            # Queued shadow runs before new samples are dropped
+
+    # --- Test-Time Augmentation (none | flip | full) ---
+    TTA_POLICY_PREDICT: str = "full"       # Default for /predict
+    TTA_POLICY_ADVANCED: str = "none"      # Default for /predict/advanced
+    TTA_EARLY_EXIT_CONFIDENCE: float = 0   # e.g. 90 = skip extra views when the original is >= 90% sure (0 = off)
+
+    # --- Bulk Scans (/predict/batch) ---
+    BATCH_MAX_IMAGES: int = 32
+    BATCH_MAX_UPLOAD_MB: int = 200          # Uncompressed size limit for zip uploads
+
+    # --- Background Jobs (/predict/advanced/jobs) ---
+    JOB_RESULT_TTL_SECONDS: int = 3600      # How long finished results stay fetchable
+
+    # --- Prediction Cache (per worker) ---
+    PREDICTION_CACHE_SIZE: int = 1024          # Entries kept (LRU)
+    PREDICTION_CACHE_PHASH_DISTANCE: int = -1  # Max differing dHash bits for a near-duplicate (-1 = exact only, e.g. 4 to opt in)
+    PREDICTION_CACHE_MAX_PIXEL_DIFF: float = 6.0  # Near-duplicates must also match within this mean gray diff (32x32)
+
+    # --- Model Server ("local" = load models in this worker, "remote" = use model server) ---
+    MODEL_SERVER_MODE: str = "local"
+    MODEL_SERVER_SOCKET: str = "/tmp/teacare-models/models.sock"  # Its directory is created/required 0700
+    MODEL_SERVER_AUTHKEY: str = ""         # Shared secret, required for remote mode (set it in the env)
+
+    # --- Image Pipeline ---
+    IMAGE_WORKING_MAX_SIDE: int = 1024     # Long side of the quality gate / classifier decode (CV forensics use full resolution)
+
+    # --- Quality Gate (runs on a downscaled proxy before any inference) ---
+    QUALITY_PROXY_SIDE: int = 512          # Long side of the proxy image
+    QUALITY_MIN_SIDE: int = 128            # Short side of the original, in px
+    QUALITY_BLUR_THRESHOLD: float = 60.0   # Laplacian variance on the proxy (not the old full-image 35; see quality_service calibrate)
+    QUALITY_MIN_BRIGHTNESS: float = 40.0   # Mean gray level (0-255)
+    QUALITY_MAX_BRIGHTNESS: float = 235.0
+    QUALITY_MAX_CLIPPED: float = 0.6       # Fraction of pure black / white pixels
+    QUALITY_MIN_LEAF_FRACTION: float = 0.02  # Fraction of leaf-coloured pixels
+
+    # --- Uploads (streamed to disk in chunks, see upload_service) ---
+    UPLOAD_MAX_IMAGE_MB: int = 20          # Per photo (scans, forum posts, library entries)
+    UPLOAD_CHUNK_KB: int = 1024
+
+    # --- Storage (photos, renditions, PDFs; see storage_service) ---
+    STORAGE_BACKEND: str = "local"         # local | s3
+    STORAGE_ROOT: str = "uploads"          # Local store (s3: read-through mirror), served at /uploads
+    S3_BUCKET: str = ""
+    S3_ENDPOINT_URL: str = ""              # e.g. http://localhost:9000 for MinIO; credentials via AWS_* env vars
+    S3_PREFIX: str = ""
+
+    # --- CV Forensics (see python -m app.services.cv_service bench) ---
+    CV_TEXTURE_LEVELS: int = 256           # Gray levels for GLCM texture (64 drifts past TOLERANCES on homogeneity)
+    CV_TEXTURE_MAX_SIDE: int = 768         # Texture & GLI sample every n-th pixel down to this side (0 = all)
+
+    # --- Heatmaps (rendered on demand from the stored lesion mask) ---
+    HEATMAP_CACHE_DIR: str = "cache/heatmaps"
+    HEATMAP_CACHE_MAX_MB: int = 256
+    HEATMAP_DEFAULT_SIZE: int = 768        # Long side in px
+    HEATMAP_MAX_SIZE: int = 2048
+
+    # --- Compute Pool (inference & image work off the event loop) ---
+    COMPUTE_POOL_SIZE: int = 8             # Worker threads for scans
+    COMPUTE_MAX_QUEUE: int = 64            # Jobs allowed to wait before we answer 503
+
     class Config:
         env_file = ".env"
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
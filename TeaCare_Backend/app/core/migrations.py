@@ -0,0 +1,89 @@
+"""
+Schema upgrades for existing databases.
+
+Base.metadata.create_all() only creates missing tables, so columns added to
+a model later never reach a database that already has the table. Run after
+create_all() on startup; every step is idempotent.
+"""
+from sqlalchemy import DateTime, String, inspect, text
+
+# Values the app ever wrote as text: "2025-01-03 14:22" (plus seconds / ISO "T" variants)
+TIMESTAMP_TEXT_PATTERN = r"^\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?$"
+
+def add_missing_columns(engine, metadata):
+    """ALTER TABLE ... ADD COLUMN for model columns the database doesn't have yet (+ their indexes)."""
+    inspector = inspect(engine)
+    for table in metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                for index in table.indexes:
+                    if column.name in index.columns:
+                        index.create(conn, checkfirst=True)
+            print(f"🛠️ Added column {table.name}.{column.name}")
+
+def convert_string_timestamps(engine, metadata):
+    """
+    Timestamps used to be VARCHAR "YYYY-MM-DD HH:MM". Converts such columns in
+    place to native TIMESTAMP once the model says DateTime (PostgreSQL only).
+    Values that don't parse become NULL instead of failing the whole upgrade.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    inspector = inspect(engine)
+    for table in metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        db_types = {c["name"]: c["type"] for c in inspector.get_columns(table.name)}
+
+        for column in table.columns:
+            model_type = getattr(column.type, "impl", column.type)  # Unwrap TypeDecorators
+            if not isinstance(model_type, DateTime) or not isinstance(db_types.get(column.name), String):
+                continue
+            name = f'"{column.name}"'  # "timestamp" is a keyword
+            with engine.begin() as conn:
+                conn.execute(text(
+                    f"ALTER TABLE {table.name} ALTER COLUMN {name} TYPE TIMESTAMP "
+                    f"USING (CASE WHEN {name} ~ '{TIMESTAMP_TEXT_PATTERN}' THEN {name}::timestamp END)"
+                ))
+            print(f"🛠️ Converted {table.name}.{column.name} to TIMESTAMP")
+
+def create_missing_indexes(engine, metadata):
+    """Indexes declared on columns that already existed (add_missing_columns only covers new ones)."""
+    inspector = inspect(engine)
+    for table in metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {i["name"] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(engine, checkfirst=True)
+                print(f"🛠️ Created index {index.name}")
+
+def backfill_confidence_scores(engine):
+    """
+    Fills disease_reports.confidence_score from the "85.1%" confidence strings
+    of older rows (PostgreSQL only). Unparseable strings stay NULL.
+    """
+    if engine.dialect.name != "postgresql" or not inspect(engine).has_table("disease_reports"):
+        return
+    with engine.begin() as conn:
+        result = conn.execute(text(
+            "UPDATE disease_reports SET confidence_score = REPLACE(TRIM(confidence), '%', '')::double precision "
+            "WHERE confidence_score IS NULL AND TRIM(confidence) ~ '^[0-9]+([.][0-9]+)?%?$'"
+        ))
+    if result.rowcount:
+        print(f"🛠️ Backfilled confidence_score for {result.rowcount} reports")
+
+def run_migrations(engine, metadata):
+    add_missing_columns(engine, metadata)
+    convert_string_timestamps(engine, metadata)
+    create_missing_indexes(engine, metadata)
+    backfill_confidence_scores(engine)
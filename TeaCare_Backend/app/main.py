@@ -5,22 +5,51 @@ from contextlib import asynccontextmanager
 import os
 
 from app.core.database import Base, engine
+from app.core.migrations import run_migrations
 from app.core.config import settings
 from app.services.ai_service import ai_manager
+from app.services.knowledge_service import knowledge_manager
+from app.services.readiness_service import readiness_manager
+from app.services.geo_service import geo_manager
+from app.services.location_service import location_manager
+from app.services.rollup_service import rollup_manager
 from app.api.api_router import api_router  # You create this to aggregate all endpoints
 
+# --- START-UP WORK (runs in the background, see /api/ready) ---
+def init_database():
+    Base.metadata.create_all(bind=engine)
+    print("✅ Database Tables Created")
+    run_migrations(engine, Base.metadata)
+
+def load_vision():
+    # Load & warm up the compiled fast path (sets ai_manager.ready)
+    ai_manager.load_vision()
+    ai_manager.warm_up()
+
+def build_rollup():
+    if readiness_manager.wait("database") != "ready":
+        raise RuntimeError("database unavailable")
+    rollup_manager.ensure()
+
+def backfill_places():
+    # Needs the new columns and the geocoder; after the rollup so the places it sets are counted once
+    for component in ("database", "rollup", "geocoder"):
+        if readiness_manager.wait(component) != "ready":
+            raise RuntimeError(f"{component} unavailable")
+    location_manager.backfill()
+
 # --- LIFESPAN MANAGER (Replaces Startup Events) ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # 1. Initialize DB
-    try:
-        Base.metadata.create_all(bind=engine)
-        print("✅ Database Tables Created")
-    except Exception as e:
-        print(f"❌ DB Init Error: {e}")
-
-    # 2. Load AI Models
-    ai_manager.load_models()
+    # Nothing here blocks: the API answers /api/live immediately and
+    # endpoints whose component is still loading return 503
+    readiness_manager.start("database", init_database)
+    readiness_manager.start("vision", load_vision)
+    readiness_manager.start("llm", ai_manager.load_llm)
+    readiness_manager.start("knowledge_base", knowledge_manager.load)
+    readiness_manager.start("rollup", build_rollup)
+    readiness_manager.start("geocoder", geo_manager.load)
+    readiness_manager.start("place_backfill", backfill_places)
     
     yield
     # Cleanup code (if any) goes here
@@ -37,8 +66,8 @@ app.add_middleware(
 )
 
 # --- STATIC FILES ---
-os.makedirs("uploads", exist_ok=True)
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+os.makedirs(settings.STORAGE_ROOT, exist_ok=True)
+app.mount("/uploads", StaticFiles(directory=settings.STORAGE_ROOT), name="uploads")
 
 # --- ROUTER ---
 # Includes: /register, /login, /predict, /weather, /posts, etc.
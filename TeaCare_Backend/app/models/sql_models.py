@@ -1,9 +1,39 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, Date, DateTime, Text, JSON, LargeBinary
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.dialects.postgresql import ARRAY
 from datetime import datetime
 from app.core.database import Base
 
+# --- COLUMN TYPES ---
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M"  # How these columns looked when they were strings
+
+class ApiTimestamp(datetime):
+    """
+    A datetime that still serializes as "2025-01-03 14:22" (JSON, str(), CSV),
+    the format the apps display as-is from the days these were string columns.
+    """
+    def isoformat(self, sep="T", timespec="auto"):
+        return self.strftime(TIMESTAMP_FORMAT)
+
+    def __str__(self):
+        return self.strftime(TIMESTAMP_FORMAT)
+
+class Timestamp(TypeDecorator):
+    """Native TIMESTAMP column, read back as ApiTimestamp. See migrations.convert_string_timestamps."""
+    impl = DateTime
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        if isinstance(value, ApiTimestamp):
+            value = datetime.combine(value.date(), value.time())  # Plain datetime for the driver
+        return value
+
+    def process_result_value(self, value, dialect):
+        return ApiTimestamp.combine(value.date(), value.time()) if value is not None else None
+
 # --- USER MANAGEMENT ---
 class User(Base):
     __tablename__ = "users"
@@ -15,7 +45,7 @@ class User(Base):
     password_hash = Column(String)
     role = Column(String)  # Farmer, Researcher, Expert, Admin
     is_active = Column(Boolean, default=True)
-    last_login = Column(String, nullable=True)
+    last_login = Column(Timestamp, nullable=True)
     
     # OTP & Verification
     otp_code = Column(String, nullable=True)
@@ -29,13 +59,21 @@ class DiseaseReport(Base):
     report_id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer)
     disease_name = Column(String)
-    confidence = Column(String)
+    confidence = Column(String)  # Display string, e.g. "85.1%"
+    confidence_score = Column(Float, nullable=True, index=True)  # Same value as a number (85.1), for SQL predicates
+    model_version = Column(String, nullable=True, index=True)  # Registry version that classified it (NULL = before the registry)
     image_url = Column(String)
-    timestamp = Column(String)
+    thumbnail_url = Column(String, nullable=True)  # 128px rendition (thumbnail_service)
+    preview_url = Column(String, nullable=True)    # 512px rendition
+    timestamp = Column(Timestamp, default=datetime.now, index=True)
     
     # Location Data
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
+    # Resolved from the coordinates when they are saved (location_service)
+    country = Column(String, nullable=True, index=True)
+    region = Column(String, nullable=True, index=True)   # admin1 (province / state)
+    city = Column(String, nullable=True)
     
     # Feedback & Expert Review
     is_correct = Column(String, default="Unknown") 
@@ -45,6 +83,47 @@ class DiseaseReport(Base):
 
     # Relationships
     recommendations = relationship("ExpertRecommendation", back_populates="report", cascade="all, delete-orphan")
+    analysis = relationship("ReportAnalysis", back_populates="report", uselist=False, cascade="all, delete-orphan")
+
+class DiseaseDailyRollup(Base):
+    """
+    Report counts per day x disease x place x review state, kept in step with
+    disease_reports by rollup_service so dashboards never scan raw reports.
+    Missing values are stored as "" since every dimension is part of the key.
+    """
+    __tablename__ = "disease_daily_rollups"
+
+    day = Column(Date, primary_key=True)
+    disease_name = Column(String, primary_key=True)
+    country = Column(String, primary_key=True)
+    region = Column(String, primary_key=True)
+    verification_status = Column(String, primary_key=True)
+    is_correct = Column(String, primary_key=True)
+    report_count = Column(Integer, nullable=False, default=0)
+
+class ReportAnalysis(Base):
+    """
+    Side table: classifier spectrum + CV telemetry captured at scan time,
+    so PDF export, triage and analytics never recompute them.
+    """
+    __tablename__ = "report_analyses"
+
+    report_id = Column(Integer, ForeignKey("disease_reports.report_id"), primary_key=True)
+    probabilities = Column(JSON, nullable=True)  # {"Gray Blight": 81.25, ...} in %
+
+    # CV Telemetry (null for quick scans until first export)
+    severity = Column(Float, nullable=True)
+    lesion_count = Column(Integer, nullable=True)
+    avg_spot_area_px = Column(Float, nullable=True)
+    avg_circularity = Column(Float, nullable=True)
+    gli_index = Column(Float, nullable=True)
+    texture_contrast = Column(Float, nullable=True)
+    texture_homogeneity = Column(Float, nullable=True)
+    heatmap_url = Column(String, nullable=True)   # api/reports/{id}/heatmap (rendered on demand)
+    # 1-bit PNG of the lesion mask (working resolution); deferred so list/map queries don't load it
+    lesion_mask = deferred(Column(LargeBinary, nullable=True))
+
+    report = relationship("DiseaseReport", back_populates="analysis")
 
 class ExpertRecommendation(Base):
     __tablename__ = "expert_recommendations"
@@ -55,7 +134,7 @@ class ExpertRecommendation(Base):
     expert_name = Column(String)
     suggested_disease = Column(String)
     notes = Column(String) 
-    timestamp = Column(String)
+    timestamp = Column(Timestamp, default=datetime.now, index=True)
 
     report = relationship("DiseaseReport", back_populates="recommendations")
 
@@ -112,7 +191,9 @@ class ForumPost(Base):
     content = Column(String)
     category = Column(String, default="General")   
     image_url = Column(String, nullable=True)
-    timestamp = Column(String)
+    thumbnail_url = Column(String, nullable=True)  # 128px rendition (thumbnail_service)
+    preview_url = Column(String, nullable=True)    # 512px rendition
+    timestamp = Column(Timestamp, default=datetime.now, index=True)
     
     # Metrics
     score = Column(Integer, default=0) 
@@ -127,7 +208,7 @@ class ForumComment(Base):
     user_id = Column(Integer)
     author_name = Column(String)
     content = Column(String)
-    timestamp = Column(String)
+    timestamp = Column(Timestamp, default=datetime.now, index=True)
 
 class PostVote(Base):
     __tablename__ = "post_votes"
@@ -144,7 +225,7 @@ class PostReport(Base):
     post_id = Column(Integer) 
     user_id = Column(Integer) 
     reason = Column(String)  
-    timestamp = Column(String)
+    timestamp = Column(Timestamp, default=datetime.now, index=True)
 
 # --- SYSTEM & UTILITIES ---
 class SystemLog(Base):
@@ -154,7 +235,7 @@ class SystemLog(Base):
     level = Column(String)  # INFO, WARNING, ERROR, SUCCESS
     message = Column(String)
     source = Column(String) 
-    timestamp = Column(DateTime, default=datetime.now)
+    timestamp = Column(DateTime, default=datetime.now, index=True)
 
 class Notification(Base):
     __tablename__ = "notifications"
@@ -165,4 +246,4 @@ class Notification(Base):
     message = Column(String)
     type = Column(String)     # Alert, Info, Success, Announcement
     is_read = Column(Boolean, default=False)
-    timestamp = Column(String)
\ No newline at end of file
+    timestamp = Column(Timestamp, default=datetime.now, index=True)
\ No newline at end of file
@@ -111,4 +111,6 @@ class LibraryStatusUpdate(BaseModel):
 # --- NOTIFICATIONS & ADMIN ---
 class AnnouncementRequest(BaseModel):
     title: str
-    message: str
\ No newline at end of file
+    message: str
+class ShadowRequest(BaseModel):
+    sample_rate: Optional[float] = Field(None, gt=0, le=1)  # Share of scans also run on the candidate (default: SHADOW_SAMPLE_RATE)
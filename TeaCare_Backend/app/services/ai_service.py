@@ -1,17 +1,207 @@
-import tensorflow as tf
-import pickle
 import numpy as np
-import cv2
-from PIL import Image, ImageOps
-from llama_cpp import Llama
-import io
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+import random
+import queue
+import time
 import os
 
+from app.core.config import settings
+from app.services.model_registry import model_registry, ModelVersionError, ShadowMonitor
+
+def softmax(logits):
+    """NumPy softmax over the last axis (keeps TensorFlow out of API workers)."""
+    z = np.asarray(logits, dtype=np.float64)
+    z = z - z.max(axis=-1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=-1, keepdims=True)
+
+# Named TTA policies: extra views averaged with the original 224x224 image
+TTA_POLICIES = {
+    "none": [],
+    "flip": [np.fliplr],
+    "full": [np.rot90, np.fliplr],
+}
+
+def clean_class_name(raw_name: str) -> str:
+    """Drops the numbering of a raw class name ("3. Gray Blight" -> "Gray Blight")."""
+    if ". " in raw_name and raw_name.split(". ")[0].isdigit():
+        return raw_name.split(". ", 1)[1]
+    return raw_name
+
+class InferenceBatcher:
+    """
+    Collects concurrent inference requests into shared forward passes.
+    Each caller submits its own image batch (e.g. 3 TTA views) and gets
+    back only its own rows of the model output.
+    """
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=5.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._carry = None
+        self._worker = None
+        self._closing = False
+        self._lock = threading.Lock()
+
+        # Stats (read by /api/health)
+        self.batches_run = 0
+        self.images_run = 0
+        self.requests_served = 0
+
+    def submit(self, images) -> Future:
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((np.asarray(images), future))
+        return future
+
+    def run(self, images):
+        """Blocking helper: submit and wait for this caller's rows."""
+        return self.submit(images).result()
+
+    def close(self):
+        """Stops the worker once everything already queued has run."""
+        self._queue.put(None)
+
+    def stats(self):
+        avg = self.images_run / self.batches_run if self.batches_run else 0
+        return {
+            "batches_run": self.batches_run,
+            "requests_served": self.requests_served,
+            "avg_batch_size": round(avg, 2),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queued": self._queue.qsize()
+        }
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._loop, name="inference-batcher", daemon=True)
+                self._worker.start()
+
+    def _next(self, timeout=None):
+        if self._carry is not None:
+            item, self._carry = self._carry, None
+            return item
+        if timeout is None:
+            return self._queue.get()
+        if timeout <= 0:
+            return self._queue.get_nowait()
+        return self._queue.get(timeout=timeout)
+
+    def _loop(self):
+        while True:
+            first = self._next()
+            if first is None:
+                return  # close()
+            pending = [first]
+            size = len(first[0])
+
+            # Only hold the batch open when other callers are already waiting.
+            # A lone request at low load is dispatched straight away.
+            concurrent = not self._queue.empty()
+            deadline = time.monotonic() + self.max_wait
+
+            while size < self.max_batch_size:
+                try:
+                    timeout = deadline - time.monotonic() if concurrent else 0
+                    item = self._next(timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._closing = True
+                    break
+                if size + len(item[0]) > self.max_batch_size:
+                    self._carry = item
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            self._dispatch(pending)
+            if self._closing:
+                return
+
+    def _dispatch(self, pending):
+        try:
+            batch = np.concatenate([images for images, _ in pending])
+            outputs = np.asarray(self.predict_fn(batch))
+        except Exception as e:
+            for _, future in pending:
+                future.set_exception(e)
+            return
+
+        self.batches_run += 1
+        self.images_run += len(batch)
+        self.requests_served += len(pending)
+
+        offset = 0
+        for images, future in pending:
+            future.set_result(outputs[offset:offset + len(images)])
+            offset += len(images)
+
+class ModelBundle:
+    """
+    One loaded model version: backend, class list and its own micro-batcher.
+    A scan takes the active bundle once and uses it throughout, so a hot swap
+    never pairs one version's outputs with another's class names.
+    """
+    def __init__(self, version: str, model, class_names):
+        self.version = version
+        self.model = model
+        self.class_names = list(class_names)
+        self.loaded_at = time.time()
+        self.batcher = InferenceBatcher(
+            lambda batch: self.model.predict(batch, verbose=0),
+            max_batch_size=settings.INFERENCE_MAX_BATCH_SIZE,
+            max_wait_ms=settings.INFERENCE_MAX_WAIT_MS
+        )
+
+    def infer(self, batch):
+        """Raw model outputs; concurrent callers share forward passes."""
+        return self.batcher.run(batch)
+
+    def warm_up(self):
+        """Runs every compiled batch size once so the first real scan doesn't pay for graph tracing."""
+        for size in getattr(self.model, "bucket_sizes", [1, 3]):
+            self.model.predict(np.zeros((size, 224, 224, 3), dtype=np.float32), verbose=0)
+
+    def close(self):
+        self.batcher.close()
+
+    def top_class(self, scores):
+        """(raw class name, confidence %) for a probability vector."""
+        class_idx = int(np.argmax(scores))
+        return self.class_names[class_idx], float(scores[class_idx]) * 100
+
+    def rank_classes(self, scores):
+        """Full spectrum as [{"disease", "probability" (%)}], best first, names cleaned."""
+        class_probs = [
+            {"disease": clean_class_name(self.class_names[i]), "probability": float(score) * 100}
+            for i, score in enumerate(scores)
+        ]
+        class_probs.sort(key=lambda x: x["probability"], reverse=True)
+        return class_probs
+
 class AIModelService:
     _instance = None
-    model = None
-    class_names = []
+    mode = "local"
+    bundle = None          # Active ModelBundle; activate() swaps it with one assignment
+    previous = None        # The bundle it replaced, kept loaded for an instant rollback
+    shadow = None          # Candidate scored off the request path (start_shadow)
+    shadow_monitor = None
     llm = None
+    ready = False  # Flips once models are loaded and warmed up
+    _model_server = None
+    _connect_lock = threading.Lock()
+    _swap_lock = threading.Lock()
+    _shadow_pool = None
+
+    def __init__(self):
+        # TTA counters (read by /api/health); scans update them from many threads
+        self._stats_lock = threading.Lock()
+        self.tta_stats = {"early_exits": 0, "full_runs": 0}
 
     @classmethod
     def get_instance(cls):
@@ -19,43 +209,343 @@ class AIModelService:
             cls._instance = cls()
         return cls._instance
 
-    def load_models(self):
+    # Views of the active bundle (the attributes callers used before the registry)
+    @property
+    def model(self):
+        bundle = self.bundle
+        return bundle.model if bundle else None
+
+    @property
+    def class_names(self):
+        bundle = self.bundle
+        return bundle.class_names if bundle else []
+
+    @property
+    def batcher(self):
+        bundle = self.bundle
+        return bundle.batcher if bundle else None
+
+    @property
+    def version(self):
+        bundle = self.bundle
+        return bundle.version if bundle else None
+
+    def load_models(self, mode=None):
+        """
+        "local": load ConvNeXt + Qwen into this process.
+        "remote": attach to the model server (see model_server.py); same interface.
+        """
         print("Loading AI Models...")
-        try:
-            self.model = tf.keras.models.load_model('models/tea_leaf_convnext.keras')
-            with open('models/class_names.pkl', 'rb') as f:
-                self.class_names = pickle.load(f)
-            
-            # Load LLM
+        for name, loader in (("Vision", self.load_vision), ("LLM", self.load_llm)):
+            try:
+                loader(mode)
+            except Exception as e:
+                print(f"AI Load Error ({name}): {e}")
+
+    def load_vision(self, mode=None):
+        """ConvNeXt (or the model server's). Raises on failure so readiness can report it."""
+        self.mode = mode or settings.MODEL_SERVER_MODE
+        if self.mode == "remote":
+            self._sync_remote()
+        else:
+            self.bundle = self._load_bundle(model_registry.boot_version())
+        print(f"Vision Model Loaded ({self.version})")
+
+    def load_llm(self, mode=None):
+        """Qwen via llama.cpp (or the model server's). Raises on failure."""
+        if (mode or settings.MODEL_SERVER_MODE) == "remote":
+            from app.services.model_server import RemoteLLM
+            if not self._model_server_status()["llm"]:
+                raise RuntimeError("Model server has no LLM")
+            self.llm = RemoteLLM(self._model_server)
+        else:
+            from llama_cpp import Llama
             self.llm = Llama(
                 model_path="models/qwen2.5-0.5b-instruct-q4_k_m.gguf", 
                 n_ctx=2048, n_threads=4, verbose=False
             )
-            print("AI Models Loaded Successfully")
+        print("LLM Loaded")
+
+    def _model_server_status(self) -> dict:
+        # One shared connection for both loaders (they may run on different threads)
+        from app.services.model_server import ModelServerClient
+
+        with self._connect_lock:
+            if self._model_server is None:
+                print("Connecting to Model Server...")
+                self._model_server = ModelServerClient(settings.MODEL_SERVER_SOCKET, settings.MODEL_SERVER_AUTHKEY)
+                print(f"Model Server Connected ({settings.MODEL_SERVER_SOCKET})")
+            return self._model_server.call({"op": "status"})
+
+    def warm_up(self):
+        """Warms the active bundle's compiled batch sizes, then marks the service ready."""
+        if self.bundle is not None:
+            try:
+                self.bundle.warm_up()
+                print("Vision Model Warmed Up")
+            except Exception as e:
+                print(f"Warm-up Error: {e}")
+        self.ready = True
+
+    # ==========================================
+    # MODEL VERSIONS (hot swap & shadow)
+    # ==========================================
+
+    def _load_bundle(self, version: str) -> ModelBundle:
+        model, class_names = model_registry.load(version)
+        return ModelBundle(version, model, class_names)
+
+    def _loaded(self, version: str):
+        """The bundle of that version if it's already in memory (active, previous or shadow)."""
+        for bundle in (self.bundle, self.previous, self.shadow):
+            if bundle is not None and bundle.version == version:
+                return bundle
+        return None
+
+    def _release(self, bundle):
+        # Stops its batcher unless the bundle is still in use somewhere
+        if bundle is not None and bundle not in (self.bundle, self.previous, self.shadow):
+            bundle.close()
+
+    def bundle_for(self, version: str = None) -> ModelBundle:
+        """Model server side: the loaded bundle a worker asked for (default: active)."""
+        bundle = self._loaded(version) if version else self.bundle
+        if bundle is None:
+            raise ModelVersionError(f"Model version '{version}' is not loaded")
+        return bundle
+
+    def activate(self, version: str):
+        """
+        Loads and warms a version next to the active one, then swaps it in:
+        scans already running finish on the old bundle, new ones get the new
+        one. The old bundle stays loaded as `previous`, so rolling back is
+        instant. Raises ModelVersionError for unknown versions.
+        """
+        if self.mode == "remote":
+            self._model_server.call({"op": "activate", "version": version})
+            self._sync_remote()
+            return
+
+        with self._swap_lock:
+            if self.version == version:
+                return
+            candidate = self._loaded(version)
+            if candidate is None:
+                candidate = self._load_bundle(version)
+                candidate.warm_up()
+            replaced = self.previous
+            self.previous, self.bundle = self.bundle, candidate
+            if self.shadow is candidate:
+                self._set_shadow(None, 0)
+            self._release(replaced)
+            model_registry.set_active(version)
+        print(f"✅ Model {version} active (previous: {self.previous.version if self.previous else None})")
+
+    def start_shadow(self, version: str, sample_rate: float):
+        """Scores sample_rate of live scans on a candidate version too, off the request path."""
+        if self.mode == "remote":
+            self._model_server.call({"op": "shadow", "version": version, "sample_rate": sample_rate})
+            self._sync_remote()
+            return
+
+        with self._swap_lock:
+            if self.version == version:
+                raise ValueError(f"Model {version} is already active")
+            candidate = self._loaded(version)
+            if candidate is None:
+                candidate = self._load_bundle(version)
+                candidate.warm_up()
+            self._set_shadow(candidate, sample_rate)
+        print(f"👥 Shadowing model {version} on {sample_rate:.0%} of scans")
+
+    def stop_shadow(self):
+        if self.mode == "remote":
+            self._model_server.call({"op": "shadow", "version": None})
+            self._sync_remote()
+            return
+        with self._swap_lock:
+            self._set_shadow(None, 0)
+
+    def _set_shadow(self, bundle, sample_rate: float):
+        replaced = self.shadow
+        if bundle is not None and self._shadow_pool is None:
+            # One thread: shadow runs queue up behind each other instead of competing with live scans
+            self._shadow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        if bundle is None:
+            self.shadow = self.shadow_monitor = None
+        elif self.shadow_monitor is None or self.shadow_monitor.version != bundle.version:
+            self.shadow_monitor = ShadowMonitor(bundle.version, sample_rate, settings.SHADOW_MAX_PENDING)
+            self.shadow = bundle
+        else:
+            self.shadow_monitor.sample_rate = sample_rate  # Same candidate: keep its numbers
+            self.shadow = bundle
+        self._release(replaced)
+
+    def _sync_remote(self):
+        """Remote mode: mirrors the model server's active and shadow versions."""
+        from app.services.model_server import RemoteModel
+
+        status = self._model_server_status()
+        if not status["vision"]:
+            raise RuntimeError("Model server has no vision model")
+        with self._swap_lock:
+            if self.version != status["version"]:
+                replaced = self.bundle
+                self.bundle = ModelBundle(status["version"], RemoteModel(self._model_server, status["version"]), status["class_names"])
+                self._release(replaced)
+            shadow = status["shadow"]
+            if shadow is None:
+                self._set_shadow(None, 0)
+            else:
+                bundle = self.shadow
+                if bundle is None or bundle.version != shadow["version"]:
+                    bundle = ModelBundle(shadow["version"], RemoteModel(self._model_server, shadow["version"]), shadow["class_names"])
+                self._set_shadow(bundle, shadow["sample_rate"])
+        return status
+
+    def _follow_server(self, bundle):
+        # Another worker may have swapped versions on the model server; every reply says which are live
+        seen = getattr(bundle.model, "server_versions", None)
+        if seen is None or tuple(seen) == self.served_versions():
+            return
+        try:
+            self._sync_remote()
         except Exception as e:
-            print(f"AI Load Error: {e}")
-
-    def is_blurry(self, image_bytes, threshold=35.0):
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_GRAYSCALE)
-        score = cv2.Laplacian(img, cv2.CV_64F).var()
-        return score < threshold
-
-    def predict_image(self, image_bytes):
-        if not self.model: raise Exception("Model not loaded")
-        
-        image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-        image = image.resize((224, 224))
-        img_orig = np.asarray(image)
-        img_rot = np.asarray(image.rotate(90))
-        img_flip = np.asarray(ImageOps.mirror(image))
-        batch = np.array([img_orig, img_rot, img_flip])
-
-        predictions = self.model.predict(batch)
-        avg_score = np.mean(predictions, axis=0)
-        final_score = tf.nn.softmax(avg_score)
-        class_idx = np.argmax(final_score)
-        
-        return self.class_names[class_idx], float(np.max(final_score)) * 100
-
-ai_manager = AIModelService.get_instance()
\ No newline at end of file
+            print(f"Model Server Sync Error: {e}")
+
+    def served_versions(self):
+        """(active version, shadow version or None); the model server sends it with every reply."""
+        shadow = self.shadow
+        return (self.version, shadow.version if shadow else None)
+
+    def model_status(self) -> dict:
+        """Versions on disk, active/previous, and the shadow comparison so far (admin API)."""
+        if self.mode == "remote":
+            status = self._sync_remote()
+            previous, available = status["previous"], status["available"]
+        else:
+            previous = self.previous.version if self.previous else None
+            available = model_registry.versions()
+        monitor = self.shadow_monitor
+        return {
+            "mode": self.mode,
+            "active": self.version,
+            "previous": previous,
+            "available": available,
+            "shadow": monitor.stats() if monitor else None
+        }
+
+    # ==========================================
+    # INFERENCE
+    # ==========================================
+
+    def infer(self, batch):
+        """
+        Returns raw outputs of the active model for a (N, 224, 224, 3) batch.
+        Concurrent callers are coalesced into one forward pass by the batcher.
+        """
+        bundle = self.bundle
+        if not bundle: raise Exception("Model not loaded")
+        return bundle.infer(batch)
+
+    def predict_scores(self, image, policy="full", early_exit=None):
+        """
+        Class probabilities for a DecodedImage: softmax of the logits averaged
+        over the views of a TTA policy (see TTA_POLICIES).
+        early_exit (confidence %): run the original view alone first and only
+        run the augmented views when it is less confident than that.
+        """
+        return self.predict_scores_batch([image], policy, early_exit)[0]
+
+    def tta_counts(self) -> dict:
+        with self._stats_lock:
+            return dict(self.tta_stats)
+
+    def predict_scores_batch(self, images, policy="full", early_exit=None, bundle=None):
+        """
+        predict_scores for many images; every view of every image is inferred together.
+        bundle: the version to score with (default: active). Callers that also
+        need its class names or version take ai_manager.bundle once and pass it.
+        """
+        bundle = bundle or self.bundle
+        if not bundle: raise Exception("Model not loaded")
+        if policy not in TTA_POLICIES: raise ValueError(f"Unknown TTA policy '{policy}'")
+
+        originals = np.array([image.rgb_224 for image in images])
+        started = time.perf_counter()
+        try:
+            scores, early_exits = self._score(bundle, originals, TTA_POLICIES[policy], early_exit)
+        except ModelVersionError:
+            # Remote: the server retired this worker's version (two swaps while it was idle)
+            if self.mode == "remote":
+                self._sync_remote()
+            raise
+        active_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            self.tta_stats["early_exits"] += early_exits
+            self.tta_stats["full_runs"] += len(images) - early_exits
+
+        self._maybe_shadow(bundle, originals, policy, early_exit, scores, active_ms)
+        self._follow_server(bundle)
+        return scores
+
+    @staticmethod
+    def _score(bundle, originals, augments, early_exit):
+        """TTA-averaged probabilities from one bundle. Returns (scores, images that exited early)."""
+        if early_exit and augments:
+            first = bundle.infer(originals)
+            scores = softmax(first)
+            unsure = [i for i in range(len(originals)) if scores[i].max() * 100 < early_exit]
+            if unsure:
+                views = np.array([augment(originals[i]) for i in unsure for augment in augments])
+                extra = bundle.infer(views).reshape(len(unsure), len(augments), -1)
+                for row, i in zip(extra, unsure):
+                    scores[i] = softmax(np.mean(np.concatenate([first[i:i + 1], row]), axis=0))
+            return scores, len(originals) - len(unsure)
+
+        # View-major layout: [all originals, all flips, ...]
+        views = [originals] + [np.array([augment(img) for img in originals]) for augment in augments]
+        predictions = bundle.infer(np.concatenate(views)).reshape(len(views), len(originals), -1)
+        return softmax(np.mean(predictions, axis=0)), 0
+
+    def _maybe_shadow(self, bundle, originals, policy, early_exit, scores, active_ms):
+        """Hands a sample of scans to the shadow thread; never blocks the caller."""
+        shadow, monitor = self.shadow, self.shadow_monitor
+        if shadow is None or monitor is None or shadow is bundle or monitor.version != shadow.version:
+            return
+        if random.random() >= monitor.sample_rate or not monitor.try_reserve():
+            return
+        self._shadow_pool.submit(self._run_shadow, bundle, shadow, monitor, originals, policy, early_exit, scores, active_ms)
+
+    def _run_shadow(self, active, shadow, monitor, originals, policy, early_exit, active_scores, active_ms):
+        # Same views, same policy as the live request, so latency and answers are comparable
+        try:
+            started = time.perf_counter()
+            scores, _ = self._score(shadow, originals, TTA_POLICIES[policy], early_exit)
+            shadow_ms = (time.perf_counter() - started) * 1000
+
+            agreed, delta = 0, 0.0
+            for live, candidate in zip(active_scores, scores):
+                live_name, live_confidence = active.top_class(live)
+                shadow_name, shadow_confidence = shadow.top_class(candidate)
+                agreed += clean_class_name(live_name) == clean_class_name(shadow_name)
+                delta += shadow_confidence - live_confidence
+            monitor.record(len(originals), agreed, active_ms, shadow_ms, delta)
+        except Exception as e:
+            print(f"Shadow Inference Error ({shadow.version}): {e}")
+            monitor.record_error()
+
+    def top_class(self, scores):
+        """(raw class name, confidence %) from the active model's class list."""
+        return self.bundle.top_class(scores)
+
+    def rank_classes(self, scores):
+        """Full spectrum from the active model's class list, best first, names cleaned."""
+        return self.bundle.rank_classes(scores)
+
+    def predict_image(self, image):
+        """TTA classification of a DecodedImage."""
+        bundle = self.bundle
+        return bundle.top_class(self.predict_scores_batch([image], bundle=bundle)[0])
+
+ai_manager = AIModelService.get_instance()
@@ -0,0 +1,78 @@
+from collections import OrderedDict
+import numpy as np
+import threading
+import cv2
+
+from app.core.config import settings
+
+class PredictionCache:
+    """
+    LRU cache of classifier outputs keyed by upload content.
+    Exact re-uploads hit on the SHA-256 of the file. Optionally
+    (max_distance >= 0), re-encoded copies (messaging-app recompression,
+    resized screenshots) hit on a 64-bit perceptual difference hash within
+    max_distance bits; a candidate only counts if its 32x32 gray thumbnail is
+    also within max_pixel_diff mean gray levels, since different leaves on
+    similar backgrounds can share a dHash.
+    """
+    def __init__(self, max_entries: int, max_distance: int, max_pixel_diff: float):
+        self.max_entries = max(1, max_entries)
+        self.max_distance = max_distance
+        self.max_pixel_diff = max_pixel_diff
+        self._entries = OrderedDict()  # (namespace, sha256) -> entry dict
+        self._lock = threading.Lock()
+
+        # Counters (read by /api/health)
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.near_rejected = 0  # dHash matched, pixels did not
+        self.misses = 0
+
+    def get(self, namespace: str, digest: str, phash: int, thumb: np.ndarray):
+        """Returns (entry, "exact" | "near") or (None, None)."""
+        with self._lock:
+            key = (namespace, digest)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return self._entries[key], "exact"
+
+            if self.max_distance >= 0:
+                for (ns, d), entry in reversed(self._entries.items()):
+                    if ns != namespace or bin(entry["phash"] ^ phash).count("1") > self.max_distance:
+                        continue
+                    if cv2.absdiff(entry["thumb"], thumb).mean() > self.max_pixel_diff:
+                        self.near_rejected += 1
+                        continue
+                    self._entries.move_to_end((ns, d))
+                    self.near_hits += 1
+                    return entry, "near"
+
+            self.misses += 1
+            return None, None
+
+    def put(self, namespace: str, digest: str, phash: int, thumb: np.ndarray, scores, image_url: str):
+        with self._lock:
+            self._entries[(namespace, digest)] = {"phash": phash, "thumb": thumb, "scores": scores, "image_url": image_url}
+            self._entries.move_to_end((namespace, digest))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.exact_hits + self.near_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "exact_hits": self.exact_hits,
+                "near_hits": self.near_hits,
+                "near_rejected": self.near_rejected,
+                "misses": self.misses,
+                "hit_rate": round((self.exact_hits + self.near_hits) / lookups, 3) if lookups else 0
+            }
+
+prediction_cache = PredictionCache(
+    settings.PREDICTION_CACHE_SIZE,
+    settings.PREDICTION_CACHE_PHASH_DISTANCE,
+    settings.PREDICTION_CACHE_MAX_PIXEL_DIFF
+)
@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import asyncio
+import threading
+import time
+
+from app.core.config import settings
+
+class ComputeBusyError(Exception):
+    """Raised when the compute queue is full; endpoints map this to 503."""
+    pass
+
+class ComputeService:
+    """
+    Dedicated, bounded thread pool for CPU-heavy work (model inference,
+    OpenCV forensics, image writes). Endpoints await jobs here so the
+    asyncio event loop keeps serving health checks and chat streams.
+    """
+    def __init__(self, pool_size: int, max_queue: int):
+        self.pool_size = max(1, pool_size)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="compute")
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._waits = deque(maxlen=500)  # Recent queue wait times (seconds)
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Runs fn(*args, **kwargs) on the compute pool and awaits the result.
+        Raises ComputeBusyError instead of queueing beyond max_queue.
+        """
+        with self._lock:
+            if self._queued + self._running >= self.pool_size + self.max_queue:
+                self._rejected += 1
+                raise ComputeBusyError("Compute queue is full")
+            self._queued += 1
+
+        submitted = time.monotonic()
+
+        def job():
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._waits.append(time.monotonic() - submitted)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+
+        return await asyncio.wrap_future(self._executor.submit(job))
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            queued, running = self._queued, self._running
+            completed, rejected = self._completed, self._rejected
+
+        avg_wait = (sum(waits) / len(waits)) if waits else 0
+        p95_wait = waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0
+        return {
+            "pool_size": self.pool_size,
+            "max_queue": self.max_queue,
+            "queue_depth": queued,
+            "running": running,
+            "completed": completed,
+            "rejected": rejected,
+            "avg_wait_ms": round(avg_wait * 1000, 1),
+            "p95_wait_ms": round(p95_wait * 1000, 1)
+        }
+
+compute_manager = ComputeService(settings.COMPUTE_POOL_SIZE, settings.COMPUTE_MAX_QUEUE)
@@ -0,0 +1,312 @@
+"""
+Leaf forensics for advanced scans: vegetation index, texture, lesion
+morphology (incl. per-lesion areas / circularities) and the lesion mask the
+heatmap overlay is rendered from.
+
+Works on a full-resolution DecodedImage (image_pipeline.decode(...,
+full_resolution=True)): lesion counts, areas and texture depend on the pixel
+scale, so they are measured on the upload's own pixels like earlier rows.
+
+Compare the fast texture/GLI engine against the reference GLCM
+implementation (skimage, 256 levels, float64) on full-resolution reads of a
+folder of leaves:
+    python -m app.services.cv_service bench uploads/
+The same TOLERANCES are asserted by tests/test_cv_service.py.
+"""
+import numpy as np
+import argparse
+import time
+import cv2
+import os
+
+from app.core.config import settings
+
+# HSV range treated as healthy leaf tissue
+LEAF_GREEN_LOWER = np.array([35, 40, 40])
+LEAF_GREEN_UPPER = np.array([85, 255, 255])
+# Same range widened to yellowing (chlorotic) tissue: "is there a leaf at all" (quality gate)
+LEAF_TISSUE_LOWER = np.array([18, 40, 40])
+
+# ==========================================
+# 1. TEXTURE & VEGETATION INDEX ENGINE
+# ==========================================
+
+def working_view(img: np.ndarray, max_side: int) -> np.ndarray:
+    """Downscales (INTER_AREA) so the long side is at most max_side; 0 = as is."""
+    h, w = img.shape[:2]
+    if not max_side or max(h, w) <= max_side:
+        return img
+    scale = max_side / max(h, w)
+    return cv2.resize(img, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+
+def sampled_view(img: np.ndarray, max_side: int, rows_only: bool = False) -> np.ndarray:
+    """
+    Every s-th pixel (or row) so the long side is at most max_side; 0 = as is.
+    Unlike a resize this keeps the pixel scale, so neighbour differences
+    (texture) and per-pixel ratios (GLI) stay estimates of the same values.
+    """
+    h, w = img.shape[:2]
+    step = -(-max(h, w) // max_side) if max_side else 1
+    if step <= 1:
+        return img
+    view = img[::step] if rows_only else img[::step, ::step]
+    return np.ascontiguousarray(view)
+
+def green_leaf_index(rgb: np.ndarray) -> float:
+    """Mean GLI = (2G - R - B) / (2G + R + B), in float32 with OpenCV arithmetic."""
+    R, G, B = cv2.split(rgb)
+    green = cv2.add(G, G, dtype=cv2.CV_32F)
+    red_blue = cv2.add(R, B, dtype=cv2.CV_32F)
+    gli = cv2.divide(cv2.subtract(green, red_blue), cv2.add(green, red_blue) + np.float32(0.00001))
+    return cv2.mean(gli)[0]
+
+def texture_metrics(gray: np.ndarray, levels: int = 256) -> tuple:
+    """
+    GLCM contrast & homogeneity (distance 1, angle 0, symmetric, normed)
+    without building the matrix: both only depend on |i - j|, so a
+    histogram of horizontal neighbour differences is enough.
+    With levels < 256 the gray image is quantized first and differences are
+    rescaled to the 256-level scale, so values stay comparable.
+    """
+    shift = 8 - int(np.log2(levels))
+    if shift > 0:
+        gray = gray >> shift
+
+    diffs = cv2.absdiff(gray[:, :-1], gray[:, 1:])
+    hist = cv2.calcHist([diffs], [0], None, [levels], [0, levels]).ravel().astype(np.float64)
+    total = hist.sum()
+    if total == 0:
+        return 0.0, 1.0
+
+    k = np.arange(levels, dtype=np.float64) * (256 / levels)
+    contrast = float((hist * k * k).sum() / total)
+    homogeneity = float((hist / (1.0 + k * k)).sum() / total)
+    return contrast, homogeneity
+
+def lesion_morphology(disease_mask: np.ndarray, min_area: float = 10) -> dict:
+    """
+    Lesion count, mean area / circularity and per-lesion arrays in one pass.
+    Same definitions as the original contourArea / arcLength loop (outer
+    contours, polygon area, closed arc length), computed for all contours at
+    once over their concatenated points.
+    """
+    contours, _ = cv2.findContours(disease_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    result = {
+        "lesion_count": len(contours),
+        "avg_spot_area_px": 0,
+        "avg_circularity": 0,
+        "lesion_areas_px": [],
+        "lesion_circularities": []
+    }
+    if not contours:
+        return result
+
+    counts = np.fromiter(map(len, contours), dtype=np.intp, count=len(contours))
+    starts = np.cumsum(counts) - counts
+    points = np.concatenate(contours).reshape(-1, 2).astype(np.float64)
+
+    # Index of each point's successor, wrapping around within its own contour
+    successor = np.arange(1, len(points) + 1)
+    successor[starts + counts - 1] = starts
+    x, y = points[:, 0], points[:, 1]
+    x_next, y_next = x[successor], y[successor]
+
+    areas = np.abs(np.add.reduceat(x * y_next - x_next * y, starts)) / 2   # Shoelace
+    perimeters = np.add.reduceat(np.hypot(x_next - x, y_next - y), starts)
+
+    valid = (areas > min_area) & (perimeters > 0)  # Ignore tiny noise
+    if not valid.any():
+        return result
+
+    areas, perimeters = areas[valid], perimeters[valid]
+    # Circularity = 4 * pi * Area / (Perimeter^2)
+    # 1.0 = Perfect Circle, < 0.5 = Irregular/Splotchy
+    circularity = (4 * np.pi * areas) / (perimeters * perimeters)
+
+    order = np.argsort(areas)[::-1]
+    result.update({
+        "avg_spot_area_px": float(areas.mean()),
+        "avg_circularity": float(circularity.mean()),
+        "lesion_areas_px": np.round(areas[order], 1).tolist(),
+        "lesion_circularities": np.round(circularity[order], 3).tolist()
+    })
+    return result
+
+def disease_mask(image) -> tuple:
+    """(lesion mask, leaf mask) for a DecodedImage: not-green pixels on the leaf."""
+    green_mask = cv2.inRange(image.hsv, LEAF_GREEN_LOWER, LEAF_GREEN_UPPER)
+    _, thresh = cv2.threshold(image.gray, 200, 255, cv2.THRESH_BINARY_INV)
+    return cv2.bitwise_and(thresh, cv2.bitwise_not(green_mask)), thresh
+
+def encode_mask(mask: np.ndarray) -> bytes:
+    """1-bit PNG; a few KB even at working resolution."""
+    ok, png = cv2.imencode(".png", mask, [cv2.IMWRITE_PNG_BILEVEL, 1])
+    if not ok:
+        raise ValueError("Could not encode lesion mask")
+    return png.tobytes()
+
+def decode_mask(png: bytes) -> np.ndarray:
+    return cv2.imdecode(np.frombuffer(png, np.uint8), cv2.IMREAD_GRAYSCALE)
+
+def render_heatmap(bgr: np.ndarray, mask: np.ndarray, max_side: int = 0) -> np.ndarray:
+    """Red lesion overlay (same blend as the old heatmap files), at most max_side on the long side."""
+    img = working_view(bgr, max_side)
+    h, w = img.shape[:2]
+    if mask.shape[:2] != (h, w):
+        mask = cv2.resize(mask, (w, h), interpolation=cv2.INTER_NEAREST)
+
+    heatmap = img.copy()
+    heatmap[mask > 0] = [0, 0, 255] # Red BGR
+    return cv2.addWeighted(img, 0.7, heatmap, 0.3, 0)
+
+def reference_metrics(rgb: np.ndarray, gray: np.ndarray) -> tuple:
+    """Original implementation (skimage GLCM, 256 levels, float64 GLI); benchmark only."""
+    from skimage.feature import graycomatrix, graycoprops
+
+    R, G, B = cv2.split(rgb)
+    denom = (2.0 * G + R + B) + 0.00001
+    gli = float(np.mean((2.0 * G - R - B) / denom))
+
+    glcm = graycomatrix(gray, distances=[1], angles=[0], levels=256, symmetric=True, normed=True)
+    return gli, float(graycoprops(glcm, 'contrast')[0, 0]), float(graycoprops(glcm, 'homogeneity')[0, 0])
+
+# ==========================================
+# 2. FORENSICS PIPELINE
+# ==========================================
+
+class CVService:
+    def __init__(self, texture_levels: int, texture_max_side: int):
+        self.texture_levels = texture_levels
+        self.texture_max_side = texture_max_side
+
+    def analyze_lesions(self, image, progress=None):
+        """
+        Runs forensics on a full-resolution DecodedImage (see image_service).
+        The lesion mask comes back PNG-encoded under "lesion_mask" so the
+        heatmap can be rendered on demand later (see heatmap_service).
+        progress: optional progress(stage, percent) callback (job mode).
+        """
+        progress = progress or (lambda stage, percent: None)
+        try:
+            # 1. Shared views of the full-resolution decode
+            gray = image.gray
+
+            # 2. VEGETATION INDEX (Green Leaf Index - GLI)
+            progress("vegetation_index", 40)
+            avg_gli = green_leaf_index(sampled_view(image.rgb, self.texture_max_side))
+
+            # 3. TEXTURE ANALYSIS (Contrast & Homogeneity)
+            # Contrast = measure of local intensity variation
+            progress("texture", 50)
+            texture_contrast, texture_homogeneity = texture_metrics(
+                sampled_view(gray, self.texture_max_side, rows_only=True), self.texture_levels  # Whole rows: horizontal GLCM pairs
+            )
+
+            # 4. MORPHOLOGY (Lesion Shapes)
+            progress("contours", 65)
+            lesion_mask, thresh = disease_mask(image)
+            lesions = lesion_morphology(lesion_mask)
+            leaf_px = cv2.countNonZero(thresh)
+
+            # 5. Keep the mask, not a rendered heatmap
+            progress("lesion_mask", 80)
+
+            return {
+                "gli_index": round(avg_gli, 3),          # Green Leaf Index (-1 to 1)
+                "texture_contrast": round(texture_contrast, 1), # High = Rough
+                "texture_homogeneity": round(texture_homogeneity, 2), # High = Smooth
+                "lesion_count": lesions["lesion_count"],
+                "avg_spot_area_px": round(lesions["avg_spot_area_px"], 0),
+                "avg_circularity": round(lesions["avg_circularity"], 2), # 1.0 = Circle
+                "lesion_areas_px": lesions["lesion_areas_px"],           # Per lesion, largest first
+                "lesion_circularities": lesions["lesion_circularities"], # Same order as areas
+                "lesion_mask": encode_mask(lesion_mask),
+                "severity": round((cv2.countNonZero(lesion_mask) / leaf_px) * 100, 2) if leaf_px > 0 else 0
+            }
+
+        except Exception as e:
+            print(f"CV Error: {e}")
+            return {}
+
+cv_manager = CVService(settings.CV_TEXTURE_LEVELS, settings.CV_TEXTURE_MAX_SIDE)
+
+# ==========================================
+# 3. BENCHMARK & TOLERANCE CHECK
+# ==========================================
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+# Worst-case drift from reference_metrics still treated as the same measurement
+# (stored values keep 3 / 1 / 2 decimals); also asserted in tests/test_cv_service.py
+TOLERANCES = {"gli_abs": 0.005, "contrast_rel": 0.05, "homogeneity_abs": 0.01}
+
+def leaf_images(folder: str) -> list:
+    """Sample photos under a folder (rendered heatmaps and library images skipped)."""
+    return sorted(
+        os.path.join(root, f)
+        for root, _, files in os.walk(folder)
+        for f in files if f.lower().endswith(IMAGE_EXTENSIONS) and not f.startswith(("heatmap_", "library_"))
+    )
+
+def benchmark(image_paths, levels: int = 256, max_side: int = 0) -> dict:
+    """
+    Times the fast engine, on the service's full-resolution decode, against
+    reference_metrics on a plain cv2.imread of the same file (the values
+    stored before the fast engine) and reports the worst drift.
+    """
+    from app.services.image_service import image_pipeline
+
+    ref_time = fast_time = 0.0
+    gli_err, contrast_err, homogeneity_err = [], [], []
+    for path in image_paths:
+        bgr = cv2.imread(path)
+        start = time.perf_counter()
+        ref_gli, ref_contrast, ref_homogeneity = reference_metrics(
+            cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB), cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+        )
+        ref_time += time.perf_counter() - start
+
+        image = image_pipeline.load(path, full_resolution=True)
+        rgb, gray = image.rgb, image.gray
+        start = time.perf_counter()
+        gli = green_leaf_index(sampled_view(rgb, max_side))
+        contrast, homogeneity = texture_metrics(sampled_view(gray, max_side, rows_only=True), levels)
+        fast_time += time.perf_counter() - start
+
+        gli_err.append(abs(gli - ref_gli))
+        contrast_err.append(abs(contrast - ref_contrast) / max(ref_contrast, 1e-6))
+        homogeneity_err.append(abs(homogeneity - ref_homogeneity))
+
+    n = len(image_paths)
+    return {
+        "images": n,
+        "reference_ms": round(ref_time * 1000 / n, 2),
+        "fast_ms": round(fast_time * 1000 / n, 2),
+        "max_gli_abs_error": round(max(gli_err), 5),
+        "max_contrast_rel_error": round(max(contrast_err), 5),
+        "max_homogeneity_abs_error": round(max(homogeneity_err), 5)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TeaCare CV forensics tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    bench = sub.add_parser("bench", help="Benchmark texture/GLI against the reference GLCM")
+    bench.add_argument("images", help="Folder of leaf images")
+    bench.add_argument("--levels", type=int, default=settings.CV_TEXTURE_LEVELS, choices=(32, 64, 128, 256))
+    bench.add_argument("--max-side", type=int, default=settings.CV_TEXTURE_MAX_SIDE, help="0 = every pixel")
+    bench.add_argument("--gli-tol", type=float, default=TOLERANCES["gli_abs"])
+    bench.add_argument("--contrast-tol", type=float, default=TOLERANCES["contrast_rel"], help="Relative")
+    bench.add_argument("--homogeneity-tol", type=float, default=TOLERANCES["homogeneity_abs"])
+
+    args = parser.parse_args()
+    paths = leaf_images(args.images)
+    if not paths:
+        raise SystemExit(f"No images found under {args.images}")
+
+    report = benchmark(paths, args.levels, args.max_side)
+    passed = (report["max_gli_abs_error"] <= args.gli_tol
+              and report["max_contrast_rel_error"] <= args.contrast_tol
+              and report["max_homogeneity_abs_error"] <= args.homogeneity_tol)
+    print(f"levels={args.levels} max_side={args.max_side or 'full'}: {report}")
+    print("✅ WITHIN TOLERANCE" if passed else "❌ OUT OF TOLERANCE")
+    raise SystemExit(0 if passed else 1)
@@ -0,0 +1,106 @@
+"""
+In-process offline reverse geocoder.
+
+The GeoNames places shipped with reverse_geocoder (towns of 1000+ people)
+are loaded once into a SciPy KD-tree over unit-sphere coordinates, so a
+bulk lookup is a single vectorized tree query: no worker processes and no
+dataset reload per call, and nearest means nearest on the globe rather
+than in raw lat/lng degrees. Country names (pycountry) are memoized per
+code. main.py calls geo_manager.load() in the background on start-up; analytics
+(via location_service), exports and weather all share geo_manager.
+"""
+from functools import lru_cache
+import threading
+import csv
+import os
+
+import numpy as np
+
+def dataset_path() -> str:
+    """The GeoNames CSV bundled with the reverse_geocoder package."""
+    import reverse_geocoder as rg
+    return os.path.join(os.path.dirname(rg.__file__), rg.RG_FILE)
+
+def to_unit_xyz(coords: np.ndarray) -> np.ndarray:
+    """(N, 2) lat/lng degrees -> (N, 3) points on the unit sphere."""
+    lat, lng = np.radians(coords[:, 0]), np.radians(coords[:, 1])
+    return np.column_stack([np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)])
+
+@lru_cache(maxsize=None)
+def country_name(code: str) -> str:
+    import pycountry
+    try:
+        return pycountry.countries.get(alpha_2=code).name
+    except Exception:
+        return code
+
+class GeoService:
+    """Nearest GeoNames place for any number of coordinates, loaded once per process."""
+    def __init__(self, path: str = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._tree = None
+        self.queries = 0
+        self.points = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._tree is not None
+
+    def load(self):
+        with self._lock:
+            if self._tree is not None:
+                return
+            from scipy.spatial import cKDTree
+
+            lats, lngs, names, regions, codes = [], [], [], [], []
+            with open(self.path or dataset_path(), newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    lats.append(float(row["lat"]))
+                    lngs.append(float(row["lon"]))
+                    names.append(row["name"])
+                    regions.append(row["admin1"])
+                    codes.append(row["cc"])
+
+            self._names = np.array(names, dtype=object)
+            self._regions = np.array(regions, dtype=object)
+            self._codes = np.array(codes, dtype=object)
+            # Every country name resolved now, so no request ever waits on pycountry
+            for code in set(codes):
+                country_name(code)
+            self._tree = cKDTree(to_unit_xyz(np.column_stack([lats, lngs])))
+        print(f"✅ Geocoder loaded ({len(names)} places)")
+
+    def nearest(self, coords) -> np.ndarray:
+        """Dataset row of the nearest place for each (lat, lng)."""
+        if self._tree is None:
+            self.load()
+        points = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        self.queries += 1
+        self.points += len(points)
+        if not len(points):
+            return np.empty(0, dtype=np.intp)
+        _, rows = self._tree.query(to_unit_xyz(points), k=1)
+        return rows
+
+    def places(self, coords) -> list:
+        """[(lat, lng)] -> [{"country", "region", "city"}] in the same order."""
+        rows = self.nearest(coords)
+        return [
+            {"country": country_name(code) if code else None, "region": region or None, "city": name or None}
+            for code, region, name in zip(self._codes[rows], self._regions[rows], self._names[rows])
+        ]
+
+    def place_name(self, lat: float, lng: float) -> str:
+        """Nearest town/city for one point (weather cards)."""
+        return self.places([(lat, lng)])[0]["city"]
+
+    def stats(self):
+        return {
+            "loaded": self.ready,
+            "places": len(self._names) if self.ready else 0,
+            "queries": self.queries,
+            "points": self.points
+        }
+
+geo_manager = GeoService()
@@ -0,0 +1,100 @@
+import hashlib
+import threading
+import cv2
+import os
+
+from app.core.config import settings
+from app.services.cv_service import decode_mask, render_heatmap
+from app.services.image_service import image_pipeline
+from app.services.storage_service import storage_manager
+
+HEATMAP_FORMATS = {
+    "webp": (".webp", "image/webp", [cv2.IMWRITE_WEBP_QUALITY, 80]),
+    "jpeg": (".jpg", "image/jpeg", [cv2.IMWRITE_JPEG_QUALITY, 85]),
+}
+
+class HeatmapService:
+    """
+    Renders lesion heatmaps on demand from the stored lesion mask and keeps
+    the encoded files in a size-bounded disk cache (least recently used
+    files are evicted first). Cache keys double as ETags.
+    """
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._bytes = None  # Counted on first use
+        self.hits = 0
+        self.renders = 0
+        self.evictions = 0
+
+    def etag(self, report_id: int, image_url: str, lesion_mask: bytes, size: int, fmt: str) -> str:
+        key = hashlib.sha1(lesion_mask)
+        key.update(f"{report_id}:{image_url}:{size}:{fmt}".encode())
+        return key.hexdigest()
+
+    def render(self, report_id: int, image_url: str, lesion_mask: bytes, size: int, fmt: str) -> tuple:
+        """Returns (path, etag) of the cached rendition, rendering it if needed. Blocking."""
+        ext = HEATMAP_FORMATS[fmt][0]
+        etag = self.etag(report_id, image_url, lesion_mask, size, fmt)
+        path = os.path.join(self.cache_dir, f"{etag}{ext}")
+
+        if os.path.exists(path):
+            os.utime(path)  # LRU by mtime
+            with self._lock:
+                self.hits += 1
+            return path, etag
+
+        image = image_pipeline.load(storage_manager.local_path(image_url))
+        blended = render_heatmap(image.bgr, decode_mask(lesion_mask), size)
+        ok, encoded = cv2.imencode(ext, blended, HEATMAP_FORMATS[fmt][2])
+        if not ok:
+            raise ValueError(f"Could not encode heatmap as {fmt}")
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(encoded.tobytes())
+        os.replace(tmp_path, path)  # Concurrent renders of the same key just overwrite
+
+        with self._lock:
+            self.renders += 1
+        self._account(encoded.nbytes)
+        return path, etag
+
+    def _account(self, added: int):
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(e.stat().st_size for e in os.scandir(self.cache_dir) if e.is_file())
+            else:
+                self._bytes += added
+            if self._bytes <= self.max_bytes:
+                return
+
+            # Evict down to 90% so we don't trim on every render
+            entries = sorted(
+                (e for e in os.scandir(self.cache_dir) if e.is_file()),
+                key=lambda e: e.stat().st_mtime
+            )
+            for entry in entries:
+                if self._bytes <= self.max_bytes * 0.9:
+                    break
+                try:
+                    size = entry.stat().st_size
+                    os.remove(entry.path)
+                    self._bytes -= size
+                    self.evictions += 1
+                except FileNotFoundError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "cache_mb": round((self._bytes or 0) / (1024 * 1024), 2),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 2),
+                "hits": self.hits,
+                "renders": self.renders,
+                "evictions": self.evictions
+            }
+
+heatmap_manager = HeatmapService(settings.HEATMAP_CACHE_DIR, settings.HEATMAP_CACHE_MAX_MB * 1024 * 1024)
@@ -0,0 +1,110 @@
+from PIL import Image
+from functools import cached_property
+import numpy as np
+import cv2
+import io
+
+from app.core.config import settings
+
+# OpenCV decode flags for libjpeg DCT-domain downscaling
+REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+class DecodedImage:
+    """
+    One decoded upload plus the views every scan stage shares
+    (blur check, classifier, lesion forensics). Views are built on
+    first access and then reused.
+    """
+    def __init__(self, bgr: np.ndarray, original_size: tuple):
+        self.bgr = bgr                      # Working-resolution BGR (uint8)
+        self.original_size = original_size  # (width, height) of the upload
+
+    @cached_property
+    def rgb(self):
+        return cv2.cvtColor(self.bgr, cv2.COLOR_BGR2RGB)
+
+    @cached_property
+    def gray(self):
+        return cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+
+    @cached_property
+    def hsv(self):
+        return cv2.cvtColor(self.bgr, cv2.COLOR_BGR2HSV)
+
+    @cached_property
+    def dhash(self) -> int:
+        """64-bit difference hash; survives re-encoding and mild resizing."""
+        small = cv2.resize(self.gray, (9, 8), interpolation=cv2.INTER_AREA)
+        bits = (small[:, 1:] > small[:, :-1]).flatten()
+        return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+    @cached_property
+    def thumb(self):
+        """32x32 gray; confirms a dHash near-duplicate really is the same photo."""
+        return cv2.resize(self.gray, (32, 32), interpolation=cv2.INTER_AREA)
+
+    @cached_property
+    def rgb_224(self):
+        # Classifier input (N, 224, 224, 3); the model does its own normalisation
+        return cv2.resize(self.rgb, (224, 224), interpolation=cv2.INTER_AREA)
+
+class ImagePipeline:
+    """
+    Decodes each upload exactly once for the quality gate and classifier.
+    Large JPEGs are decoded at 1/2, 1/4 or 1/8 scale straight out of libjpeg
+    instead of decoding all 12 MP and throwing most of it away.
+    CV forensics are stored in full-resolution pixels (lesion counts, areas,
+    texture), so they ask for full_resolution=True instead.
+    """
+    def __init__(self, max_side: int):
+        self.max_side = max_side
+
+    def decode(self, data, full_resolution: bool = False) -> DecodedImage:
+        """Decodes raw bytes or any buffer (e.g. an mmap'd upload) into a DecodedImage."""
+        buf = np.frombuffer(data, np.uint8)
+        if hasattr(data, "seek"):
+            data.seek(0)  # mmap is file-like; avoids copying it into a BytesIO
+            header_source = data
+        else:
+            header_source = io.BytesIO(buf)
+        with Image.open(header_source) as header:
+            original_size = header.size  # Header only, no pixel decode
+
+        reduction = 1 if full_resolution else self._reduction(original_size)
+        bgr = cv2.imdecode(buf, REDUCED_DECODE_FLAGS[reduction])
+        if bgr is None:
+            raise ValueError("Unsupported or corrupt image")
+        return self._finish(bgr, original_size, full_resolution)
+
+    def load(self, path: str, full_resolution: bool = False) -> DecodedImage:
+        """Decodes an image that is already on disk."""
+        with open(path, "rb") as f:
+            return self.decode(f.read(), full_resolution)
+
+    def _reduction(self, size) -> int:
+        # Largest scale that keeps the long side near the working resolution
+        long_side = max(size)
+        for factor in (8, 4, 2):
+            if long_side / factor >= self.max_side * 0.75:
+                return factor
+        return 1
+
+    def _finish(self, bgr, original_size, full_resolution=False) -> DecodedImage:
+        # EXIF rotation is applied by OpenCV; keep original_size upright too
+        h, w = bgr.shape[:2]
+        if (w > h) != (original_size[0] > original_size[1]):
+            original_size = (original_size[1], original_size[0])
+
+        # Formats without DCT scaling (PNG, WebP) may still be oversized
+        if not full_resolution and max(w, h) > self.max_side * 1.5:
+            scale = self.max_side / max(w, h)
+            bgr = cv2.resize(bgr, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+
+        return DecodedImage(bgr, original_size)
+
+image_pipeline = ImagePipeline(settings.IMAGE_WORKING_MAX_SIDE)
@@ -0,0 +1,275 @@
+"""
+Vision inference backends.
+
+Every backend exposes predict(batch, verbose=0) -> logits, so AIModelService,
+the micro-batcher and the model server work the same on any runtime.
+
+    INFERENCE_BACKEND       keras | tflite | onnx
+    INFERENCE_QUANTIZATION  none | float16 | int8
+
+TFLite/ONNX files are converted from models/tea_leaf_convnext.keras on first
+use and cached beside it (e.g. models/tea_leaf_convnext.int8.onnx).
+
+Check parity on a held-out folder before switching a deployment:
+    python -m app.services.inference_backends parity data/heldout --backend onnx --quantization int8
+"""
+import numpy as np
+import threading
+import argparse
+import os
+
+from app.core.config import settings
+
+KERAS_MODEL_PATH = "models/tea_leaf_convnext.keras"
+BACKENDS = ("keras", "tflite", "onnx")
+QUANTIZATIONS = ("none", "float16", "int8")
+
+# ==========================================
+# 1. BACKENDS
+# ==========================================
+
+def batch_buckets(max_batch_size: int) -> list:
+    """Fixed batch sizes we compile for: 1 (single view), 3 (TTA), then micro-batches."""
+    buckets = [1, 3]
+    size = 6
+    while size < max_batch_size:
+        buckets.append(size)
+        size *= 2
+    buckets.append(max(3, max_batch_size))
+    return sorted(set(buckets))
+
+class KerasBackend:
+    """
+    Keras model behind pre-traced tf.functions, one per fixed batch bucket.
+    Avoids model.predict()'s per-call data adapter/callback setup, and
+    batches are zero-padded up to the nearest bucket so nothing retraces.
+    """
+    name = "keras"
+
+    def __init__(self, path: str = KERAS_MODEL_PATH, max_batch_size: int = 16):
+        import tensorflow as tf
+        self._tf = tf
+        self.model = tf.keras.models.load_model(path)
+        self.bucket_sizes = batch_buckets(max_batch_size)
+
+        forward = tf.function(
+            lambda x: self.model(x, training=False),
+            jit_compile=settings.INFERENCE_JIT_COMPILE
+        )
+        self._fns = {
+            size: forward.get_concrete_function(tf.TensorSpec((size, 224, 224, 3), tf.float32))
+            for size in self.bucket_sizes
+        }
+
+    def predict(self, batch, verbose=0):
+        batch = np.asarray(batch, dtype=np.float32)
+        largest = self.bucket_sizes[-1]
+        outputs = []
+
+        for start in range(0, len(batch), largest):
+            chunk = batch[start:start + largest]
+            size = next(b for b in self.bucket_sizes if b >= len(chunk))
+            if size > len(chunk):
+                pad = np.zeros((size - len(chunk),) + chunk.shape[1:], dtype=np.float32)
+                chunk_in = np.concatenate([chunk, pad])
+            else:
+                chunk_in = chunk
+            logits = self._fns[size](self._tf.constant(chunk_in))
+            outputs.append(logits.numpy()[:len(chunk)])
+
+        return np.concatenate(outputs)
+
+class TFLiteBackend:
+    name = "tflite"
+
+    def __init__(self, path: str, num_threads: int = 0):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        self.interpreter = Interpreter(model_path=path, num_threads=num_threads or None)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = None
+        self._lock = threading.Lock()  # One interpreter, tensors are shared state
+
+    def predict(self, batch, verbose=0):
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            if self._batch_size != len(batch):
+                self.interpreter.resize_tensor_input(self._input["index"], batch.shape)
+                self.interpreter.allocate_tensors()
+                self._batch_size = len(batch)
+            self.interpreter.set_tensor(self._input["index"], batch)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output["index"]).copy()
+
+class OnnxBackend:
+    name = "onnx"
+
+    def __init__(self, path: str, num_threads: int = 0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self._input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch, verbose=0):
+        batch = np.asarray(batch, dtype=np.float32)
+        return self.session.run(None, {self._input_name: batch})[0]
+
+# ==========================================
+# 2. CONVERSION (cached next to the Keras model)
+# ==========================================
+
+def converted_path(backend: str, quantization: str, source: str = KERAS_MODEL_PATH) -> str:
+    stem = os.path.splitext(source)[0]
+    suffix = "" if quantization == "none" else f".{quantization}"
+    return f"{stem}{suffix}.{backend}"
+
+def _is_stale(path: str, source: str) -> bool:
+    return not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(source)
+
+def convert_tflite(quantization: str, source: str = KERAS_MODEL_PATH) -> str:
+    path = converted_path("tflite", quantization, source)
+    if not _is_stale(path, source):
+        return path
+
+    import tensorflow as tf
+    print(f"Converting {source} -> {path} ...")
+    converter = tf.lite.TFLiteConverter.from_keras_model(tf.keras.models.load_model(source))
+    if quantization in ("int8", "float16"):
+        # int8 = dynamic-range quantization (int8 weights, float activations)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+
+    with open(path, "wb") as f:
+        f.write(converter.convert())
+    return path
+
+def convert_onnx(quantization: str, source: str = KERAS_MODEL_PATH) -> str:
+    path = converted_path("onnx", quantization, source)
+    if not _is_stale(path, source):
+        return path
+
+    if quantization == "none":
+        import tensorflow as tf
+        import tf2onnx
+        print(f"Converting {source} -> {path} ...")
+        model = tf.keras.models.load_model(source)
+        spec = (tf.TensorSpec((None, 224, 224, 3), tf.float32, name="input"),)
+        tf2onnx.convert.from_keras(model, input_signature=spec, opset=17, output_path=path)
+        return path
+
+    # Quantized variants are derived from the float32 ONNX graph
+    fp32_path = convert_onnx("none", source)
+    print(f"Quantizing {fp32_path} -> {path} ({quantization}) ...")
+    if quantization == "int8":
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(fp32_path, path, weight_type=QuantType.QInt8)
+    else:
+        import onnx
+        from onnxconverter_common import float16
+        model = float16.convert_float_to_float16(onnx.load(fp32_path), keep_io_types=True)
+        onnx.save(model, path)
+    return path
+
+def load_backend(backend: str, quantization: str = "none", source: str = KERAS_MODEL_PATH):
+    """Builds (converting first if needed) the requested backend."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}' (expected one of {BACKENDS})")
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization '{quantization}' (expected one of {QUANTIZATIONS})")
+
+    if backend == "keras":
+        if quantization != "none":
+            print(f"⚠️ Quantization '{quantization}' ignored for the Keras backend")
+        return KerasBackend(source, settings.INFERENCE_MAX_BATCH_SIZE)
+    if backend == "tflite":
+        return TFLiteBackend(convert_tflite(quantization, source), settings.INFERENCE_CPU_THREADS)
+    return OnnxBackend(convert_onnx(quantization, source), settings.INFERENCE_CPU_THREADS)
+
+# ==========================================
+# 3. PARITY CHECK
+# ==========================================
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+def check_parity(reference, candidate, image_paths, batch_size: int = 16) -> dict:
+    """
+    Compares a candidate backend against the reference on the same images.
+    Confidence drift = |p_ref(top1) - p_candidate(same class)| in percentage points.
+    """
+    from app.services.image_service import image_pipeline
+    from app.services.ai_service import softmax
+
+    agree = 0
+    drifts = []
+    for start in range(0, len(image_paths), batch_size):
+        chunk = image_paths[start:start + batch_size]
+        batch = np.array([image_pipeline.load(p).rgb_224 for p in chunk])
+
+        ref = softmax(reference.predict(batch))
+        cand = softmax(candidate.predict(batch))
+        top = ref.argmax(axis=1)
+        rows = np.arange(len(chunk))
+
+        agree += int(np.sum(top == cand.argmax(axis=1)))
+        drifts.extend((np.abs(ref[rows, top] - cand[rows, top]) * 100).tolist())
+
+    total = len(drifts)
+    return {
+        "images": total,
+        "top1_agreement": round(agree / total, 4) if total else 0,
+        "mean_confidence_drift": round(float(np.mean(drifts)), 3) if total else 0,
+        "max_confidence_drift": round(float(np.max(drifts)), 3) if total else 0
+    }
+
+def _parity_cli(args):
+    paths = sorted(
+        os.path.join(root, f)
+        for root, _, files in os.walk(args.images)
+        for f in files if f.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    if not paths:
+        raise SystemExit(f"No images found under {args.images}")
+
+    reference = load_backend("keras", "none", args.source)
+    candidate = load_backend(args.backend, args.quantization, args.source)
+    report = check_parity(reference, candidate, paths)
+
+    passed = report["top1_agreement"] >= args.min_agreement and report["max_confidence_drift"] <= args.max_drift
+    print(f"{args.backend}/{args.quantization} vs keras: {report}")
+    print("✅ PARITY OK" if passed else "❌ PARITY FAILED")
+    raise SystemExit(0 if passed else 1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TeaCare inference backend tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    convert = sub.add_parser("convert", help="Convert the Keras model ahead of deployment")
+    convert.add_argument("--backend", choices=("tflite", "onnx"), required=True)
+    convert.add_argument("--quantization", choices=QUANTIZATIONS, default="none")
+    convert.add_argument("--source", default=KERAS_MODEL_PATH)
+
+    parity = sub.add_parser("parity", help="Compare a backend against Keras on held-out images")
+    parity.add_argument("images", help="Folder of held-out leaf images")
+    parity.add_argument("--backend", choices=BACKENDS, required=True)
+    parity.add_argument("--quantization", choices=QUANTIZATIONS, default="none")
+    parity.add_argument("--source", default=KERAS_MODEL_PATH)
+    parity.add_argument("--min-agreement", type=float, default=0.99)
+    parity.add_argument("--max-drift", type=float, default=5.0, help="Max confidence drift (percentage points)")
+
+    args = parser.parse_args()
+    if args.command == "convert":
+        converter = convert_tflite if args.backend == "tflite" else convert_onnx
+        print(converter(args.quantization, args.source))
+    else:
+        _parity_cli(args)
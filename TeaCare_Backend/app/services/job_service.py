@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import time
+import uuid
+
+from app.core.config import settings
+
+class Job:
+    """State of one background job. Only JobManager mutates it."""
+    def __init__(self, kind: str, owner=None):
+        self.job_id = uuid.uuid4().hex
+        self.kind = kind
+        self.owner = owner
+        self.status = "queued"      # queued | running | done | failed
+        self.stage = "queued"
+        self.progress = 0           # 0 - 100
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.version = 0            # Bumped on every update (SSE listeners wait on it)
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at
+        }
+
+class JobManager:
+    """
+    In-process background jobs with progress. Jobs run as asyncio tasks
+    (heavy stages still go through compute_manager); progress may be
+    reported from any thread. Finished jobs are kept for result_ttl seconds
+    so clients can fetch the result after a reconnect.
+    """
+    def __init__(self, result_ttl: int):
+        self.result_ttl = result_ttl
+        self._jobs = {}
+        self._tasks = set()  # Strong refs so running tasks aren't garbage collected
+        self._lock = threading.Lock()
+        self._loop = None
+
+    def submit(self, kind: str, work, owner=None) -> Job:
+        """
+        Starts work(job) as a background task and returns the job right away.
+        work is an async callable; its return value becomes job.result.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._purge()
+        job = Job(kind, owner)
+        with self._lock:
+            self._jobs[job.job_id] = job
+
+        task = asyncio.create_task(self._run(job, work))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id: str):
+        self._purge()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def update(self, job: Job, **fields):
+        """Thread-safe progress update, e.g. update(job, stage="texture", progress=60)."""
+        with self._lock:
+            for name, value in fields.items():
+                setattr(job, name, value)
+            job.version += 1
+
+        if self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._notify(job)
+        else:
+            self._loop.call_soon_threadsafe(self._notify, job)
+
+    def reporter(self, job: Job):
+        """progress(stage, percent) callback for pipeline code running on other threads."""
+        return lambda stage, progress: self.update(job, stage=stage, progress=progress)
+
+    async def wait_for_change(self, job: Job, seen_version: int, timeout: float) -> bool:
+        """Waits until job.version moves past seen_version. False on timeout."""
+        if job.version != seen_version:
+            return True
+        try:
+            await asyncio.wait_for(job._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return job.version != seen_version
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            "tracked": len(jobs),
+            "running": sum(1 for j in jobs if j.status == "running"),
+            "queued": sum(1 for j in jobs if j.status == "queued"),
+            "failed": sum(1 for j in jobs if j.status == "failed")
+        }
+
+    async def _run(self, job: Job, work):
+        self.update(job, status="running", stage="starting")
+        try:
+            result = await work(job)
+            self.update(job, status="done", stage="done", progress=100, result=result, finished_at=time.time())
+        except Exception as e:
+            print(f"Job {job.kind}/{job.job_id} failed: {e}")
+            self.update(job, status="failed", stage="failed", error=str(e), finished_at=time.time())
+
+    def _notify(self, job: Job):
+        # Wake everyone waiting on this version, then arm a fresh event
+        changed, job._changed = job._changed, asyncio.Event()
+        changed.set()
+
+    def _purge(self):
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [jid for jid, j in self._jobs.items() if j.finished and j.finished_at < cutoff]
+            for jid in expired:
+                del self._jobs[jid]
+
+job_manager = JobManager(settings.JOB_RESULT_TTL_SECONDS)
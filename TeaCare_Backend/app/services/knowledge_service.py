@@ -0,0 +1,32 @@
+class KnowledgeService:
+    """
+    ChromaDB collection of uploaded manuals, embedded with fastembed.
+    Both libraries (and the ONNX embedding model) are only imported by
+    load(), which main.py runs in the background on start-up.
+    """
+    def __init__(self, path: str, collection_name: str, embedding_model: str):
+        self.path = path
+        self.collection_name = collection_name
+        self.embedding_model = embedding_model
+        self.collection = None
+
+    def load(self):
+        import chromadb
+        from chromadb.api.types import Documents, Embeddings, EmbeddingFunction
+        from fastembed import TextEmbedding
+
+        class FastEmbedFunction(EmbeddingFunction):
+            def __init__(self, model_name: str):
+                self.model = TextEmbedding(model_name=model_name)
+
+            def __call__(self, input: Documents) -> Embeddings:
+                return list(self.model.embed(input))
+
+        client = chromadb.PersistentClient(path=self.path)
+        self.collection = client.get_or_create_collection(
+            name=self.collection_name,
+            embedding_function=FastEmbedFunction(self.embedding_model)
+        )
+        print("✅ Vector Database Ready")
+
+knowledge_manager = KnowledgeService("./tea_vectordb", "tea_knowledge", "BAAI/bge-small-en-v1.5")
@@ -0,0 +1,82 @@
+"""
+Place names (country, admin1 region, city) stored on DiseaseReport.
+
+They are resolved once, when update_location saves a report's coordinates,
+so analytics filter on indexed columns instead of reverse-geocoding every
+row on every request. Rows saved before that (or while the geocoder was
+still loading) are filled in by backfill(), which main.py runs in the
+background on start-up. It can also be run by hand:
+    python -m app.services.location_service backfill
+"""
+import threading
+
+from app.core.database import SessionLocal
+from app.models.sql_models import DiseaseReport
+from app.services.geo_service import geo_manager
+
+def apply_place(report: DiseaseReport, place: dict):
+    report.country = place["country"]
+    report.region = place["region"]
+    report.city = place["city"]
+
+class LocationService:
+    """Writes resolved places onto reports, one at a time or as a backfill."""
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self.located = 0
+        self.backfilled = 0
+
+    def locate(self, report: DiseaseReport):
+        """Sets the report's place from its coordinates (clears it if there are none)."""
+        if report.latitude is None or report.longitude is None:
+            apply_place(report, {"country": None, "region": None, "city": None})
+            return
+        apply_place(report, geo_manager.places([(float(report.latitude), float(report.longitude))])[0])
+        with self._lock:
+            self.located += 1
+
+    def backfill(self) -> int:
+        """Resolves every report that has coordinates but no country yet. Returns rows updated."""
+        db = SessionLocal()
+        updated, last_id = 0, 0
+        try:
+            while True:
+                # Keyset pages: rows the geocoder can't name stay NULL without being re-read forever
+                reports = db.query(DiseaseReport).filter(
+                    DiseaseReport.report_id > last_id,
+                    DiseaseReport.latitude.isnot(None),
+                    DiseaseReport.longitude.isnot(None),
+                    DiseaseReport.country.is_(None)
+                ).order_by(DiseaseReport.report_id).limit(self.batch_size).all()
+                if not reports:
+                    break
+
+                coords = [(float(r.latitude), float(r.longitude)) for r in reports]
+                for report, place in zip(reports, geo_manager.places(coords)):
+                    apply_place(report, place)
+                db.commit()
+                last_id = reports[-1].report_id
+                updated += len(reports)
+                with self._lock:
+                    self.backfilled += len(reports)
+        finally:
+            db.close()
+        if updated:
+            print(f"🌍 Backfilled places for {updated} reports")
+        return updated
+
+    def stats(self):
+        return {"located": self.located, "backfilled": self.backfilled}
+
+location_manager = LocationService(batch_size=500)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Resolve stored report coordinates to place names")
+    parser.add_argument("command", choices=["backfill"])
+    parser.parse_args()
+    from app.services.rollup_service import rollup_manager  # Installs the hook that re-counts moved reports
+    geo_manager.load()
+    print(f"Updated {location_manager.backfill()} reports")
@@ -0,0 +1,163 @@
+"""
+Versioned ConvNeXt models on disk.
+
+    models/registry/<version>/model.keras
+    models/registry/<version>/class_names.pkl
+    models/registry/ACTIVE              <- version loaded at boot
+
+"legacy" is the flat models/tea_leaf_convnext.keras + models/class_names.pkl
+from before the registry, so existing deployments keep working untouched.
+To ship a retrained model, copy it into a new version folder and activate
+it from the admin API (POST /api/admin/models/{version}/activate); the
+swap happens in the running process, no restart. Shadow it first
+(POST /api/admin/models/{version}/shadow) to see how often it agrees with
+the live model on real scans, and how fast it is.
+"""
+import os
+import pickle
+import re
+import threading
+
+from app.core.config import settings
+from app.services.inference_backends import KERAS_MODEL_PATH as LEGACY_MODEL_PATH, load_backend
+
+LEGACY_VERSION = "legacy"
+LEGACY_CLASS_NAMES_PATH = "models/class_names.pkl"
+MODEL_FILE = "model.keras"
+CLASS_NAMES_FILE = "class_names.pkl"
+VERSION_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]{0,63}")
+
+class ModelVersionError(Exception):
+    """Unknown or malformed model version. Endpoints turn it into a 404."""
+
+class ModelRegistry:
+    """Lists, resolves and loads model versions; remembers the active one."""
+    def __init__(self, root: str):
+        self.root = root
+
+    def _version_dir(self, version: str) -> str:
+        # Versions come from admin URLs, so never let one escape the registry folder
+        if not VERSION_PATTERN.fullmatch(version or "") or ".." in version:
+            raise ModelVersionError(f"Invalid model version '{version}'")
+        return os.path.join(self.root, version)
+
+    def paths(self, version: str):
+        """(model path, class names path) of a version; raises ModelVersionError if it isn't on disk."""
+        if version == LEGACY_VERSION:
+            model_path, names_path = LEGACY_MODEL_PATH, LEGACY_CLASS_NAMES_PATH
+        else:
+            folder = self._version_dir(version)
+            model_path, names_path = os.path.join(folder, MODEL_FILE), os.path.join(folder, CLASS_NAMES_FILE)
+        if not (os.path.exists(model_path) and os.path.exists(names_path)):
+            raise ModelVersionError(f"Model version '{version}' not found")
+        return model_path, names_path
+
+    def versions(self) -> list:
+        """Every complete version on disk, oldest first ("legacy" leads if present)."""
+        found = []
+        if os.path.isdir(self.root):
+            for name in os.listdir(self.root):
+                folder = os.path.join(self.root, name)
+                if VERSION_PATTERN.fullmatch(name) and os.path.exists(os.path.join(folder, MODEL_FILE)) \
+                        and os.path.exists(os.path.join(folder, CLASS_NAMES_FILE)):
+                    found.append((os.path.getmtime(os.path.join(folder, MODEL_FILE)), name))
+        versions = [name for _, name in sorted(found)]
+        if os.path.exists(LEGACY_MODEL_PATH) and os.path.exists(LEGACY_CLASS_NAMES_PATH):
+            versions.insert(0, LEGACY_VERSION)
+        return versions
+
+    def boot_version(self) -> str:
+        """MODEL_VERSION if set, else the ACTIVE pointer, else legacy, else the newest version."""
+        if settings.MODEL_VERSION:
+            return settings.MODEL_VERSION
+        try:
+            with open(os.path.join(self.root, "ACTIVE")) as f:
+                version = f.read().strip()
+            if version:
+                return version
+        except FileNotFoundError:
+            pass
+        versions = self.versions()
+        if not versions:
+            raise ModelVersionError(f"No model found in {self.root} or {LEGACY_MODEL_PATH}")
+        return LEGACY_VERSION if LEGACY_VERSION in versions else versions[-1]
+
+    def set_active(self, version: str):
+        """Persists the version to load on the next boot (atomic replace)."""
+        os.makedirs(self.root, exist_ok=True)
+        pointer = os.path.join(self.root, "ACTIVE")
+        with open(pointer + ".tmp", "w") as f:
+            f.write(version)
+        os.replace(pointer + ".tmp", pointer)
+
+    def load(self, version: str):
+        """(backend model, class names) for a version, on the configured inference backend."""
+        model_path, names_path = self.paths(version)
+        # Keras, TFLite or ONNX Runtime; all expose predict(batch). Conversions land next to the source
+        model = load_backend(settings.INFERENCE_BACKEND, settings.INFERENCE_QUANTIZATION, source=model_path)
+        with open(names_path, 'rb') as f:
+            class_names = pickle.load(f)
+        return model, class_names
+
+class ShadowMonitor:
+    """
+    Agreement and latency of a shadow candidate against the active model,
+    both measured on the same sampled requests.
+    """
+    def __init__(self, version: str, sample_rate: float, max_pending: int):
+        self.version = version
+        self.sample_rate = sample_rate
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.calls = 0       # Sampled scoring calls (latency is per call)
+        self.samples = 0     # Images compared (agreement is per image)
+        self.agreed = 0
+        self.skipped = 0     # Sampled but dropped because the shadow queue was full
+        self.errors = 0
+        self.active_ms = 0.0
+        self.shadow_ms = 0.0
+        self.confidence_delta = 0.0
+
+    def try_reserve(self) -> bool:
+        """Claims a slot in the shadow queue; False (and counted) when it is full."""
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.skipped += 1
+                return False
+            self.pending += 1
+            return True
+
+    def record(self, images: int, agreed: int, active_ms: float, shadow_ms: float, confidence_delta: float):
+        """confidence_delta: summed (shadow - active) top-1 confidence over the images, in %."""
+        with self._lock:
+            self.pending -= 1
+            self.calls += 1
+            self.samples += images
+            self.agreed += agreed
+            self.active_ms += active_ms
+            self.shadow_ms += shadow_ms
+            self.confidence_delta += confidence_delta
+
+    def record_error(self):
+        with self._lock:
+            self.pending -= 1
+            self.errors += 1
+
+    def stats(self):
+        with self._lock:
+            n, calls = self.samples, self.calls
+            return {
+                "version": self.version,
+                "sample_rate": self.sample_rate,
+                "samples": n,
+                "agreement": round(self.agreed / n, 3) if n else None,
+                "avg_active_ms": round(self.active_ms / calls, 1) if calls else None,
+                "avg_shadow_ms": round(self.shadow_ms / calls, 1) if calls else None,
+                "avg_confidence_delta": round(self.confidence_delta / n, 2) if n else None,  # shadow - active, in %
+                "pending": self.pending,
+                "skipped": self.skipped,
+                "errors": self.errors
+            }
+
+model_registry = ModelRegistry(settings.MODEL_REGISTRY_DIR)
@@ -0,0 +1,244 @@
+"""
+Out-of-process model server.
+
+One process owns the ConvNeXt model and the Qwen LLM; every uvicorn worker
+talks to it instead of loading its own copies. Image batches travel through
+shared memory, control messages and results over a Unix socket.
+
+Run it next to the API:
+    python -m app.services.model_server
+and start the API workers with MODEL_SERVER_MODE=remote.
+
+Connections exchange pickles, so both sides need the same secret
+MODEL_SERVER_AUTHKEY from the environment (neither starts without one),
+and the socket lives in a directory only the server's user can enter.
+"""
+from multiprocessing.connection import Listener, Client
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+import threading
+import queue
+import os
+
+from app.core.config import settings
+from app.services.model_registry import model_registry, ModelVersionError
+
+def require_authkey(authkey: str) -> bytes:
+    """The shared secret as bytes; refuses to run without one."""
+    if not authkey:
+        raise RuntimeError("MODEL_SERVER_AUTHKEY must be set (a shared secret) to use the model server")
+    return authkey.encode()
+
+def private_socket_dir(address: str):
+    """Creates the socket's directory as 0700; refuses one other users can reach."""
+    directory = os.path.dirname(os.path.abspath(address))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.stat(directory)
+    if info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise RuntimeError(f"{directory} must be owned by this user with 0700 permissions")
+
+# ==========================================
+# 1. CLIENT SIDE (used by ai_manager in "remote" mode)
+# ==========================================
+
+class ModelServerClient:
+    """Small pool of socket connections to the model server (thread-safe)."""
+    def __init__(self, address: str, authkey: str):
+        self.address = address
+        self.authkey = require_authkey(authkey)
+        self._pool = queue.LifoQueue()
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return Client(self.address, family='AF_UNIX', authkey=self.authkey)
+
+    def _release(self, conn):
+        self._pool.put(conn)
+
+    def call(self, request: dict):
+        conn = self._acquire()
+        try:
+            conn.send(request)
+            reply = conn.recv()
+        except Exception:
+            conn.close()
+            raise
+        self._release(conn)
+        if "error" in reply:
+            if reply.get("type") == "ModelVersionError":
+                raise ModelVersionError(reply["error"])
+            raise RuntimeError(f"Model server: {reply['error']}")
+        return reply
+
+    def stream(self, request: dict):
+        """Yields streamed replies; the connection is only reused if fully drained."""
+        conn = self._acquire()
+        drained = False
+        try:
+            conn.send(request)
+            while True:
+                reply = conn.recv()
+                if "error" in reply:
+                    drained = True
+                    raise RuntimeError(f"Model server: {reply['error']}")
+                if reply.get("done"):
+                    drained = True
+                    return
+                yield reply["chunk"]
+        finally:
+            if drained:
+                self._release(conn)
+            else:
+                conn.close()
+
+class RemoteModel:
+    """
+    Stands in for the Keras model: same predict(batch) call, served remotely
+    by the given model version. server_versions is the server's (active,
+    shadow) as of the last reply, so workers notice swaps made elsewhere.
+    """
+    def __init__(self, client: ModelServerClient, version: str = None):
+        self.client = client
+        self.version = version
+        self.server_versions = None
+
+    def predict(self, batch, verbose=0):
+        batch = np.ascontiguousarray(batch)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, batch.nbytes))
+        try:
+            np.ndarray(batch.shape, dtype=batch.dtype, buffer=shm.buf)[:] = batch
+            reply = self.client.call({
+                "op": "predict",
+                "version": self.version,
+                "shm": shm.name,
+                "shape": batch.shape,
+                "dtype": batch.dtype.str
+            })
+            self.server_versions = reply["versions"]
+            return reply["outputs"]
+        finally:
+            shm.close()
+            shm.unlink()
+
+class RemoteLLM:
+    """Stands in for llama_cpp.Llama: llm(prompt, **kwargs), optionally streamed."""
+    def __init__(self, client: ModelServerClient):
+        self.client = client
+
+    def __call__(self, prompt, stream=False, **kwargs):
+        request = {"op": "llm", "prompt": prompt, "kwargs": kwargs, "stream": stream}
+        if stream:
+            return self.client.stream(request)
+        return self.client.call(request)["result"]
+
+# ==========================================
+# 2. SERVER SIDE
+# ==========================================
+
+class ModelServer:
+    """Serves an AIModelService (loaded in local mode) to API workers."""
+    def __init__(self, service, address: str, authkey: str):
+        self.service = service
+        self.address = address
+        self.authkey = require_authkey(authkey)
+        self._llm_lock = threading.Lock()  # llama.cpp contexts are not thread-safe
+
+    def serve_forever(self):
+        private_socket_dir(self.address)
+        if os.path.exists(self.address):
+            os.remove(self.address)
+        with Listener(self.address, family='AF_UNIX', authkey=self.authkey) as listener:
+            print(f"✅ Model Server listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    print(f"Model Server accept failed: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        handlers = {
+            "predict": self._predict, "llm": self._llm, "status": self._status,
+            "activate": self._activate, "shadow": self._shadow
+        }
+        try:
+            while True:
+                request = conn.recv()
+                handler = handlers.get(request.get("op"))
+                try:
+                    if handler is None:
+                        raise ValueError(f"Unknown op {request.get('op')}")
+                    handler(conn, request)
+                except Exception as e:
+                    conn.send({"error": str(e), "type": type(e).__name__})
+        except (EOFError, ConnectionResetError):
+            pass
+        finally:
+            conn.close()
+
+    def _status(self, conn, request):
+        service = self.service
+        shadow, monitor = service.shadow, service.shadow_monitor
+        conn.send({
+            "vision": service.model is not None,
+            "llm": service.llm is not None,
+            "class_names": list(service.class_names),
+            "version": service.version,
+            "previous": service.previous.version if service.previous else None,
+            "shadow": {
+                "version": shadow.version,
+                "class_names": shadow.class_names,
+                "sample_rate": monitor.sample_rate
+            } if shadow and monitor else None,
+            "available": model_registry.versions()
+        })
+
+    def _activate(self, conn, request):
+        self.service.activate(request["version"])
+        self._status(conn, request)
+
+    def _shadow(self, conn, request):
+        # Workers sample and compare; the server only has to keep the candidate loaded
+        if request.get("version"):
+            self.service.start_shadow(request["version"], request["sample_rate"])
+        else:
+            self.service.stop_shadow()
+        self._status(conn, request)
+
+    def _predict(self, conn, request):
+        shm = shared_memory.SharedMemory(name=request["shm"])
+        try:
+            # The client owns (and unlinks) the segment
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        try:
+            batch = np.ndarray(request["shape"], dtype=np.dtype(request["dtype"]), buffer=shm.buf).copy()
+        finally:
+            shm.close()
+        # Goes through the version's server-side batcher, so all API workers share batches.
+        # The version a worker asks for stays servable while it is active, previous or shadow.
+        outputs = self.service.bundle_for(request.get("version")).infer(batch)
+        conn.send({"outputs": outputs, "versions": self.service.served_versions()})
+
+    def _llm(self, conn, request):
+        if self.service.llm is None:
+            raise RuntimeError("LLM not loaded")
+        with self._llm_lock:
+            if not request.get("stream"):
+                conn.send({"result": self.service.llm(request["prompt"], **request["kwargs"])})
+                return
+            for output in self.service.llm(request["prompt"], stream=True, **request["kwargs"]):
+                conn.send({"chunk": output})
+            conn.send({"done": True})
+
+if __name__ == "__main__":
+    from app.services.ai_service import ai_manager
+
+    server = ModelServer(ai_manager, settings.MODEL_SERVER_SOCKET, settings.MODEL_SERVER_AUTHKEY)  # Fails fast without a key
+    ai_manager.load_models(mode="local")
+    ai_manager.warm_up()
+    server.serve_forever()
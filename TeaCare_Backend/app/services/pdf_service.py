@@ -4,15 +4,16 @@ from reportlab.lib import colors
 import os
 from datetime import datetime
 
+from app.services.storage_service import storage_manager
+
 class PDFService:
-    def generate_disease_report(self, report, cv_metrics: dict, confusion_spectrum: list) -> str:
+    def generate_disease_report(self, report, cv_metrics: dict, confusion_spectrum: list, heatmap_path: str = None) -> str:
         """
         Generates a PDF report for a specific disease case.
-        Returns the file path of the generated PDF.
+        Returns the local file path of the generated PDF.
         """
-        # Ensure directory exists
-        os.makedirs("uploads", exist_ok=True)
-        pdf_filename = f"uploads/Report_{report.report_id}.pdf"
+        # Drawn to a scratch file, then stored as reports/Report_<id>.pdf
+        pdf_filename = storage_manager.scratch_path(".pdf")
         
         c = canvas.Canvas(pdf_filename, pagesize=letter)
         width, height = letter
@@ -126,15 +127,14 @@ class PDFService:
         
         try:
             # Draw Original
-            if report.image_url and os.path.exists(report.image_url):
-                c.drawImage(report.image_url, 50, y_pos - 220, width=200, height=200, preserveAspectRatio=True)
+            if storage_manager.exists(report.image_url):
+                c.drawImage(storage_manager.local_path(report.image_url), 50, y_pos - 220, width=200, height=200, preserveAspectRatio=True)
                 c.setFont("Helvetica", 10)
                 c.drawString(50, y_pos - 235, "Fig A: Original Specimen")
             
-            # Draw Heatmap (if available)
-            heatmap_url = cv_metrics.get('heatmap_url')
-            if heatmap_url and os.path.exists(heatmap_url):
-                c.drawImage(heatmap_url, 300, y_pos - 220, width=200, height=200, preserveAspectRatio=True)
+            # Draw Heatmap (if available; rendered file from heatmap_service)
+            if heatmap_path and os.path.exists(heatmap_path):
+                c.drawImage(heatmap_path, 300, y_pos - 220, width=200, height=200, preserveAspectRatio=True)
                 c.drawString(300, y_pos - 235, "Fig B: Computer Vision Heatmap")
         except Exception as e:
             print(f"PDF Image Error: {e}")
@@ -145,6 +145,7 @@ class PDFService:
         c.drawRightString(550, 30, "Page 1 of 1")
 
         c.save()
-        return pdf_filename
+        pdf_url = storage_manager.store_named(f"reports/Report_{report.report_id}.pdf", src_path=pdf_filename)
+        return storage_manager.local_path(pdf_url)
 
 pdf_manager = PDFService()
\ No newline at end of file
@@ -0,0 +1,175 @@
+"""
+Quality gate: cheap checks that reject unusable photos before the classifier.
+
+The blur threshold applies to the Laplacian variance of the proxy, not of
+the working image the old check used (threshold 35 there); downscaling
+sharpens edges per pixel, so the scales differ. It is calibrated on leaf
+photos against the same photos blurred with a BLUR_KERNEL Gaussian:
+    python -m app.services.quality_service calibrate uploads/
+prints the best-separating threshold and how QUALITY_BLUR_THRESHOLD does.
+tests/test_quality_service.py asserts the configured value still separates
+the sample photos in uploads/.
+"""
+import argparse
+import threading
+import cv2
+
+from app.core.config import settings
+from app.services.cv_service import LEAF_TISSUE_LOWER, LEAF_GREEN_UPPER, working_view, leaf_images
+
+BLUR_KERNEL = 9          # Gaussian kernel of the "too blurry" copies calibrate() compares against
+LEGACY_BLUR_THRESHOLD = 35.0  # The old full working-image check, reported for comparison
+
+# Reason code -> message shown to the farmer
+REJECTION_MESSAGES = {
+    "too_small": "Image is too small, move closer or use a higher resolution",
+    "underexposed": "Image is too dark",
+    "overexposed": "Image is overexposed",
+    "blurry": "Image is too blurry",
+    "no_leaf": "No tea leaf found in the image",
+}
+
+class ImageRejectedError(Exception):
+    """Upload failed the quality gate; reason is a key of REJECTION_MESSAGES."""
+    def __init__(self, reason: str):
+        super().__init__(REJECTION_MESSAGES[reason])
+        self.reason = reason
+        self.message = REJECTION_MESSAGES[reason]
+
+def laplacian_variance(gray) -> float:
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+class QualityService:
+    """
+    Cheap checks that reject unusable photos before the classifier runs.
+    Everything except the size check works on a small proxy of the decoded
+    image (one INTER_AREA resize), so a rejection costs a few milliseconds
+    instead of a ConvNeXt forward pass.
+    """
+    def __init__(self, proxy_side: int, min_side: int, blur_threshold: float, min_brightness: float,
+                 max_brightness: float, max_clipped: float, min_leaf_fraction: float):
+        self.proxy_side = proxy_side
+        self.min_side = min_side
+        self.blur_threshold = blur_threshold
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_clipped = max_clipped
+        self.min_leaf_fraction = min_leaf_fraction
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.rejected = {reason: 0 for reason in REJECTION_MESSAGES}
+
+    def assess(self, image) -> dict:
+        """Quality metrics for a DecodedImage plus the first failing reason (or None)."""
+        if min(image.original_size) < self.min_side:
+            return {"reason": "too_small"}
+
+        proxy = working_view(image.bgr, self.proxy_side)
+        gray = cv2.cvtColor(proxy, cv2.COLOR_BGR2GRAY)
+        pixels = gray.size
+        brightness = float(gray.mean())
+        dark = cv2.countNonZero(cv2.inRange(gray, 0, 5)) / pixels
+        bright = cv2.countNonZero(cv2.inRange(gray, 250, 255)) / pixels
+        sharpness = laplacian_variance(gray)
+        hsv = cv2.cvtColor(proxy, cv2.COLOR_BGR2HSV)
+        leaf = cv2.countNonZero(cv2.inRange(hsv, LEAF_TISSUE_LOWER, LEAF_GREEN_UPPER)) / pixels
+
+        reason = None
+        if brightness < self.min_brightness or dark > self.max_clipped:
+            reason = "underexposed"
+        elif brightness > self.max_brightness or bright > self.max_clipped:
+            reason = "overexposed"
+        elif sharpness < self.blur_threshold:
+            reason = "blurry"
+        elif leaf < self.min_leaf_fraction:
+            reason = "no_leaf"
+
+        return {
+            "reason": reason,
+            "brightness": round(brightness, 1),
+            "sharpness": round(sharpness, 1),
+            "leaf_fraction": round(leaf, 3)
+        }
+
+    def check(self, image):
+        """Raises ImageRejectedError if the image fails the gate. Counts every outcome."""
+        reason = self.assess(image)["reason"]
+        with self._lock:
+            self.checked += 1
+            if reason:
+                self.rejected[reason] += 1
+        if reason:
+            raise ImageRejectedError(reason)
+
+    def stats(self):
+        with self._lock:
+            rejected = sum(self.rejected.values())
+            return {
+                "checked": self.checked,
+                "rejected": rejected,
+                "rejection_rate": round(rejected / self.checked, 3) if self.checked else 0,
+                "by_reason": dict(self.rejected)
+            }
+
+quality_manager = QualityService(
+    settings.QUALITY_PROXY_SIDE,
+    settings.QUALITY_MIN_SIDE,
+    settings.QUALITY_BLUR_THRESHOLD,
+    settings.QUALITY_MIN_BRIGHTNESS,
+    settings.QUALITY_MAX_BRIGHTNESS,
+    settings.QUALITY_MAX_CLIPPED,
+    settings.QUALITY_MIN_LEAF_FRACTION
+)
+
+# ==========================================
+# BLUR THRESHOLD CALIBRATION
+# ==========================================
+
+def calibrate(image_paths, proxy_side: int = None, threshold: float = None) -> dict:
+    """
+    Proxy sharpness of each photo and of a BLUR_KERNEL-blurred copy, the
+    threshold that best separates the two, and how `threshold` (default:
+    QUALITY_BLUR_THRESHOLD) and the legacy full-image check score.
+    """
+    from app.services.image_service import image_pipeline
+
+    proxy_side = proxy_side or settings.QUALITY_PROXY_SIDE
+    threshold = settings.QUALITY_BLUR_THRESHOLD if threshold is None else threshold
+    sharp, blurred, legacy_correct = [], [], 0
+    for path in image_paths:
+        bgr = image_pipeline.load(path).bgr
+        for copy, scores in ((bgr, sharp), (cv2.GaussianBlur(bgr, (BLUR_KERNEL, BLUR_KERNEL), 0), blurred)):
+            scores.append(laplacian_variance(cv2.cvtColor(working_view(copy, proxy_side), cv2.COLOR_BGR2GRAY)))
+            legacy_sharp = laplacian_variance(cv2.cvtColor(copy, cv2.COLOR_BGR2GRAY)) >= LEGACY_BLUR_THRESHOLD
+            legacy_correct += legacy_sharp == (scores is sharp)
+
+    def correct(t):
+        return sum(s >= t for s in sharp) + sum(b < t for b in blurred)
+
+    best = max(sorted(sharp + blurred), key=correct)
+    total = len(sharp) + len(blurred)
+    return {
+        "images": len(image_paths),
+        "best_threshold": round(best, 1),
+        "best_accuracy": round(correct(best) / total, 3),
+        "threshold": threshold,
+        "accuracy": round(correct(threshold) / total, 3),
+        "sharp_rejected": sum(s < threshold for s in sharp),
+        "blurred_accepted": sum(b >= threshold for b in blurred),
+        "legacy_accuracy": round(legacy_correct / total, 3)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TeaCare quality gate tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    cal = sub.add_parser("calibrate", help="Check the blur threshold against blurred copies of leaf photos")
+    cal.add_argument("images", help="Folder of sharp leaf images")
+    cal.add_argument("--proxy-side", type=int, default=settings.QUALITY_PROXY_SIDE)
+    cal.add_argument("--threshold", type=float, default=settings.QUALITY_BLUR_THRESHOLD)
+
+    args = parser.parse_args()
+    paths = leaf_images(args.images)
+    if not paths:
+        raise SystemExit(f"No images found under {args.images}")
+    print(f"proxy_side={args.proxy_side}: {calibrate(paths, args.proxy_side, args.threshold)}")
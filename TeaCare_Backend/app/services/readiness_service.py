@@ -0,0 +1,80 @@
+from fastapi import HTTPException
+import threading
+import time
+
+class ReadinessService:
+    """
+    Tracks slow start-up work (database schema, models, vector DB) that
+    runs in background threads, so the API can accept connections at once.
+    Endpoints that need a component declare Depends(require("vision")) and
+    get a fast 503 + Retry-After while it is still loading.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._components = {}
+
+    def start(self, name: str, loader):
+        """Runs loader() on a daemon thread; its outcome becomes the component's state."""
+        with self._lock:
+            self._components[name] = {
+                "state": "loading", "error": None, "started": time.time(), "seconds": None,
+                "done": threading.Event()
+            }
+        threading.Thread(target=self._run, args=(name, loader), name=f"load-{name}", daemon=True).start()
+
+    def _run(self, name: str, loader):
+        try:
+            loader()
+            state, error = "ready", None
+        except Exception as e:
+            print(f"❌ {name} failed to load: {e}")
+            state, error = "failed", str(e)
+        with self._lock:
+            component = self._components[name]
+            component.update(state=state, error=error, seconds=round(time.time() - component["started"], 2))
+        component["done"].set()
+        if state == "ready":
+            print(f"✅ {name} ready in {component['seconds']}s")
+
+    def state(self, name: str) -> str:
+        with self._lock:
+            component = self._components.get(name)
+            return component["state"] if component else "ready"  # Not tracked = nothing to wait for
+
+    def wait(self, name: str, timeout: float = None) -> str:
+        """Blocks until the component has finished loading (for start-up work that depends on it)."""
+        with self._lock:
+            component = self._components.get(name)
+        if component:
+            component["done"].wait(timeout)
+        return self.state(name)
+
+    def is_ready(self, *names) -> bool:
+        return all(self.state(name) == "ready" for name in names)
+
+    def require(self, *names, allow_failed: bool = False):
+        """
+        FastAPI dependency: 503 right away unless every named component is
+        ready. allow_failed only waits out the loading phase.
+        """
+        def dependency():
+            for name in names:
+                state = self.state(name)
+                if state == "loading":
+                    raise HTTPException(status_code=503, detail=f"{name} is still loading", headers={"Retry-After": "5"})
+                if state == "failed" and not allow_failed:
+                    raise HTTPException(status_code=503, detail=f"{name} is unavailable")
+        return dependency
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    "state": c["state"],
+                    "error": c["error"],
+                    "seconds": c["seconds"] if c["seconds"] is not None else round(time.time() - c["started"], 2)
+                }
+                for name, c in self._components.items()
+            }
+
+readiness_manager = ReadinessService()
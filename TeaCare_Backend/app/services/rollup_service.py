@@ -0,0 +1,159 @@
+"""
+Daily disease rollup (DiseaseDailyRollup): report counts per day, disease,
+country, region, verification status and feedback.
+
+A before_flush hook on SessionLocal moves counts between rollup rows
+whenever a flush inserts or deletes a report or changes one of those
+fields. It runs in the same transaction as the report write, so scans,
+feedback, triage, location updates and the place backfill keep the rollup
+exact without calling anything. Dashboards then read a few rows per day
+instead of every report. rebuild() recounts it from disease_reports. It
+runs on start-up when the totals disagree, from the admin API
+(POST /api/admin/analytics/rollup/rebuild), or by hand:
+    python -m app.services.rollup_service rebuild
+"""
+from collections import Counter
+from datetime import datetime
+import threading
+import time
+
+from sqlalchemy import event, func, insert, inspect, select, text
+
+from app.core.database import SessionLocal
+from app.models.sql_models import DiseaseReport, DiseaseDailyRollup
+
+DIMENSIONS = ("disease_name", "country", "region", "verification_status", "is_correct")
+KEY_COLUMNS = ("day",) + DIMENSIONS
+
+def report_key(timestamp, values) -> tuple:
+    """Rollup primary key of a report: (day, *DIMENSIONS) with NULLs as "". None without a timestamp."""
+    if timestamp is None:
+        return None
+    return (timestamp.date(),) + tuple(v if v is not None else "" for v in values)
+
+def upsert_statement(dialect: str, rows: list):
+    """INSERT ... ON CONFLICT that adds report_count onto existing rows (PostgreSQL / SQLite)."""
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    table = DiseaseDailyRollup.__table__
+    stmt = dialect_insert(table).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=list(KEY_COLUMNS),
+        set_={"report_count": table.c.report_count + stmt.excluded.report_count}
+    )
+
+class RollupService:
+    """Keeps DiseaseDailyRollup in step with disease_reports, and rebuilds it on demand."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.updates = 0       # Flushes that touched the rollup
+        self.rebuilds = 0
+        self.rebuild_seconds = None
+
+    def _stored_keys(self, session, report_ids: list) -> dict:
+        """Keys as currently in the database (before this flush), by report id."""
+        if not report_ids:
+            return {}
+        columns = [getattr(DiseaseReport, name) for name in DIMENSIONS]
+        with session.no_autoflush:
+            rows = session.execute(
+                select(DiseaseReport.report_id, DiseaseReport.timestamp, *columns)
+                .where(DiseaseReport.report_id.in_(report_ids))
+            ).all()
+        return {row[0]: report_key(row[1], row[2:]) for row in rows}
+
+    def before_flush(self, session, flush_context, instances):
+        deltas = Counter()
+
+        for report in session.new:
+            if not isinstance(report, DiseaseReport):
+                continue
+            # Column defaults only apply at INSERT; set them now so the row and its rollup agree
+            if report.timestamp is None:
+                report.timestamp = datetime.now()
+            for name in ("verification_status", "is_correct"):
+                if getattr(report, name) is None:
+                    setattr(report, name, DiseaseReport.__table__.c[name].default.arg)
+            deltas[report_key(report.timestamp, [getattr(report, n) for n in DIMENSIONS])] += 1
+
+        changed = [
+            r for r in session.dirty
+            if isinstance(r, DiseaseReport) and any(
+                inspect(r).attrs[name].history.has_changes() for name in ("timestamp",) + DIMENSIONS
+            )
+        ]
+        removed = [r for r in session.deleted if isinstance(r, DiseaseReport)]
+        stored = self._stored_keys(session, [r.report_id for r in changed + removed])
+        for report in changed:
+            deltas[stored.get(report.report_id)] -= 1
+            deltas[report_key(report.timestamp, [getattr(report, n) for n in DIMENSIONS])] += 1
+        for report in removed:
+            deltas[stored.get(report.report_id)] -= 1
+
+        rows = [
+            {**dict(zip(KEY_COLUMNS, key)), "report_count": delta}
+            for key, delta in sorted(deltas.items(), key=lambda item: item[0] or ())
+            if key is not None and delta
+        ]
+        if not rows:
+            return
+        # Sorted keys: concurrent writers lock rollup rows in the same order
+        session.connection().execute(upsert_statement(session.get_bind().dialect.name, rows))
+        with self._lock:
+            self.updates += 1
+
+    def rebuild(self) -> int:
+        """Recounts the whole rollup from disease_reports in one transaction. Returns rows written."""
+        started = time.time()
+        db = SessionLocal()
+        try:
+            if db.get_bind().dialect.name == "postgresql":
+                # Report writers wait on their rollup upsert instead of racing the recount
+                db.execute(text(f"LOCK TABLE {DiseaseDailyRollup.__tablename__} IN EXCLUSIVE MODE"))
+            db.query(DiseaseDailyRollup).delete()
+
+            day = func.date(DiseaseReport.timestamp)
+            dimensions = [func.coalesce(getattr(DiseaseReport, name), "") for name in DIMENSIONS]
+            counts = select(day, *dimensions, func.count(DiseaseReport.report_id)) \
+                .where(DiseaseReport.timestamp.isnot(None)) \
+                .group_by(day, *dimensions)
+            db.execute(insert(DiseaseDailyRollup).from_select(list(KEY_COLUMNS) + ["report_count"], counts))
+            rows = db.query(func.count()).select_from(DiseaseDailyRollup).scalar()
+            db.commit()
+        finally:
+            db.close()
+        with self._lock:
+            self.rebuilds += 1
+            self.rebuild_seconds = round(time.time() - started, 2)
+        print(f"📊 Rebuilt disease rollup ({rows} rows in {self.rebuild_seconds}s)")
+        return rows
+
+    def ensure(self):
+        """
+        Rebuilds when the rollup's total disagrees with the report count: the first
+        start after the upgrade, or reports changed outside the app since.
+        """
+        db = SessionLocal()
+        try:
+            counted = db.query(func.coalesce(func.sum(DiseaseDailyRollup.report_count), 0)).scalar()
+            reports = db.query(func.count(DiseaseReport.report_id)).filter(DiseaseReport.timestamp.isnot(None)).scalar()
+        finally:
+            db.close()
+        if counted != reports:
+            self.rebuild()
+
+    def stats(self):
+        return {"updates": self.updates, "rebuilds": self.rebuilds, "rebuild_seconds": self.rebuild_seconds}
+
+rollup_manager = RollupService()
+event.listen(SessionLocal, "before_flush", rollup_manager.before_flush)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Recount the daily disease rollup from stored reports")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+    print(f"Wrote {rollup_manager.rebuild()} rollup rows")
@@ -0,0 +1,267 @@
+"""
+Blob storage for everything we write: scan and forum photos, library
+images, renditions and generated PDFs.
+
+Photos are content-addressed: the key is the SHA-256 of the file, sharded
+two levels deep so no directory grows past a few thousand entries, e.g.
+    uploads/3f/a2/3fa2...e9.jpg
+Identical uploads are therefore stored once. Derived files use named keys
+(renditions next to their original, reports/Report_<id>.pdf).
+
+URLs stay "uploads/<key>" (served by the /uploads static mount), so rows
+written before sharding ("uploads/<uuid>.jpg") keep working.
+
+Move existing flat files into shards and rewrite the database:
+    python -m app.services.storage_service migrate
+"""
+from abc import ABC, abstractmethod
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+
+from app.core.config import settings
+
+URL_PREFIX = "uploads/"
+
+def content_key(sha256: str, ext: str) -> str:
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}{ext}"
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# ==========================================
+# 1. BACKENDS
+# ==========================================
+class StorageBackend(ABC):
+    """
+    Interface every backend implements. Keys are relative paths with "/"
+    separators. Readers (OpenCV, reportlab) need real files, so backends
+    hand out a local path for a key.
+    """
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def put_file(self, key: str, src_path: str):
+        """Stores src_path under key, consuming (moving) the source file."""
+        ...
+
+    @abstractmethod
+    def put_bytes(self, key: str, data: bytes):
+        ...
+
+    @abstractmethod
+    def local_path(self, key: str) -> str:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+class LocalStorage(StorageBackend):
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def put_file(self, key: str, src_path: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.move(src_path, path)  # A rename when both are on the same disk
+
+    def put_bytes(self, key: str, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)  # Readers never see a half-written file
+
+    def local_path(self, key: str) -> str:
+        return self._path(key)
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+class S3Storage(StorageBackend):
+    """
+    S3-compatible object store (AWS, MinIO, ...). Objects are written
+    through to the bucket and mirrored in a local directory, which is what
+    /uploads serves and what readers open; missing mirror files are
+    fetched on demand.
+    """
+    def __init__(self, bucket: str, mirror: LocalStorage, endpoint_url: str = "", prefix: str = ""):
+        import boto3  # Optional dependency (see requirements.txt), only needed for STORAGE_BACKEND=s3
+        self.client = boto3.client("s3", endpoint_url=endpoint_url or None)
+        self.bucket = bucket
+        self.prefix = prefix
+        self.mirror = mirror
+
+    def _object(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def exists(self, key: str) -> bool:
+        if self.mirror.exists(key):
+            return True
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object(key))
+            return True
+        except self.client.exceptions.ClientError:
+            return False
+
+    def put_file(self, key: str, src_path: str):
+        self.client.upload_file(src_path, self.bucket, self._object(key))
+        self.mirror.put_file(key, src_path)
+
+    def put_bytes(self, key: str, data: bytes):
+        self.client.put_object(Bucket=self.bucket, Key=self._object(key), Body=data)
+        self.mirror.put_bytes(key, data)
+
+    def local_path(self, key: str) -> str:
+        path = self.mirror.local_path(key)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            self.client.download_file(self.bucket, self._object(key), tmp_path)
+            os.replace(tmp_path, path)
+        return path
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object(key))
+        self.mirror.delete(key)
+
+def make_backend(name: str) -> StorageBackend:
+    local = LocalStorage(settings.STORAGE_ROOT)
+    if name == "local":
+        return local
+    if name == "s3":
+        return S3Storage(settings.S3_BUCKET, local, settings.S3_ENDPOINT_URL, settings.S3_PREFIX)
+    raise ValueError(f"Unknown STORAGE_BACKEND '{name}' (expected local or s3)")
+
+# ==========================================
+# 2. STORAGE SERVICE (URLs <-> keys, dedup)
+# ==========================================
+class StorageService:
+    def __init__(self, backend: StorageBackend, root: str):
+        self.backend = backend
+        self.scratch_dir = os.path.join(root, ".incoming")  # Temp files; same disk as the local store
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.deduplicated = 0
+
+    def url(self, key: str) -> str:
+        return f"{URL_PREFIX}{key}"
+
+    def key(self, url: str) -> str:
+        return url[len(URL_PREFIX):] if url.startswith(URL_PREFIX) else url
+
+    def store_content(self, src_path: str, sha256: str, ext: str) -> str:
+        """Stores a finished temp file by content hash and returns its URL. Duplicates are dropped."""
+        key = content_key(sha256, ext)
+        if self.backend.exists(key):
+            os.remove(src_path)
+            self._count(deduplicated=1)
+        else:
+            self.backend.put_file(key, src_path)
+            self._count(stored=1)
+        return self.url(key)
+
+    def store_named(self, key: str, src_path: str = None, data: bytes = None) -> str:
+        """Stores derived output (renditions, PDFs) under a fixed key, replacing any old version."""
+        if data is not None:
+            self.backend.put_bytes(key, data)
+        else:
+            self.backend.put_file(key, src_path)
+        return self.url(key)
+
+    def scratch_path(self, suffix: str = "") -> str:
+        os.makedirs(self.scratch_dir, exist_ok=True)
+        return os.path.join(self.scratch_dir, f"{uuid.uuid4().hex}{suffix}")
+
+    def exists(self, url: str) -> bool:
+        return bool(url) and self.backend.exists(self.key(url))
+
+    def local_path(self, url: str) -> str:
+        return self.backend.local_path(self.key(url))
+
+    def delete(self, url: str):
+        self.backend.delete(self.key(url))
+
+    def _count(self, stored=0, deduplicated=0):
+        with self._lock:
+            self.stored += stored
+            self.deduplicated += deduplicated
+
+    def stats(self):
+        return {
+            "backend": type(self.backend).__name__,
+            "stored": self.stored,
+            "deduplicated": self.deduplicated
+        }
+
+storage_manager = StorageService(make_backend(settings.STORAGE_BACKEND), settings.STORAGE_ROOT)
+
+# ==========================================
+# 3. MIGRATION (flat uploads/ -> sharded keys)
+# ==========================================
+def migrate_flat_uploads():
+    """
+    Re-stores every flat "uploads/<name>" photo referenced by the database
+    under its content key and rewrites the rows. Old renditions are dropped
+    (run the thumbnail backfill afterwards); old files are deleted only
+    after the database commit.
+    """
+    from app.core.database import SessionLocal
+    from app.models.sql_models import DiseaseReport, ForumPost, KnowledgeBase
+    from app.services.thumbnail_service import thumbnail_manager, RENDITIONS
+
+    db = SessionLocal()
+    moved = {}
+    try:
+        for model in (DiseaseReport, ForumPost, KnowledgeBase):
+            urls = [u for (u,) in db.query(model.image_url).distinct() if u and "/" not in storage_manager.key(u)]
+            for old_url in urls:
+                if old_url not in moved:
+                    path = storage_manager.local_path(old_url)
+                    if not os.path.exists(path):
+                        continue
+                    tmp_path = storage_manager.scratch_path()
+                    shutil.copyfile(path, tmp_path)
+                    ext = os.path.splitext(old_url)[1].lower()
+                    moved[old_url] = storage_manager.store_content(tmp_path, file_sha256(tmp_path), ext)
+
+                fields = {"image_url": moved[old_url]}
+                if hasattr(model, "thumbnail_url"):
+                    fields.update(thumbnail_url=None, preview_url=None)
+                db.query(model).filter(model.image_url == old_url).update(fields, synchronize_session=False)
+            print(f"{model.__tablename__}: {len(urls)} flat files")
+        db.commit()
+    finally:
+        db.close()
+
+    for old_url in moved:
+        for url in [old_url] + [thumbnail_manager.rendition_path(old_url, size) for size in RENDITIONS.values()]:
+            storage_manager.delete(url)
+    print(f"✅ Migrated {len(moved)} files, {storage_manager.stats()}")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="TeaCare storage tools")
+    parser.add_argument("command", choices=["migrate"])
+    parser.parse_args()
+    migrate_flat_uploads()
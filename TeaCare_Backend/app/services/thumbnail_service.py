@@ -0,0 +1,124 @@
+"""
+Downscaled renditions of uploaded photos (scan images, forum posts).
+
+Renditions are JPEGs stored next to the original, e.g.
+    uploads/3f/a2/<sha>.jpg  ->  uploads/3f/a2/<sha>_128.jpg, uploads/3f/a2/<sha>_512.jpg
+and their relative URLs are stored on the row (thumbnail_url / preview_url).
+They are built on a small background pool right after the upload is saved.
+
+Backfill existing rows:
+    python -m app.services.thumbnail_service backfill
+"""
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import cv2
+import os
+
+from app.core.database import SessionLocal
+from app.services.image_service import image_pipeline
+from app.services.storage_service import storage_manager
+
+# Rendition name -> long side in px (image_url itself is always the original)
+RENDITIONS = {"thumbnail": 128, "preview": 512}
+
+class ThumbnailService:
+    def __init__(self, workers: int = 2):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnails")
+        self._lock = threading.Lock()
+        self.generated = 0
+        self.failed = 0
+        self.queued = 0  # Scheduled and not finished yet
+
+    def rendition_path(self, image_url: str, size: int) -> str:
+        return f"{os.path.splitext(image_url)[0]}_{size}.jpg"
+
+    def generate(self, image_url: str) -> dict:
+        """Writes all renditions from a single decode. Returns {"thumbnail_url", "preview_url"}."""
+        urls = {f"{name}_url": self.rendition_path(image_url, size) for name, size in RENDITIONS.items()}
+        if all(storage_manager.exists(url) for url in urls.values()):
+            return urls  # Duplicate upload (same content key)
+
+        image = image_pipeline.load(storage_manager.local_path(image_url))
+        h, w = image.bgr.shape[:2]
+        current = image.bgr
+        for name, size in sorted(RENDITIONS.items(), key=lambda kv: -kv[1]):
+            scale = size / max(h, w)
+            if scale < 1:
+                # Chain from the previous (larger) rendition, INTER_AREA keeps it sharp
+                current = cv2.resize(current, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+            ok, encoded = cv2.imencode(".jpg", current, [cv2.IMWRITE_JPEG_QUALITY, 80, cv2.IMWRITE_JPEG_OPTIMIZE, 1])
+            if not ok:
+                raise ValueError("Could not encode rendition")
+            storage_manager.store_named(storage_manager.key(urls[f"{name}_url"]), data=encoded.tobytes())
+        return urls
+
+    def _generate_for(self, model, row_id: int, image_url: str):
+        try:
+            urls = self.generate(image_url)
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            print(f"Thumbnail Error ({image_url}): {e}")
+            return
+
+        db = SessionLocal()
+        try:
+            primary_key = model.__mapper__.primary_key[0]
+            db.query(model).filter(primary_key == row_id).update(urls, synchronize_session=False)
+            db.commit()
+            with self._lock:
+                self.generated += 1
+        finally:
+            db.close()
+
+    def _run(self, model, row_id: int, image_url: str):
+        try:
+            self._generate_for(model, row_id, image_url)
+        finally:
+            with self._lock:
+                self.queued -= 1
+
+    def schedule(self, model, row_id: int, image_url: str):
+        """Queues rendition generation for a saved row (DiseaseReport / ForumPost)."""
+        if image_url:
+            with self._lock:
+                self.queued += 1
+            self._executor.submit(self._run, model, row_id, image_url)
+
+    def stats(self):
+        with self._lock:
+            return {"generated": self.generated, "failed": self.failed, "queued": self.queued}
+
+def with_renditions(item: dict) -> dict:
+    """
+    For list/map payloads: image_url stays the original upload; thumbnail_url and
+    preview_url fall back to it while they are still being generated.
+    """
+    for name in RENDITIONS:
+        item[f"{name}_url"] = item.get(f"{name}_url") or item.get("image_url")
+    return item
+
+thumbnail_manager = ThumbnailService()
+
+if __name__ == "__main__":
+    import argparse
+    from app.models.sql_models import DiseaseReport, ForumPost
+
+    parser = argparse.ArgumentParser(description="TeaCare rendition tools")
+    parser.add_argument("command", choices=["backfill"])
+    parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        for model in (DiseaseReport, ForumPost):
+            primary_key = model.__mapper__.primary_key[0]
+            rows = db.query(primary_key, model.image_url).filter(
+                model.image_url.isnot(None), model.thumbnail_url.is_(None)
+            ).all()
+            print(f"{model.__tablename__}: {len(rows)} rows without renditions")
+            for row_id, image_url in rows:
+                if storage_manager.exists(image_url):
+                    thumbnail_manager._generate_for(model, row_id, image_url)
+    finally:
+        db.close()
+    print(f"✅ {thumbnail_manager.stats()}")
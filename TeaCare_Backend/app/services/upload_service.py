@@ -0,0 +1,158 @@
+import hashlib
+import mmap
+import os
+import threading
+
+from app.core.config import settings
+from app.services.storage_service import storage_manager
+
+# Accepted types, detected from the file's magic bytes (never the client's filename)
+IMAGE_TYPES = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp"}
+ARCHIVE_TYPES = {"application/zip": ".zip"}
+
+def sniff_type(head: bytes):
+    """MIME type from the first bytes of a file, or None if we don't accept it."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head.startswith(b"PK\x03\x04"):
+        return "application/zip"
+    return None
+
+class UploadRejectedError(Exception):
+    """Upload failed the size/type checks. Endpoints turn it into an HTTP error."""
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+class StoredUpload:
+    """
+    An upload that has been streamed to a temporary file. Later stages read
+    it through view() (a read-only mmap, no bytes copy) and keep() hands it
+    to storage (content-addressed, so duplicates are stored once). Anything
+    not kept is deleted on close().
+    """
+    def __init__(self, path: str, filename: str, mime: str, ext: str, sha256: str, size: int):
+        self.path = path
+        self.filename = filename    # As sent by the client (display only)
+        self.mime = mime
+        self.ext = ext
+        self.sha256 = sha256
+        self.size = size
+        self.kept = False
+        self.url = None             # Set by keep()
+        self._file = None
+        self._view = None
+
+    def view(self) -> mmap.mmap:
+        if self._view is None:
+            self._file = open(self.path, "rb")
+            self._view = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._view
+
+    def keep(self) -> str:
+        """Stores the file permanently and returns its URL (the same URL for identical content)."""
+        if not self.kept:
+            self._release()  # Windows can't rename a mapped file
+            self.url = storage_manager.store_content(self.path, self.sha256, self.ext)
+            self.path = storage_manager.local_path(self.url)
+            self.kept = True
+        return self.url
+
+    def close(self):
+        self._release()
+        if not self.kept:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def _release(self):
+        if self._view is not None:
+            try:
+                self._view.close()
+            except BufferError:
+                pass  # A numpy view is still alive somewhere; GC unmaps it
+            self._file.close()
+            self._view = self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class UploadService:
+    """
+    Streams uploads to disk in fixed-size chunks, hashing (SHA-256) and
+    enforcing size/type limits on the way, so no request holds a whole
+    file in memory. Blocking; call it from a worker thread.
+    """
+    def __init__(self, max_bytes: int, chunk_size: int):
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.rejected = 0
+        self.bytes_in = 0
+
+    def ingest(self, source, filename: str, types: dict = IMAGE_TYPES, max_bytes: int = None) -> StoredUpload:
+        """
+        Copies a file object (UploadFile.file, a zip member, ...) into a
+        temporary file. Raises UploadRejectedError (413 / 415 / 400).
+        """
+        max_bytes = max_bytes or self.max_bytes
+        path = storage_manager.scratch_path(".part")  # Same disk as the store, so keep() is a rename
+        digest = hashlib.sha256()
+        size = 0
+        mime = None
+
+        try:
+            with open(path, "wb") as out:
+                while True:
+                    chunk = source.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    if mime is None:
+                        mime = sniff_type(chunk[:16])
+                        if mime not in types:
+                            raise UploadRejectedError(415, f"{filename}: unsupported file type")
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise UploadRejectedError(413, f"{filename}: file is larger than {max_bytes // (1024 * 1024)} MB")
+                    digest.update(chunk)
+                    out.write(chunk)
+            if size == 0:
+                raise UploadRejectedError(400, f"{filename}: empty file")
+        except BaseException as e:
+            os.remove(path)
+            if isinstance(e, UploadRejectedError):
+                self._count(rejected=1)
+            raise
+
+        self._count(accepted=1, bytes_in=size)
+        return StoredUpload(path, filename, mime, types[mime], digest.hexdigest(), size)
+
+    def save(self, source, filename: str) -> str:
+        """Ingest + keep in one step, for writers that don't need the contents (forum, library)."""
+        with self.ingest(source, filename) as upload:
+            return upload.keep()
+
+    def _count(self, accepted=0, rejected=0, bytes_in=0):
+        with self._lock:
+            self.accepted += accepted
+            self.rejected += rejected
+            self.bytes_in += bytes_in
+
+    def stats(self):
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "mb_in": round(self.bytes_in / (1024 * 1024), 2)
+        }
+
+upload_manager = UploadService(settings.UPLOAD_MAX_IMAGE_MB * 1024 * 1024, settings.UPLOAD_CHUNK_KB * 1024)
@@ -1,6 +1,8 @@
 import httpx
 from datetime import datetime
 
+from app.services.geo_service import geo_manager
+
 # --- HELPER: Condition Text Map ---
 def get_condition_text(c: int) -> str:
     if c in [0]: return "Sunny"
@@ -78,6 +80,10 @@ class WeatherService:
         geo_url = f"https://nominatim.openstreetmap.org/reverse?format=json&lat={lat}&lon={lng}"
         
         location_name = "Unknown Estate"
+        named_offline = geo_manager.ready
+        if named_offline:
+            # Offline lookup in the shared KD-tree; Nominatim only while it is still loading
+            location_name = geo_manager.place_name(lat, lng) or location_name
         
         async with httpx.AsyncClient() as client:
             # 1. Fetch Weather
@@ -88,15 +94,16 @@ class WeatherService:
                 print(f"Weather API Error: {e}")
                 raise e
 
-            # 2. Fetch Location (Soft fail if error)
-            try:
-                geo_resp = await client.get(geo_url, headers={"User-Agent": "TeaCareApp/1.0"})
-                if geo_resp.status_code == 200:
-                    address = geo_resp.json().get("address", {})
-                    city = address.get("city") or address.get("town") or address.get("village")
-                    location_name = city if city else "Sri Lanka"
-            except:
-                pass
+            # 2. Fetch Location (Soft fail if error; skipped when named offline)
+            if not named_offline:
+                try:
+                    geo_resp = await client.get(geo_url, headers={"User-Agent": "TeaCareApp/1.0"})
+                    if geo_resp.status_code == 200:
+                        address = geo_resp.json().get("address", {})
+                        city = address.get("city") or address.get("town") or address.get("village")
+                        location_name = city if city else "Sri Lanka"
+                except:
+                    pass
 
         # 3. Extract & Parse Data
         current = weather_data.get("current", {})
@@ -0,0 +1,8 @@
+import os
+
+# Settings that have no default; tests never use the app database, SMS or mail
+os.environ.setdefault("SQLALCHEMY_DATABASE_URL", "sqlite://")
+os.environ.setdefault("TEXTLK_API_TOKEN", "test")
+os.environ.setdefault("MAIL_USERNAME", "test")
+os.environ.setdefault("MAIL_PASSWORD", "test")
+os.environ.setdefault("MAIL_FROM", "test@example.com")
@@ -0,0 +1,28 @@
+"""
+PredictionCache lookups: exact hits, and near-duplicate hits that must
+also match on pixels.
+"""
+import numpy as np
+
+from app.services.cache_service import PredictionCache
+
+LEAF = np.tile(np.arange(32, dtype=np.uint8) * 8, (32, 1))
+
+def test_exact_only():
+    cache = PredictionCache(8, -1, 6.0)
+    cache.put("v1", "a", 0b1010, LEAF, [0.9, 0.1], "uploads/a.jpg")
+    assert cache.get("v1", "a", 0b1010, LEAF)[1] == "exact"
+    assert cache.get("v1", "b", 0b1010, LEAF) == (None, None)
+
+def test_near_duplicate_needs_matching_pixels():
+    cache = PredictionCache(8, 4, 6.0)
+    cache.put("v1", "a", 0b1010, LEAF, [0.9, 0.1], "uploads/a.jpg")
+
+    recompressed = (LEAF.astype(np.int16) + 2).clip(0, 255).astype(np.uint8)
+    entry, kind = cache.get("v1", "b", 0b1011, recompressed)
+    assert kind == "near" and entry["image_url"] == "uploads/a.jpg"
+
+    other_leaf = LEAF[:, ::-1].copy()  # Same dHash bits, different photo
+    assert cache.get("v1", "c", 0b1010, other_leaf) == (None, None)
+    assert cache.stats()["near_rejected"] == 1
+    assert cache.get("v2", "b", 0b1011, recompressed) == (None, None)
@@ -0,0 +1,66 @@
+"""
+The fast texture / GLI / morphology engine against the original
+implementations, on full-resolution reads of the sample leaf photos in
+uploads/ (what the service stored before the fast engine).
+"""
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services.cv_service import (
+    TOLERANCES, benchmark, disease_mask, green_leaf_index, leaf_images,
+    lesion_morphology, reference_metrics, texture_metrics
+)
+from app.services.image_service import DecodedImage, image_pipeline
+
+pytest.importorskip("skimage")
+
+SAMPLES = leaf_images(os.path.join(os.path.dirname(__file__), "..", "uploads"))
+pytestmark = pytest.mark.skipif(not SAMPLES, reason="no sample leaf photos in uploads/")
+
+@pytest.fixture(scope="module")
+def images():
+    """Plain full-resolution reads, as the original analysis did."""
+    result = []
+    for path in SAMPLES:
+        bgr = cv2.imread(path)
+        result.append(DecodedImage(bgr, (bgr.shape[1], bgr.shape[0])))
+    return result
+
+def test_forensics_decode_is_full_resolution(images):
+    for path, image in zip(SAMPLES, images):
+        assert np.array_equal(image_pipeline.load(path, full_resolution=True).bgr, image.bgr)
+
+def test_fast_engine_matches_reference_exactly_at_full_resolution(images):
+    for image in images:
+        ref_gli, ref_contrast, ref_homogeneity = reference_metrics(image.rgb, image.gray)
+        contrast, homogeneity = texture_metrics(image.gray, 256)
+        assert green_leaf_index(image.rgb) == pytest.approx(ref_gli, abs=1e-6)
+        assert contrast == pytest.approx(ref_contrast, rel=1e-9)
+        assert homogeneity == pytest.approx(ref_homogeneity, abs=1e-9)
+
+def test_default_settings_within_tolerance_of_full_resolution_reference():
+    report = benchmark(SAMPLES, settings.CV_TEXTURE_LEVELS, settings.CV_TEXTURE_MAX_SIDE)
+    assert report["max_gli_abs_error"] <= TOLERANCES["gli_abs"]
+    assert report["max_contrast_rel_error"] <= TOLERANCES["contrast_rel"]
+    assert report["max_homogeneity_abs_error"] <= TOLERANCES["homogeneity_abs"]
+
+def test_lesion_morphology_matches_contour_loop(images):
+    for image in images:
+        mask, _ = disease_mask(image)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        areas, circularities = [], []
+        for contour in contours:
+            area, perimeter = cv2.contourArea(contour), cv2.arcLength(contour, True)
+            if area > 10 and perimeter > 0:
+                areas.append(area)
+                circularities.append(4 * np.pi * area / perimeter ** 2)
+
+        result = lesion_morphology(mask)
+        assert result["lesion_count"] == len(contours)
+        assert result["avg_spot_area_px"] == pytest.approx(np.mean(areas) if areas else 0)
+        assert result["avg_circularity"] == pytest.approx(np.mean(circularities) if areas else 0)
+        assert result["lesion_areas_px"] == pytest.approx(sorted(np.round(areas, 1), reverse=True), abs=0.05)
@@ -0,0 +1,39 @@
+"""
+/api/analytics/map against an in-memory database: points keep a readable
+location whether or not the place backfill has geocoded them yet.
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api.endpoints.analysis import get_map_data
+from app.models.sql_models import DiseaseReport, ReportAnalysis
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    for model in (DiseaseReport, ReportAnalysis):
+        model.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+def add_report(db, **place):
+    db.add(DiseaseReport(
+        user_id=1, disease_name="Brown Blight", confidence="91.0%", image_url="uploads/a.jpg",
+        latitude=6.9, longitude=80.7, timestamp=datetime.now(), **place
+    ))
+    db.commit()
+
+def test_location_of_geocoded_report(db):
+    add_report(db, city="Nuwara Eliya", region="Central Province", country="Sri Lanka")
+    points = get_map_data(db=db)
+    assert [p["location"] for p in points] == ["Nuwara Eliya, Central Province"]
+
+def test_location_of_report_without_geo_data(db):
+    add_report(db)
+    points = get_map_data(db=db)
+    assert [p["location"] for p in points] == ["Unknown"]
@@ -0,0 +1,19 @@
+"""
+The quality gate's blur threshold against blurred copies of the sample
+leaf photos in uploads/ (see quality_service.calibrate).
+"""
+import os
+
+import pytest
+
+from app.services.cv_service import leaf_images
+from app.services.quality_service import calibrate
+
+SAMPLES = leaf_images(os.path.join(os.path.dirname(__file__), "..", "uploads"))
+pytestmark = pytest.mark.skipif(not SAMPLES, reason="no sample leaf photos in uploads/")
+
+def test_blur_threshold_separates_sharp_from_blurred():
+    report = calibrate(SAMPLES)
+    assert report["sharp_rejected"] == 0
+    assert report["accuracy"] >= 0.95
+    assert report["accuracy"] >= report["best_accuracy"] - 0.02